@@ -1,14 +1,52 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 
-from .config import settings
-from .db import init_db
-from .routes import health, ops_primitive, jobs
+from .audit import audit_writer
+from .config import secret_reloader, settings
+from .db import async_engine, init_db
+from .informer import start_informers, stop_informers
+from .jobs.events import job_events_listener
+from .jobs.queue import job_worker
+from .jobs.runtime import job_runtime
+from .partitions import ops_log_partitions
+from .routes import health, ops_primitive, jobs, logs, archives
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 定期檢查 Vault Agent 注入的 secret 檔，有變化才重新讀取
+    secret_reloader.start()
+    # 先確保 ops_log 有當月（日）以後的 partition，audit writer 才寫得進去
+    ops_log_partitions.start()
+    audit_writer.start()
+    # 每個允許的 namespace 各跑一組 pod / StatefulSet informer，所有 job 共用
+    start_informers()
+    # 接收其他 replica 上 job 變化的 NOTIFY，轉給本機的 SSE / long-poll
+    job_events_listener.start()
+    # 從 ops_job 領取 pending job，交給共用的 job runtime 執行
+    if settings.JOB_WORKER_ENABLED:
+        job_runtime.start()
+        job_worker.start()
+    try:
+        yield
+    finally:
+        job_worker.stop()
+        job_runtime.stop()
+        job_events_listener.stop()
+        stop_informers()
+        # 把還在 queue 裡的 ops_log 寫完
+        audit_writer.stop()
+        ops_log_partitions.stop()
+        await async_engine.dispose()
+        secret_reloader.stop()
 
 
 def create_app() -> FastAPI:
     app = FastAPI(
         title="ApiOps",
         version="0.1.0",
+        lifespan=lifespan,
     )
 
     # 初始化 DB (只做 metadata.create_all; 正式可以改 Alembic)
@@ -18,6 +56,8 @@ def create_app() -> FastAPI:
     app.include_router(health.router, prefix="/health", tags=["health"])
     app.include_router(ops_primitive.router, prefix="/ops", tags=["ops"])
     app.include_router(jobs.router, prefix="/ops", tags=["jobs"])
+    app.include_router(logs.router, prefix="/ops", tags=["logs"])
+    app.include_router(archives.router, prefix="/ops", tags=["archives"])
 
     @app.get("/")
     def root():
@@ -0,0 +1,408 @@
+"""
+Cold archive
+
+把超過保留期限的 ops_log / ops_job（含 step 與 event）搬到 ARCHIVE_DIR 的 gzip JSONL 檔，
+讓線上的 table 維持小而快。每次封存（run）一個目錄：
+
+    {ARCHIVE_DIR}/{run_id}/
+        manifest.json               # 每個檔案的筆數、sha256、時間範圍
+        ops_log-00001.jsonl.gz
+        ops_job-00001.jsonl.gz      # 每行一個 job，steps / events 內嵌在 "steps" / "events"
+
+寫入流程（每個檔案）：
+
+1. 寫到暫存檔、fsync 後 rename
+2. 重新讀取，驗證 sha256 與筆數
+3. 記錄到 manifest（deleted = false）
+4. 分批刪除 DB 內對應的 row，完成後 manifest 標記 deleted = true
+
+中途失敗重跑時，manifest 內 deleted = false 的檔案會先依檔案內容把 row 刪完再繼續，
+不會重複封存也不會遺漏。
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, insert, select, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from .config import settings
+from .db import SessionLocal, engine
+from .models import OpsJob, OpsJobEvent, OpsJobStep, OpsLog
+from .partitions import ops_log_partitions
+
+ARCHIVE_TABLES = ("ops_log", "ops_job")
+MANIFEST_NAME = "manifest.json"
+
+# 每張 table 用哪個時間欄位決定是否封存、記錄在 manifest 的時間範圍
+TS_FIELDS = {"ops_log": "ts", "ops_job": "created_at"}
+
+FINISHED_JOB_STATUSES = ("success", "failed", "cancelled")
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    raise TypeError(f"cannot serialize {type(value)}")
+
+
+def _sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def read_archive_file(path: str):
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def is_valid_run_id(run_id: str) -> bool:
+    """run_id 是 archive job 的 job_id（UUID 字串）；其他字串（例如含 ../）不能拿來組路徑"""
+    try:
+        return str(uuid.UUID(run_id)) == run_id
+    except ValueError:
+        return False
+
+
+class ArchiveRun:
+    def __init__(self, root: str, run_id: str):
+        self.run_id = run_id
+        self.dir = os.path.join(root, run_id)
+        self.manifest_path = os.path.join(self.dir, MANIFEST_NAME)
+        self.manifest = self._load_manifest()
+
+    def _load_manifest(self) -> dict:
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        return {
+            "run_id": self.run_id,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "format": "jsonl.gz",
+            "tables": {table: {"files": []} for table in ARCHIVE_TABLES},
+        }
+
+    def save_manifest(self):
+        os.makedirs(self.dir, exist_ok=True)
+        tmp = f"{self.manifest_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.manifest_path)
+
+    def files(self, table: str) -> list[dict]:
+        return self.manifest["tables"].setdefault(table, {"files": []})["files"]
+
+    def path(self, entry: dict) -> str:
+        return os.path.join(self.dir, entry["file"])
+
+    def write_file(self, table: str, rows: list[dict]) -> dict:
+        """寫入一個檔案並驗證，回傳 manifest entry（尚未加入 manifest）"""
+        os.makedirs(self.dir, exist_ok=True)
+        name = f"{table}-{len(self.files(table)) + 1:05d}.jsonl.gz"
+        path = os.path.join(self.dir, name)
+        tmp = f"{path}.tmp"
+
+        with open(tmp, "wb") as raw:
+            with gzip.GzipFile(fileobj=raw, mode="wb") as gz:
+                for row in rows:
+                    gz.write((json.dumps(row, default=_json_default) + "\n").encode("utf-8"))
+            raw.flush()
+            os.fsync(raw.fileno())
+        os.replace(tmp, path)
+
+        ts_field = TS_FIELDS[table]
+        entry = {
+            "file": name,
+            "rows": len(rows),
+            "sha256": _sha256(path),
+            "bytes": os.path.getsize(path),
+            "min_ts": _json_default(min(r[ts_field] for r in rows)),
+            "max_ts": _json_default(max(r[ts_field] for r in rows)),
+            "deleted": False,
+        }
+        self.verify(entry)
+        return entry
+
+    def verify(self, entry: dict):
+        """重新讀取檔案，確認 sha256 與筆數都正確"""
+        path = self.path(entry)
+        if _sha256(path) != entry["sha256"]:
+            raise RuntimeError(f"archive {path} checksum mismatch")
+        count = sum(1 for _ in read_archive_file(path))
+        if count != entry["rows"]:
+            raise RuntimeError(f"archive {path} has {count} rows, expected {entry['rows']}")
+
+
+# ----- 封存 -----
+
+def _delete_in_batches(delete_batch, keys: list, batch_size: int):
+    for i in range(0, len(keys), batch_size):
+        with SessionLocal() as db:
+            db.execute(delete_batch(keys[i:i + batch_size]))
+            db.commit()
+
+
+def _delete_ops_log(keys: list):
+    return delete(OpsLog).where(tuple_(OpsLog.id, OpsLog.ts).in_(keys))
+
+
+def _delete_ops_job(keys: list):
+    # ops_job_step / ops_job_event 由 FK ON DELETE CASCADE 一起刪除
+    return delete(OpsJob).where(OpsJob.id.in_(keys))
+
+
+def _file_keys(table: str, path: str) -> list:
+    if table == "ops_log":
+        return [(r["id"], datetime.fromisoformat(r["ts"])) for r in read_archive_file(path)]
+    return [r["id"] for r in read_archive_file(path)]
+
+
+DELETE_BUILDERS = {"ops_log": _delete_ops_log, "ops_job": _delete_ops_job}
+
+
+def _finish_pending_deletes(run: ArchiveRun, table: str, batch_size: int):
+    """上次寫完檔案但還沒刪完 row 就中斷的，依檔案內容補刪"""
+    for entry in run.files(table):
+        if not entry["deleted"]:
+            run.verify(entry)
+            _delete_in_batches(DELETE_BUILDERS[table], _file_keys(table, run.path(entry)), batch_size)
+            entry["deleted"] = True
+            run.save_manifest()
+
+
+def _fetch_ops_log(cutoff: datetime, limit: int) -> list[dict]:
+    with SessionLocal() as db:
+        stmt = (
+            select(OpsLog.__table__)
+            .where(OpsLog.ts < cutoff)
+            .order_by(OpsLog.ts, OpsLog.id)
+            .limit(limit)
+        )
+        return [dict(r) for r in db.execute(stmt).mappings()]
+
+
+def _fetch_ops_job(cutoff: datetime, limit: int) -> list[dict]:
+    # 只封存已結束的 job，step 與 event（時間軸）內嵌在同一行，刪除 job 時一起刪
+    with SessionLocal() as db:
+        stmt = (
+            select(OpsJob.__table__)
+            .where(OpsJob.created_at < cutoff, OpsJob.status.in_(FINISHED_JOB_STATUSES))
+            .order_by(OpsJob.created_at, OpsJob.id)
+            .limit(limit)
+        )
+        jobs = [dict(r) for r in db.execute(stmt).mappings()]
+        if not jobs:
+            return []
+
+        steps_stmt = (
+            select(OpsJobStep.__table__)
+            .where(OpsJobStep.job_uid.in_([j["uid"] for j in jobs]))
+            .order_by(OpsJobStep.job_uid, OpsJobStep.step_order)
+        )
+        steps_by_job = {}
+        for step in db.execute(steps_stmt).mappings():
+            steps_by_job.setdefault(step["job_uid"], []).append(dict(step))
+
+        events_stmt = (
+            select(OpsJobEvent.__table__)
+            .where(OpsJobEvent.job_uid.in_([j["uid"] for j in jobs]))
+            .order_by(OpsJobEvent.job_uid, OpsJobEvent.seq)
+        )
+        events_by_job = {}
+        for ev in db.execute(events_stmt).mappings():
+            events_by_job.setdefault(ev["job_uid"], []).append(dict(ev))
+
+        for job in jobs:
+            job["steps"] = steps_by_job.get(job["uid"], [])
+            job["events"] = events_by_job.get(job["uid"], [])
+        return jobs
+
+
+FETCHERS = {"ops_log": _fetch_ops_log, "ops_job": _fetch_ops_job}
+
+
+def archive_table(
+    run: ArchiveRun,
+    table: str,
+    cutoff: datetime,
+    *,
+    file_rows: int,
+    delete_batch_size: int,
+    on_progress=None,
+) -> str:
+    """把 table 內早於 cutoff 的 row 封存到 run，回傳 step detail"""
+    run.manifest.setdefault("cutoff", cutoff.isoformat())
+    _finish_pending_deletes(run, table, delete_batch_size)
+
+    archived = 0
+    while True:
+        rows = FETCHERS[table](cutoff, file_rows)
+        if not rows:
+            break
+
+        entry = run.write_file(table, rows)
+        # 先記錄到 manifest，確認檔案存在才刪除 DB 的 row
+        run.files(table).append(entry)
+        run.save_manifest()
+
+        if table == "ops_log":
+            keys = [(r["id"], r["ts"]) for r in rows]
+        else:
+            keys = [r["id"] for r in rows]
+        _delete_in_batches(DELETE_BUILDERS[table], keys, delete_batch_size)
+        entry["deleted"] = True
+        run.save_manifest()
+
+        archived += len(rows)
+        if on_progress:
+            on_progress(f"archived {archived} rows into {len(run.files(table))} files")
+
+    total = sum(e["rows"] for e in run.files(table))
+    return f"archived {total} {table} rows older than {cutoff.isoformat()} into {len(run.files(table))} files"
+
+
+# ----- 查詢 / 還原 -----
+
+def list_runs(root: str) -> list[dict]:
+    if not os.path.isdir(root):
+        return []
+    runs = []
+    for run_id in sorted(os.listdir(root)):
+        if os.path.exists(os.path.join(root, run_id, MANIFEST_NAME)):
+            runs.append(ArchiveRun(root, run_id).manifest)
+    return runs
+
+
+def iter_archived_rows(
+    root: str,
+    table: str,
+    *,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    filters: dict | None = None,
+    run_id: str | None = None,
+):
+    """
+    直接讀封存檔，不用還原到 DB。
+
+    依 manifest 的 min_ts / max_ts 跳過時間範圍外的檔案；filters 為欄位相等條件，
+    ops_job 的 namespace 欄位是後來才加的，舊的封存檔從 params 取。
+    """
+    ts_field = TS_FIELDS[table]
+    filters = {k: v for k, v in (filters or {}).items() if v is not None}
+    run_ids = [run_id] if run_id else [m["run_id"] for m in list_runs(root)]
+
+    for rid in run_ids:
+        run = ArchiveRun(root, rid)
+        for entry in run.files(table):
+            if since and datetime.fromisoformat(entry["max_ts"]) < since:
+                continue
+            if until and datetime.fromisoformat(entry["min_ts"]) >= until:
+                continue
+            for row in read_archive_file(run.path(entry)):
+                ts = datetime.fromisoformat(row[ts_field])
+                if since and ts < since:
+                    continue
+                if until and ts >= until:
+                    continue
+                if all(_field(row, table, k) == v for k, v in filters.items()):
+                    yield row
+
+
+def _field(row: dict, table: str, key: str):
+    if table == "ops_job" and key == "namespace" and row.get("namespace") is None:
+        return (row.get("params") or {}).get("namespace")
+    return row.get(key)
+
+
+def _restore_ops_log(db, rows: list[dict]):
+    for row in rows:
+        row["ts"] = datetime.fromisoformat(row["ts"])
+    conn = db.connection()
+    # ensure_range 的 end 不包含在內：max_ts 剛好是 partition 的起點時也要建立那個 partition
+    ops_log_partitions.ensure_range(
+        conn,
+        min(r["ts"] for r in rows),
+        max(r["ts"] for r in rows) + timedelta(microseconds=1),
+    )
+    _insert_ignore(db, OpsLog.__table__, rows)
+
+
+def _restore_ops_job(db, rows: list[dict]):
+    steps = []
+    events = []
+    for row in rows:
+        for field in ("created_at", "finished_at", "lease_expires_at", "next_run_at"):
+            if row.get(field):
+                row[field] = datetime.fromisoformat(row[field])
+        row["uid"] = uuid.UUID(row["uid"])
+        for step in row.pop("steps", []):
+            step["job_uid"] = uuid.UUID(step["job_uid"])
+            for field in ("started_at", "finished_at"):
+                if step.get(field):
+                    step[field] = datetime.fromisoformat(step[field])
+            steps.append(step)
+        # 舊的封存檔沒有 events
+        for ev in row.pop("events", []):
+            ev["job_uid"] = uuid.UUID(ev["job_uid"])
+            ev["ts"] = datetime.fromisoformat(ev["ts"])
+            events.append(ev)
+    _insert_ignore(db, OpsJob.__table__, rows)
+    if steps:
+        _insert_ignore(db, OpsJobStep.__table__, steps)
+    if events:
+        _insert_ignore(db, OpsJobEvent.__table__, events)
+
+
+def _insert_ignore(db, table, rows: list[dict]):
+    """已經存在的 row（重跑還原）略過"""
+    if engine.dialect.name == "postgresql":
+        db.execute(pg_insert(table).on_conflict_do_nothing(), rows)
+    else:
+        db.execute(insert(table), rows)
+
+
+RESTORERS = {"ops_log": _restore_ops_log, "ops_job": _restore_ops_job}
+
+
+def restore_table(run: ArchiveRun, table: str, *, batch_size: int, on_progress=None) -> str:
+    """把 run 內 table 的封存檔寫回 DB，每個檔案驗證 checksum 後才寫入"""
+    restored = 0
+    for entry in run.files(table):
+        run.verify(entry)
+        batch = []
+        for row in read_archive_file(run.path(entry)):
+            batch.append(row)
+            if len(batch) >= batch_size:
+                restored += _restore_batch(table, batch)
+                batch = []
+        if batch:
+            restored += _restore_batch(table, batch)
+        if on_progress:
+            on_progress(f"restored {restored} rows from {entry['file']}")
+    return f"restored {restored} {table} rows from archive {run.run_id}"
+
+
+def _restore_batch(table: str, rows: list[dict]) -> int:
+    with SessionLocal() as db:
+        RESTORERS[table](db, rows)
+        db.commit()
+    return len(rows)
+
+
+def archive_cutoff(older_than_days: int | None) -> datetime:
+    days = older_than_days if older_than_days is not None else settings.ARCHIVE_AFTER_DAYS
+    return datetime.now(timezone.utc) - timedelta(days=days)
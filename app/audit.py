@@ -0,0 +1,245 @@
+"""
+Audit log writer
+
+原子操作的 ops_log 不在 request 的 finally 裡同步 commit，而是：
+
+1. safe_log_op() 把 row 放進 bounded queue（不碰 DB）
+2. 背景 flusher 每 AUDIT_FLUSH_INTERVAL_MS 或累積 AUDIT_BATCH_SIZE 筆時，
+   用一個 multi-row INSERT 寫入
+3. DB 無法寫入（或 queue 滿了）時寫到本地 spool 檔（JSONL），DB 恢復後補寫；
+   無法解析或被 DB 拒絕的 row 移到 {spool}.bad，不會擋住其他 row、也不會一直重試
+4. shutdown 時把 queue 內剩下的 row 全部 flush
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import exc, insert
+
+from .config import settings
+from .db import SessionLocal
+from .models import OpsLog
+
+
+class AuditWriter:
+    def __init__(
+        self,
+        *,
+        queue_size: int,
+        batch_size: int,
+        flush_interval: float,
+        spool_path: str,
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spool_path = spool_path
+        self.bad_path = f"{spool_path}.bad"
+        self._queue: queue.Queue[dict] = queue.Queue(maxsize=queue_size)
+        self._spool_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.spool_path), exist_ok=True)
+        except OSError as e:
+            print(f"[audit] cannot create spool directory for {self.spool_path}: {e}")
+        self._recover_replay_file()
+        self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        """停止 flusher，並把 queue 內剩下的 row 寫完"""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def submit(self, row: dict):
+        """放進 queue；queue 滿時直接寫 spool，不丟掉也不阻塞 request"""
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            print("[audit] queue full, spooling to disk")
+            self._spool([row])
+
+    def _run(self):
+        while not self._stopped.is_set():
+            batch = self._take_batch()
+            if batch:
+                self._flush(batch)
+            elif os.path.exists(self.spool_path):
+                # 沒有新 row 時順便把之前 spool 的補寫回 DB
+                self._replay_spool()
+
+        # shutdown: flush 剩下的 row
+        while True:
+            batch = self._drain(self.batch_size)
+            if not batch:
+                break
+            self._flush(batch)
+
+    def _take_batch(self) -> list[dict]:
+        """等第一筆最多 flush_interval，之後在 flush_interval 內湊滿 batch_size 筆"""
+        try:
+            first = self._queue.get(timeout=self.flush_interval)
+        except queue.Empty:
+            return []
+        batch = [first]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _drain(self, limit: int) -> list[dict]:
+        batch = []
+        while len(batch) < limit:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _insert(self, rows: list[dict]):
+        with SessionLocal() as db:
+            db.execute(insert(OpsLog), rows)
+            db.commit()
+
+    def _flush(self, batch: list[dict]):
+        try:
+            self._insert(batch)
+        except Exception as e:
+            print(f"[audit] failed to write {len(batch)} rows, spooling to disk: {e}")
+            self._spool(batch)
+
+    def _spool(self, rows: list[dict]):
+        with self._spool_lock:
+            try:
+                with open(self.spool_path, "a", encoding="utf-8") as f:
+                    for row in rows:
+                        f.write(json.dumps(row, default=_json_default) + "\n")
+            except Exception as e:
+                # 最後一道防線也失敗，至少留在 stdout
+                print(f"[audit] failed to spool rows: {e} rows={rows}")
+
+    def _quarantine(self, lines: list[str]):
+        """重試也不會成功的 row 原樣移到 .bad 檔，由人工檢查"""
+        if not lines:
+            return
+        try:
+            with open(self.bad_path, "a", encoding="utf-8") as f:
+                f.writelines(lines)
+        except Exception as e:
+            print(f"[audit] failed to write {self.bad_path}: {e} lines={lines}")
+
+    def _recover_replay_file(self):
+        """上次 replay 到一半 process 就結束時，把剩下的檔案併回 spool"""
+        replay_path = f"{self.spool_path}.replay"
+        if not os.path.exists(replay_path):
+            return
+        with self._spool_lock:
+            with open(replay_path, "r", encoding="utf-8") as src, \
+                    open(self.spool_path, "a", encoding="utf-8") as dst:
+                dst.write(src.read())
+            os.remove(replay_path)
+
+    def _replay_spool(self):
+        replay_path = f"{self.spool_path}.replay"
+        with self._spool_lock:
+            if not os.path.exists(self.spool_path):
+                return
+            os.replace(self.spool_path, replay_path)
+
+        rows: list[dict] = []
+        lines: list[str] = []
+        bad: list[str] = []
+        with open(replay_path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                line = line.rstrip("\n") + "\n"
+                try:
+                    rows.append(_load_row(line))
+                except Exception as e:
+                    print(f"[audit] cannot parse spooled row, moving to {self.bad_path}: {e}")
+                    bad.append(line)
+                    continue
+                lines.append(line)
+
+        # rows[:done] 已寫入或已移到 .bad
+        done = 0
+        replayed = 0
+        try:
+            while done < len(rows):
+                batch = rows[done:done + self.batch_size]
+                try:
+                    self._insert(batch)
+                    done += len(batch)
+                    replayed += len(batch)
+                    continue
+                except Exception as e:
+                    if _db_unavailable(e):
+                        raise
+                    print(f"[audit] spooled batch rejected, retrying row by row: {e}")
+                # DB 拒絕這一批（資料本身的問題）：逐筆寫入，被拒絕的 row 移到 .bad
+                for row, line in zip(batch, lines[done:done + len(batch)]):
+                    try:
+                        self._insert([row])
+                        replayed += 1
+                    except Exception as e:
+                        if _db_unavailable(e):
+                            raise
+                        print(f"[audit] spooled row rejected, moving to {self.bad_path}: {e}")
+                        bad.append(line)
+                    done += 1
+        except Exception as e:
+            print(f"[audit] spool replay failed, will retry later: {e}")
+            self._quarantine(bad)
+            # 已寫入的部分不重複：只把還沒寫入的 row 放回 spool
+            self._spool(rows[done:])
+            os.remove(replay_path)
+            # DB 還沒恢復，等一下再試
+            self._stopped.wait(self.flush_interval * 10)
+            return
+        self._quarantine(bad)
+        os.remove(replay_path)
+        print(f"[audit] replayed {replayed} spooled rows, {len(bad)} moved to {self.bad_path}")
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"cannot serialize {type(value)}")
+
+
+def _db_unavailable(e: Exception) -> bool:
+    """DB 連不上 / 暫時無法寫入（之後重試會成功）；其他錯誤代表 row 本身被 DB 拒絕"""
+    if isinstance(e, (exc.OperationalError, exc.InterfaceError, exc.DisconnectionError, exc.TimeoutError)):
+        return True
+    return isinstance(e, exc.DBAPIError) and e.connection_invalidated
+
+
+def _load_row(line: str) -> dict:
+    row = json.loads(line)
+    row["ts"] = datetime.fromisoformat(row["ts"])
+    return row
+
+
+audit_writer = AuditWriter(
+    queue_size=settings.AUDIT_QUEUE_SIZE,
+    batch_size=settings.AUDIT_BATCH_SIZE,
+    flush_interval=settings.AUDIT_FLUSH_INTERVAL_MS / 1000,
+    spool_path=settings.AUDIT_SPOOL_PATH,
+)
@@ -1,14 +1,25 @@
+import hmac
+
 from fastapi import Header, HTTPException, Request
 
 from .config import settings
 
 
 def verify_api_key(x_api_key: str = Header(None, alias="X-API-Key")):
-    if x_api_key != settings.API_KEY:
+    if not x_api_key or not _matches_any(x_api_key, settings.API_KEYS):
         raise HTTPException(status_code=401, detail="Invalid API key")
     return True
 
 
+def _matches_any(candidate: str, keys: list[str]) -> bool:
+    # 逐一做 constant-time 比對，且不提早結束，避免從回應時間推測 key
+    candidate_bytes = candidate.encode()
+    matched = False
+    for key in keys:
+        matched |= hmac.compare_digest(candidate_bytes, key.encode())
+    return matched
+
+
 def get_actor(request: Request) -> str:
     # 之後可以改接 SSO，例如 X-User-Email
     return request.headers.get("X-Actor") or request.headers.get("X-User-Email") or "unknown"
@@ -1,15 +1,7 @@
 import os
 from pydantic import BaseSettings
 
-
-def load_from_file_or_env(path: str, env_name: str) -> str:
-    if os.path.exists(path):
-        with open(path, "r", encoding="utf-8") as f:
-            return f.read().strip()
-    v = os.environ.get(env_name)
-    if not v:
-        raise RuntimeError(f"No secret found at {path} or env {env_name}")
-    return v
+from .secret_provider import SecretFile, SecretReloader
 
 
 class Settings(BaseSettings):
@@ -22,20 +14,95 @@ class Settings(BaseSettings):
     OPS_API_KEY_ENV: str = "OPS_API_KEY"
     OPS_DB_URL_ENV: str = "OPS_DB_URL"
 
+    # Vault Agent 重新 render secret 檔後，多久內會被讀到
+    SECRET_RELOAD_INTERVAL_SECONDS: float = 5.0
+
+    # 以下從記憶體快取讀取，不會每次都讀檔
     @property
     def API_KEY(self) -> str:
-        return load_from_file_or_env(self.API_KEY_PATH, self.OPS_API_KEY_ENV)
+        return api_key_secret.value
+
+    @property
+    def API_KEYS(self) -> list[str]:
+        """所有有效的 API key（輪替期間新舊 key 同時有效）"""
+        return api_key_secret.values
 
     @property
     def DATABASE_URL(self) -> str:
-        return load_from_file_or_env(self.DB_URL_PATH, self.OPS_DB_URL_ENV)
+        return database_url_secret.value
+
+    # DB connection pool（sync / async engine 各自一組）；
+    # sync engine 至少 JOB_RUNTIME_MAX_CONCURRENCY + 8（見 app/db.py）
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_RECYCLE_SECONDS: int = 1800
+    DB_POOL_TIMEOUT_SECONDS: int = 30
+
+    # ops_log audit writer：批次寫入，DB 無法寫入時先 spool 到本地檔案
+    AUDIT_QUEUE_SIZE: int = 10000
+    AUDIT_BATCH_SIZE: int = 500
+    AUDIT_FLUSH_INTERVAL_MS: int = 200
+    # 放在掛載的 volume（k8s/deployment.yaml 的 audit-spool），container 重啟後仍在、啟動時補寫
+    AUDIT_SPOOL_PATH: str = "/var/lib/apiops/spool/audit-spool.jsonl"
+
+    # ops_log 依 ts 做 range partition：month / day，預先建立幾個 partition、保留幾天（0 = 不刪除）
+    OPS_LOG_PARTITION_INTERVAL: str = "month"
+    OPS_LOG_PARTITIONS_AHEAD: int = 3
+    # 刪除 partition 不會檢查是否已封存，預設不刪除；確認封存 job 定期執行後再設定
+    OPS_LOG_RETENTION_DAYS: int = 0
+    OPS_LOG_PARTITION_CHECK_INTERVAL_SECONDS: int = 3600
+
+    # 冷封存：早於 ARCHIVE_AFTER_DAYS 的 ops_log / ops_job 搬到 ARCHIVE_DIR（gzip JSONL）
+    # 有設定 OPS_LOG_RETENTION_DAYS 時要比它短，ops_log 才會在 partition 被刪除前封存
+    ARCHIVE_DIR: str = "/var/lib/apiops/archive"
+    ARCHIVE_AFTER_DAYS: int = 90
+    ARCHIVE_FILE_ROWS: int = 50000
+    ARCHIVE_DELETE_BATCH_SIZE: int = 5000
 
     # 允許操作的 namespace
     ALLOWED_NAMESPACES: set[str] = {"prod", "staging"}
 
+    # async job 內 Kubernetes API 呼叫使用的 thread 數（同時也是 connection pool 大小）
+    K8S_IO_MAX_WORKERS: int = 16
+
+    # Job queue worker（每個 API replica 各一個）
+    JOB_WORKER_ENABLED: bool = True
+    JOB_WORKER_CONCURRENCY: int = 32
+    JOB_POLL_INTERVAL_SECONDS: float = 2.0
+    JOB_LEASE_SECONDS: int = 60
+
+    # Job 重試：指數退避 + jitter
+    JOB_RETRY_BASE_DELAY_SECONDS: float = 5.0
+    JOB_RETRY_MAX_DELAY_SECONDS: float = 300.0
+    JOB_RETRY_MULTIPLIER: float = 2.0
+    JOB_RETRY_JITTER: float = 0.5
+
+    # Job runtime：所有 job 共用一個 event loop，同時執行數量上限
+    JOB_RUNTIME_MAX_CONCURRENCY: int = 32
+    # 同一個 job 內互不依賴的 step 同時執行的數量上限（JobDefinition 可以另外指定）
+    JOB_MAX_PARALLEL_STEPS: int = 4
+    # pg-rebuild-fleet 的 parent 多久檢查一次 child（期間 parent 回到 queue，不佔用 job runtime）
+    JOB_FLEET_POLL_INTERVAL_SECONDS: float = 10.0
+    # 每個 step 寫入進度（step.progress event）的最短間隔，間隔內的更新只保留最新的
+    JOB_PROGRESS_INTERVAL_SECONDS: float = 2.0
+
+    # SSE job 進度串流沒有變化時送 keepalive 的間隔
+    JOB_EVENTS_KEEPALIVE_SECONDS: float = 15.0
+    # GET /ops/jobs/{job_id}?wait=... long-poll 的最長等待時間
+    JOB_LONG_POLL_MAX_SECONDS: float = 60.0
+
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
 
 
 settings = Settings()
+
+# API key 檔可以有多行（每行一個 key），env 則用逗號分隔
+api_key_secret = SecretFile(settings.API_KEY_PATH, settings.OPS_API_KEY_ENV, multi=True)
+database_url_secret = SecretFile(settings.DB_URL_PATH, settings.OPS_DB_URL_ENV)
+
+secret_reloader = SecretReloader(
+    [api_key_secret, database_url_secret],
+    interval=settings.SECRET_RELOAD_INTERVAL_SECONDS,
+)
@@ -1,19 +1,119 @@
-from sqlalchemy import create_engine
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 
 from .config import settings
 from .models import Base
 
 
+# 同步 engine 上 job 以外的長期使用者：job queue poll / heartbeat、audit writer、
+# partition 管理、LISTEN 連線
+SYNC_BACKGROUND_CONNECTIONS = 8
+
+
+def _pool_options(pool_size: int) -> dict:
+    return {
+        "pool_pre_ping": True,
+        "pool_size": pool_size,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_recycle": settings.DB_POOL_RECYCLE_SECONDS,
+        "pool_timeout": settings.DB_POOL_TIMEOUT_SECONDS,
+    }
+
+
+# 同步 engine：job engine、job queue 等背景 thread 使用。
+# 每個執行中的 job 一個 session，pool 至少容納 JOB_RUNTIME_MAX_CONCURRENCY 個 job 同時使用，
+# job 不會在 pool checkout 等待（progress 等短暫的連線由 max_overflow 吸收）
 engine = create_engine(
     settings.DATABASE_URL,
     future=True,
-    pool_pre_ping=True,
+    **_pool_options(
+        max(settings.DB_POOL_SIZE, settings.JOB_RUNTIME_MAX_CONCURRENCY + SYNC_BACKGROUND_CONNECTIONS)
+    ),
 )
 
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
 
 
+def _async_url_and_connect_args(url: str):
+    """
+    把 OPS_DB_URL 轉成 asyncpg 的 URL。
+
+    asyncpg 不認得 libpq 的 sslmode 參數，改成 connect_args 的 ssl。
+    """
+    u = make_url(url)
+    connect_args = {}
+    sslmode = u.query.get("sslmode")
+    if sslmode:
+        connect_args["ssl"] = sslmode
+        u = u.difference_update_query(["sslmode"])
+    return u.set(drivername="postgresql+asyncpg"), connect_args
+
+
+_async_url, _async_connect_args = _async_url_and_connect_args(settings.DATABASE_URL)
+
+# async engine：API request path 使用，DB round trip 不佔用 threadpool
+async_engine = create_async_engine(
+    _async_url,
+    connect_args=_async_connect_args,
+    **_pool_options(settings.DB_POOL_SIZE),
+)
+
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False,
+)
+
+
+def _connect_with_current_url(engine, to_url):
+    """
+    每次開新連線時用快取中最新的 DB URL 產生連線參數。
+
+    Vault Agent 輪替 DB 帳密後不需要重建 engine：既有連線繼續用到 pool_recycle，
+    新連線就會用新的帳密。
+    """
+
+    @event.listens_for(engine, "do_connect")
+    def _do_connect(dialect, conn_rec, cargs, cparams):
+        url, extra = to_url(settings.DATABASE_URL)
+        new_cargs, new_cparams = dialect.create_connect_args(url)
+        cargs[:] = new_cargs
+        cparams.clear()
+        cparams.update(new_cparams)
+        cparams.update(extra)
+
+
+_connect_with_current_url(engine, lambda url: (make_url(url), {}))
+_connect_with_current_url(async_engine.sync_engine, _async_url_and_connect_args)
+
+
+# job runtime 內的同步 DB 操作（commit、pool checkout）交給這個 thread pool，
+# 一個慢的 commit 不會卡住所有 job 共用的 event loop
+_job_db_executor = ThreadPoolExecutor(
+    max_workers=settings.JOB_RUNTIME_MAX_CONCURRENCY,
+    thread_name_prefix="job-db",
+)
+
+
+async def run_in_db_thread(fn, *args, **kwargs):
+    """在 job DB thread pool 執行同步的 fn(*args, **kwargs)"""
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(_job_db_executor, partial(fn, *args, **kwargs))
+    try:
+        return await asyncio.shield(future)
+    except asyncio.CancelledError:
+        # thread 內的 DB 操作無法中斷：等它結束後才讓呼叫端繼續使用同一個 session（例如 rollback）
+        await asyncio.wait([future])
+        raise
+
+
 def get_db():
     from sqlalchemy.orm import Session
 
@@ -24,6 +124,11 @@ def get_db():
         db.close()
 
 
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
 def init_db():
     # Demo 用，正式環境建議用 Alembic migration
     Base.metadata.create_all(engine)
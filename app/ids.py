@@ -0,0 +1,19 @@
+"""
+Time-ordered IDs
+
+UUIDv7（RFC 9562）：前 48 bits 是 Unix epoch 毫秒，後面是亂數。依建立時間排序，
+新的 id 永遠寫在 B-tree index 的尾端，不會像 UUIDv4 一樣隨機分散造成 page split。
+"""
+
+import secrets
+import time
+import uuid
+from datetime import datetime
+
+
+def uuid7(ts: datetime | None = None) -> uuid.UUID:
+    ms = int((ts.timestamp() if ts else time.time()) * 1000) & ((1 << 48) - 1)
+    rand_a = secrets.randbits(12)
+    rand_b = secrets.randbits(62)
+    value = (ms << 80) | (0x7 << 76) | (rand_a << 64) | (0b10 << 62) | rand_b
+    return uuid.UUID(int=value)
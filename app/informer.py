@@ -0,0 +1,302 @@
+"""
+Shared informer cache
+
+每個 (kind, namespace) 只跑一組 list + watch，結果放在本地的 indexed store，
+所有 job 都從同一份 cache 讀取，而不是各自向 apiserver list。
+
+- Store: 依 name 存放物件，並維護 owner uid / label 的索引
+- Informer: 背景 thread 跑 list + watch，resourceVersion 續接，410 時重新 list
+- Informer.wait_until(): 給 async job 使用的訂閱 API，cache 變化時重新判斷條件
+- wait_until_all(): 同時訂閱多個 informer（例如 pod 與 PVC），任何一個變化時重新判斷
+"""
+
+import asyncio
+import threading
+
+from kubernetes import client, watch
+
+from .config import settings
+from .k8s_client import core_v1, apps_v1
+
+# 單次 watch request 的 server 端 timeout，到期後用最後的 resourceVersion 續接
+WATCH_TIMEOUT_SECONDS = 300
+
+# 連線中斷等非 API 錯誤時，重新 watch 前的等待秒數
+WATCH_RETRY_DELAY_SECONDS = 1
+
+# 支援的 kind 與對應的 list function
+LIST_FUNCS = {
+    "Pod": lambda: core_v1.list_namespaced_pod,
+    "StatefulSet": lambda: apps_v1.list_namespaced_stateful_set,
+    "PersistentVolumeClaim": lambda: core_v1.list_namespaced_persistent_volume_claim,
+}
+
+
+class Store:
+    """
+    Thread-safe 的本地物件快取。
+
+    物件以 metadata.name 為 key，另外維護兩個索引：
+    - owner: ownerReferences[].uid -> names
+    - label: "key=value" -> names
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._items: dict[str, object] = {}
+        self._by_owner: dict[str, set[str]] = {}
+        self._by_label: dict[str, set[str]] = {}
+
+    @staticmethod
+    def _owner_keys(obj) -> list[str]:
+        return [ref.uid for ref in (obj.metadata.owner_references or [])]
+
+    @staticmethod
+    def _label_keys(obj) -> list[str]:
+        return [f"{k}={v}" for k, v in (obj.metadata.labels or {}).items()]
+
+    def _index(self, name: str, obj):
+        for key in self._owner_keys(obj):
+            self._by_owner.setdefault(key, set()).add(name)
+        for key in self._label_keys(obj):
+            self._by_label.setdefault(key, set()).add(name)
+
+    def _unindex(self, name: str, obj):
+        for index, keys in (
+            (self._by_owner, self._owner_keys(obj)),
+            (self._by_label, self._label_keys(obj)),
+        ):
+            for key in keys:
+                names = index.get(key)
+                if names is None:
+                    continue
+                names.discard(name)
+                if not names:
+                    del index[key]
+
+    def replace(self, objs: list):
+        with self._lock:
+            self._items = {}
+            self._by_owner = {}
+            self._by_label = {}
+            for obj in objs:
+                self.upsert(obj)
+
+    def upsert(self, obj):
+        name = obj.metadata.name
+        with self._lock:
+            old = self._items.get(name)
+            if old is not None:
+                self._unindex(name, old)
+            self._items[name] = obj
+            self._index(name, obj)
+
+    def delete(self, obj):
+        name = obj.metadata.name
+        with self._lock:
+            old = self._items.pop(name, None)
+            if old is not None:
+                self._unindex(name, old)
+
+    def get(self, name: str):
+        with self._lock:
+            return self._items.get(name)
+
+    def list(self) -> list:
+        with self._lock:
+            return list(self._items.values())
+
+    def by_owner(self, owner_uid: str) -> list:
+        with self._lock:
+            return [self._items[n] for n in self._by_owner.get(owner_uid, ())]
+
+    def by_labels(self, labels: dict[str, str]) -> list:
+        """回傳 labels 全部符合的物件（matchLabels 語意）"""
+        with self._lock:
+            if not labels:
+                return list(self._items.values())
+            names = None
+            for k, v in labels.items():
+                matched = self._by_label.get(f"{k}={v}", set())
+                names = set(matched) if names is None else names & matched
+                if not names:
+                    return []
+            return [self._items[n] for n in names]
+
+
+class Informer(threading.Thread):
+    """
+    單一 (kind, namespace) 的 list + watch。
+
+    變化會套用到 self.store，並通知所有訂閱者（可能在不同的 event loop）。
+    """
+
+    def __init__(self, kind: str, namespace: str):
+        super().__init__(name=f"informer-{kind}-{namespace}", daemon=True)
+        self.kind = kind
+        self.namespace = namespace
+        self.store = Store()
+        self.synced = threading.Event()
+        self.error: Exception | None = None
+        self._list_func = LIST_FUNCS[kind]()
+        self._stopped = threading.Event()
+        self._watch: watch.Watch | None = None
+        self._subscribers_lock = threading.Lock()
+        self._subscribers: set[tuple[asyncio.AbstractEventLoop, asyncio.Event]] = set()
+
+    def stop(self):
+        self._stopped.set()
+        if self._watch is not None:
+            self._watch.stop()
+
+    def _notify(self):
+        with self._subscribers_lock:
+            subscribers = list(self._subscribers)
+        for loop, event in subscribers:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                # event loop 已關閉
+                pass
+
+    def run(self):
+        resource_version = None
+        while not self._stopped.is_set():
+            try:
+                if resource_version is None:
+                    resp = self._list_func(namespace=self.namespace)
+                    resource_version = resp.metadata.resource_version
+                    self.store.replace(resp.items)
+                    self.error = None
+                    self.synced.set()
+                    self._notify()
+
+                self._watch = watch.Watch()
+                for event in self._watch.stream(
+                    self._list_func,
+                    namespace=self.namespace,
+                    resource_version=resource_version,
+                    timeout_seconds=WATCH_TIMEOUT_SECONDS,
+                    allow_watch_bookmarks=True,
+                ):
+                    if self._stopped.is_set():
+                        break
+                    if event["type"] in ("ADDED", "MODIFIED"):
+                        self.store.upsert(event["object"])
+                        self._notify()
+                    elif event["type"] == "DELETED":
+                        self.store.delete(event["object"])
+                        self._notify()
+                    # BOOKMARK 只用來推進 resourceVersion
+                    resource_version = self._watch.resource_version or resource_version
+            except client.exceptions.ApiException as e:
+                if e.status == 410:
+                    # resourceVersion 太舊，重新 list
+                    resource_version = None
+                    continue
+                print(f"[informer {self.kind}/{self.namespace}] api error: {e.status} {e.reason}")
+                self.error = e
+                self._notify()
+                resource_version = None
+                self._stopped.wait(WATCH_RETRY_DELAY_SECONDS * 5)
+            except Exception as e:
+                if self._stopped.is_set():
+                    return
+                print(f"[informer {self.kind}/{self.namespace}] stream interrupted: {e}, resuming")
+                self._stopped.wait(WATCH_RETRY_DELAY_SECONDS)
+
+    async def wait_until(self, check, *, timeout: float, on_progress=None) -> str:
+        """
+        等到 check(store) 回傳 done 為止。
+
+        Args:
+            check: check(store) -> (done, detail)，cache 每次變化時呼叫
+            timeout: 最多等待秒數，超過會丟 TimeoutError
+            on_progress: on_progress(detail)，條件尚未滿足且 detail 改變時呼叫
+
+        Returns:
+            條件滿足時 check 回傳的 detail
+        """
+        return await wait_until_all([self], check, timeout=timeout, on_progress=on_progress)
+
+
+async def wait_until_all(informers: list[Informer], check, *, timeout: float, on_progress=None) -> str:
+    """
+    同時看多個 informer 的 cache：任何一個變化時呼叫 check(*stores)，直到回傳 done 為止。
+
+    不同 informer 的 watch 之間沒有先後順序，條件跨 kind 時（例如 pod 與它的 PVC）
+    只訂閱其中一個，另一個較晚到的變化不會觸發判斷。參數與回傳值同 Informer.wait_until。
+    """
+    loop = asyncio.get_running_loop()
+    changed = asyncio.Event()
+    subscriber = (loop, changed)
+    for informer in informers:
+        with informer._subscribers_lock:
+            informer._subscribers.add(subscriber)
+
+    last_detail = None
+    deadline = loop.time() + timeout
+    try:
+        # 已同步過就先判斷一次，不用等下一個事件
+        if all(informer.synced.is_set() for informer in informers):
+            changed.set()
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise TimeoutError(f"timeout after {timeout}s: {last_detail}")
+            try:
+                await asyncio.wait_for(changed.wait(), remaining)
+            except asyncio.TimeoutError:
+                raise TimeoutError(f"timeout after {timeout}s: {last_detail}")
+            # 同一批事件只判斷一次
+            changed.clear()
+
+            for informer in informers:
+                if informer.error is not None and not informer.synced.is_set():
+                    raise informer.error
+            if not all(informer.synced.is_set() for informer in informers):
+                continue
+
+            done, detail = check(*(informer.store for informer in informers))
+            if done:
+                return detail
+            if on_progress and detail != last_detail:
+                on_progress(detail)
+            last_detail = detail
+    finally:
+        for informer in informers:
+            with informer._subscribers_lock:
+                informer._subscribers.discard(subscriber)
+
+
+_informers: dict[tuple[str, str], Informer] = {}
+_informers_lock = threading.Lock()
+
+
+def get_informer(kind: str, namespace: str) -> Informer:
+    """取得 (kind, namespace) 的共用 informer，第一次使用時啟動"""
+    if namespace not in settings.ALLOWED_NAMESPACES:
+        raise RuntimeError(f"namespace {namespace} not allowed")
+    key = (kind, namespace)
+    with _informers_lock:
+        informer = _informers.get(key)
+        if informer is None:
+            informer = Informer(kind, namespace)
+            informer.start()
+            _informers[key] = informer
+        return informer
+
+
+def start_informers():
+    """啟動所有允許 namespace 的 informer"""
+    for namespace in settings.ALLOWED_NAMESPACES:
+        for kind in LIST_FUNCS:
+            get_informer(kind, namespace)
+
+
+def stop_informers():
+    with _informers_lock:
+        informers = list(_informers.values())
+        _informers.clear()
+    for informer in informers:
+        informer.stop()
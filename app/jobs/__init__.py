@@ -1,2 +1,2 @@
-# 預留未來有更多 job 時使用
-from .pg_rebuild import run_pg_rebuild_job  # noqa: F401
+from . import events  # noqa: F401  註冊 job event / 變化通知的 Session event
+from . import archive, pg_rebuild, pg_rebuild_fleet  # noqa: F401  註冊 job 定義（app/jobs/registry.py）
@@ -1,205 +1,82 @@
 """
 Job Template
 
-這是一個 job 範本，展示如何使用 FastAPI BackgroundTasks 開發新的 job。
+這是一個 job 範本，展示如何開發新的 job。
+Job 建立後寫入 ops_job（status = pending），由 job queue（app/jobs/queue.py）領取，
+交給 executor（app/jobs/executor.py）依 JobDefinition 執行。
 
 使用方式：
 1. 複製此檔案為新的 job 名稱，例如 my_job.py
-2. 修改函數名稱和邏輯
-3. 在 app/routes/jobs.py 建立對應的 API endpoint
-4. 在 app/schemas.py 建立對應的 request schema
+2. 在 app/schemas.py 建立參數 schema（MyJobParams）
+3. 撰寫 step 函數，用 register(JobDefinition(...)) 宣告 job type
+4. 在 app/jobs/__init__.py import 這個模組（import 時才會註冊）
+5. 在 app/routes/jobs.py 建立對應的 API endpoint，用 create_job 建立 job
+
+step 狀態、event 記錄、失敗重試、從失敗的 step 繼續執行都由 executor 處理，
+job 本身只需要寫每個 step 做什麼。
 """
 
 import asyncio
-from datetime import datetime, timezone
-from sqlalchemy.orm import Session
-
-from ..db import SessionLocal
-from ..models import OpsJob, OpsJobStep
 
+from pydantic import BaseModel
 
-def now_utc():
-    """取得當前 UTC 時間"""
-    return datetime.now(timezone.utc)
+from ..config import settings
+from .registry import JobContext, JobDefinition, Step, register
+from .retry import FatalJobError
 
 
-def run_template_job(job_id: str):
+class TemplateParams(BaseModel):
     """
-    同步包裝函數，用於 FastAPI BackgroundTasks。
-
-    重要：BackgroundTasks 建議使用同步函數，
-    內部透過 asyncio.run() 來執行 async 邏輯。
+    Job 參數（實際的 job 放在 app/schemas.py）。
 
-    Args:
-        job_id: Job ID
+    建立 job 時驗證後存入 ops_job.params（JSONB），執行時再 parse 回這個型別，
+    step 內用 ctx.params.<欄位> 取值。
     """
-    asyncio.run(_run_template_job_async(job_id))
 
+    namespace: str
+    resource_name: str
 
-async def _run_template_job_async(job_id: str):
-    """
-    實際的 job 執行邏輯（async）。
-
-    這個函數會：
-    1. 更新 job 狀態為 running
-    2. 執行各個步驟
-    3. 更新每個 step 的狀態
-    4. 完成後更新 job 狀態
 
-    Args:
-        job_id: Job ID
+async def _setup(ctx: JobContext):
     """
-    # 建立獨立的資料庫 session
-    # 注意：不要重用 route handler 的 session，因為 background task
-    # 會在 response 發送後執行，原本的 session 可能已關閉
-    db: Session = SessionLocal()
-
-    try:
-        # 載入 job
-        job: OpsJob = db.query(OpsJob).filter_by(job_id=job_id).one()
-        job.status = "running"
-        db.commit()
-
-        # 取得參數
-        params = job.params
-        # 例如：
-        # namespace = params["namespace"]
-        # resource_name = params["resource_name"]
-
-        # 執行步驟 1
-        await _execute_step(
-            db=db,
-            job_id=job_id,
-            step_name="step_1",
-            func=lambda: _step_1(params),
-        )
-
-        # 執行步驟 2
-        await _execute_step(
-            db=db,
-            job_id=job_id,
-            step_name="step_2",
-            func=lambda: _step_2(params),
-        )
-
-        # 執行步驟 3
-        await _execute_step(
-            db=db,
-            job_id=job_id,
-            step_name="step_3",
-            func=lambda: _step_3(params),
-        )
+    每次執行（含重試）開始時呼叫一次，用來驗證參數、準備 step 共用的資料。
 
-        # 所有步驟完成
-        job.status = "success"
-        job.finished_at = now_utc()
-        db.commit()
-
-    except Exception as e:
-        # 錯誤處理
-        print(f"[job {job_id}] error: {e}")
-
-        # 更新 job 狀態
-        if 'job' in locals():
-            job.status = "failed"
-            job.finished_at = now_utc()
-            db.commit()
-
-    finally:
-        # 總是關閉資料庫連線
-        db.close()
-
-
-async def _execute_step(
-    db: Session,
-    job_id: str,
-    step_name: str,
-    func,
-):
+    不可能靠重試解決的錯誤 raise FatalJobError，job 會直接標記為 failed。
     """
-    執行單個步驟的通用包裝函數。
-
-    負責：
-    1. 更新步驟狀態為 running
-    2. 執行實際邏輯
-    3. 處理錯誤
-    4. 更新步驟狀態為 success/failed
-
-    Args:
-        db: Database session
-        job_id: Job ID
-        step_name: 步驟名稱
-        func: 要執行的函數（應該是 async）
-    """
-    # 找出對應的 step 記錄
-    step: OpsJobStep = (
-        db.query(OpsJobStep)
-        .filter_by(job_id=job_id, name=step_name)
-        .one()
-    )
+    p: TemplateParams = ctx.params
+    if p.namespace not in settings.ALLOWED_NAMESPACES:
+        raise FatalJobError(f"namespace {p.namespace} not allowed")
 
-    # 開始執行
-    step.status = "running"
-    step.started_at = now_utc()
-    step.detail = None
-    db.commit()
+    # 放進 ctx.state 的資料所有 step 共用
+    ctx.state["resource"] = f"{p.namespace}/{p.resource_name}"
 
-    try:
-        # 執行實際邏輯，取得結果訊息
-        detail = await func()
 
-        # 成功
-        step.status = "success"
-        step.detail = detail
-        step.finished_at = now_utc()
-        db.commit()
-
-    except Exception as e:
-        # 失敗
-        step.status = "failed"
-        step.detail = f"error: {e}"
-        step.finished_at = now_utc()
-        db.commit()
-
-        # 重新拋出例外，讓上層的 job 也標記為失敗
-        raise
-
-
-async def _step_1(params: dict) -> str:
+async def _step_1(ctx: JobContext) -> str:
     """
     步驟 1：做某件事
 
-    Args:
-        params: Job 參數
+    step 在所有 job 共用的 event loop 執行，等待時請用 await
+    （asyncio.sleep、informer.wait_until、async_core_v1 ...），
+    不要呼叫會卡住 event loop 的同步函數（需要時用 asyncio.to_thread）。
 
     Returns:
-        步驟執行結果的描述文字
+        步驟執行結果的描述文字（寫入 step.detail）
     """
-    # 從參數取值
-    # value = params.get("some_key")
-
     # 執行實際操作
     # 例如：呼叫 K8s API
-    # core_v1.delete_namespaced_pod(...)
-
-    # 如果需要等待，使用 await
+    # await async_core_v1.delete_namespaced_pod(...)
     await asyncio.sleep(1)
 
-    # 回傳結果描述
-    return "step 1 completed successfully"
+    return f"step 1 completed for {ctx.state['resource']}"
 
 
-async def _step_2(params: dict) -> str:
+async def _step_2(ctx: JobContext) -> str:
     """
     步驟 2：等待某個條件
 
-    Args:
-        params: Job 參數
-
-    Returns:
-        步驟執行結果的描述文字
+    等待期間用 ctx.progress 回報進度，只寫 step.progress event，
+    GET /ops/jobs/{job_id} 與 SSE 都看得到。
     """
-    # 輪詢等待某個條件，設定超時
     max_attempts = 60  # 最多等 5 分鐘
 
     for attempt in range(max_attempts):
@@ -207,73 +84,52 @@ async def _step_2(params: dict) -> str:
         # if condition_met():
         #     return "condition met"
 
-        # 未滿足，繼續等待
+        ctx.progress(f"waiting ({attempt + 1}/{max_attempts})")
         await asyncio.sleep(5)
 
-    # 超時
+    # 超時：一般的例外會依 retry policy 重試，從這個 step 繼續
     raise TimeoutError("step 2 timeout after 5 minutes")
 
 
-async def _step_3(params: dict) -> str:
-    """
-    步驟 3：完成某個操作
-
-    Args:
-        params: Job 參數
+async def _step_3(ctx: JobContext) -> str:
+    """步驟 3：只在需要時執行（見 Step 的 when）"""
+    return "step 3 completed"
 
-    Returns:
-        步驟執行結果的描述文字
-    """
-    # 執行最後的操作
 
-    return "step 3 completed"
+TEMPLATE_JOB = register(
+    JobDefinition(
+        type="template",
+        params=TemplateParams,
+        steps=(
+            Step("step_1", _step_1),
+            Step("step_2", _step_2),
+            # when: 依參數決定建立 job 時是否包含這個 step
+            Step("step_3", _step_3, when=lambda p: p.resource_name != "skip"),
+        ),
+        setup=_setup,
+        # 有 index 的欄位，GET /ops/jobs?namespace=&target_resource= 查詢用
+        namespace=lambda p: p.namespace,
+        target_resource=lambda p: f"deployment/{p.resource_name}",
+    )
+)
 
 
 # ============================================================================
 # 在 app/routes/jobs.py 中使用此 job
 # ============================================================================
 #
-# from fastapi import BackgroundTasks
-# from ..jobs._template import run_template_job
+# # app/jobs/__init__.py
+# from . import my_job  # noqa: F401  ← 重要：import 時註冊 job type
+#
+# # app/routes/jobs.py
+# from ..jobs.my_job import MY_JOB
 #
 # @router.post("/jobs/my-job")
 # async def create_my_job(
 #     body: MyJobRequest,
-#     background_tasks: BackgroundTasks,  # ← 重要：注入 BackgroundTasks
 #     request: Request,
-#     db: Session = Depends(get_db),
+#     db: AsyncSession = Depends(get_async_db),
 # ):
-#     # 建立 job 記錄
-#     job_id = gen_job_id("my-job")
-#     job = OpsJob(
-#         job_id=job_id,
-#         type="my-job",
-#         status="pending",
-#         created_at=now_utc(),
-#         params=body.dict(),
-#         actor=get_actor(request),
-#         source_ip=get_source_ip(request),
-#     )
-#     db.add(job)
-#     db.commit()
-#
-#     # 建立 step 記錄
-#     steps_def = [
-#         ("step_1", 1),
-#         ("step_2", 2),
-#         ("step_3", 3),
-#     ]
-#     for name, order in steps_def:
-#         s = OpsJobStep(
-#             job_id=job_id,
-#             name=name,
-#             step_order=order,
-#             status="pending",
-#         )
-#         db.add(s)
-#     db.commit()
-#
-#     # 加入背景任務
-#     background_tasks.add_task(run_template_job, job_id)
-#
+#     # 一個 transaction 寫入 job、所有 step 與對應的 event，commit 後叫醒 worker
+#     job_id = await create_job(db, request, MY_JOB, body, max_retries=body.max_retries)
 #     return {"job_id": job_id}
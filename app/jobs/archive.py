@@ -0,0 +1,81 @@
+import asyncio
+import os
+
+from ..archive import ARCHIVE_TABLES, ArchiveRun, archive_table, restore_table
+from ..config import settings
+from ..schemas import ArchiveParams, ArchiveRestoreParams
+from .registry import JobContext, JobDefinition, Step, register
+from .retry import FatalJobError
+
+
+def _progress_reporter(ctx: JobContext):
+    """封存在 worker thread 執行，進度轉回 job runtime 的 event loop 由 ctx.progress 合併寫入"""
+    loop = asyncio.get_running_loop()
+
+    def report(detail: str):
+        loop.call_soon_threadsafe(ctx.progress, detail)
+
+    return report
+
+
+def _archive_step(table: str) -> Step:
+    """
+    把 table 早於 cutoff 的 row 寫到 ARCHIVE_DIR/{job_id}/ 並刪除。檔案 I/O 與 DB 批次刪除
+    都在 thread 內執行，不會卡住 job runtime 的 event loop。
+    """
+
+    async def run(ctx: JobContext):
+        p: ArchiveParams = ctx.params
+        return await asyncio.to_thread(
+            archive_table,
+            ArchiveRun(settings.ARCHIVE_DIR, ctx.job_id),
+            table,
+            p.cutoff,
+            file_rows=settings.ARCHIVE_FILE_ROWS,
+            delete_batch_size=settings.ARCHIVE_DELETE_BATCH_SIZE,
+            on_progress=_progress_reporter(ctx),
+        )
+
+    return Step(f"archive_{table}", run)
+
+
+def _restore_step(table: str) -> Step:
+    """把封存檔寫回 DB（已存在的 row 略過）"""
+
+    async def run(ctx: JobContext):
+        return await asyncio.to_thread(
+            restore_table,
+            ctx.state["run"],
+            table,
+            batch_size=settings.ARCHIVE_DELETE_BATCH_SIZE,
+            on_progress=_progress_reporter(ctx),
+        )
+
+    return Step(f"restore_{table}", run, when=lambda p: table in p.tables)
+
+
+async def _restore_setup(ctx: JobContext):
+    p: ArchiveRestoreParams = ctx.params
+    run = ArchiveRun(settings.ARCHIVE_DIR, p.run_id)
+    if not os.path.exists(run.manifest_path):
+        raise FatalJobError(f"archive {p.run_id} not found")
+    ctx.state["run"] = run
+
+
+# 依序封存 ops_log、ops_job（含 step）；step 共用同一個 manifest，不能同時執行
+ARCHIVE = register(
+    JobDefinition(
+        type="archive",
+        params=ArchiveParams,
+        steps=tuple(_archive_step(table) for table in ARCHIVE_TABLES),
+    )
+)
+
+ARCHIVE_RESTORE = register(
+    JobDefinition(
+        type="archive-restore",
+        params=ArchiveRestoreParams,
+        steps=tuple(_restore_step(table) for table in ARCHIVE_TABLES),
+        setup=_restore_setup,
+    )
+)
@@ -0,0 +1,292 @@
+"""
+Job event log and change tracking
+
+ops_job_event 是 job 的 append-only 事件紀錄，依 seq 重播即為 job 的完整時間軸；
+ops_job / ops_job_step 是它的投影（目前狀態）。不需要每個 commit 的地方自己寫 event，
+由 Session 的 flush event 自動產生：
+
+- before_flush: 找出有變化的 OpsJob / OpsJobStep，把變化的欄位整理成 event
+  （job.created、job.{status}、job.updated、step.created、step.{status}、step.updated），
+  先從 ops_job_event 的 sequence 取得 seq，job 的 version（最後一個 event 的 seq）
+  設在 ORM 物件上，跟 job 本身的變化在同一個 UPDATE 寫入
+- after_flush: 用預先取得的 seq 寫入 event
+- after_commit: commit 成功後通知 job_events hub，叫醒等待這個 job 的 SSE 連線
+
+step 執行中的進度（例如等待 pod down 時不斷更新的 detail）用 record_step_progress
+只新增一筆 step.progress event，不更新 ops_job / ops_job_step：沒有 row lock 競爭，
+也不會產生 UPDATE 的 dead tuple。讀取時用 latest_step_progress 取出每個 step 在自己
+最後一次狀態變化之後的最新進度，疊加到 step 的 detail。
+
+多個 replica 時，event 寫入的同時在 transaction 內送出 pg_notify，每個 replica 的
+LISTEN 連線（job_events_listener）收到後通知自己的 hub，在 replica A 連線的 client
+也能即時收到 replica B 上 job 的變化。本機的變化會收到兩次通知，hub 會合併喚醒，
+subscriber 也只在 version 變大時才推送。
+
+lease 相關欄位（heartbeat 延長 lease）不算 job 的變化。
+"""
+
+import json
+import uuid
+from datetime import datetime
+
+from sqlalchemy import bindparam, event, func, inspect, insert, select, update
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+
+from ..models import OpsJob, OpsJobEvent, OpsJobStep
+from ..pg_listener import PgListener
+from ..pubsub import PubSubHub
+
+JOB_EVENTS_CHANNEL = "ops_job_events"
+
+# topic = job_id
+job_events = PubSubHub()
+
+_IGNORED_JOB_FIELDS = {"lease_owner", "lease_expires_at", "version"}
+# 識別欄位已經記錄在 event 本身，不放進 payload
+_OMITTED_FIELDS = {"id", "uid", "job_id", "job_uid", "version"}
+_PENDING_KEY = "changed_job_ids"
+# before_flush 整理好、after_flush 寫入的 event：(events, job_ids, versioned)
+_FLUSH_EVENTS_KEY = "flush_job_events"
+
+
+def _jsonable(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    return value
+
+
+def _changed_fields(obj) -> dict:
+    """有變化的欄位 -> 新值"""
+    return {
+        attr.key: _jsonable(attr.value)
+        for attr in inspect(obj).attrs
+        if attr.key not in _OMITTED_FIELDS and attr.history.has_changes()
+    }
+
+
+def _all_fields(obj) -> dict:
+    return {
+        attr.key: _jsonable(attr.value)
+        for attr in inspect(obj).attrs
+        if attr.key not in _OMITTED_FIELDS and attr.value is not None
+    }
+
+
+def _event_type(kind: str, fields: dict) -> str:
+    # 狀態轉換以新狀態命名（job.running、step.failed），其他欄位變化為 *.updated
+    if "status" in fields:
+        return f"{kind}.{fields['status']}"
+    return f"{kind}.updated"
+
+
+def _collect_events(session: Session) -> tuple[list[dict], dict]:
+    """
+    Returns:
+        (events, job_ids)：要寫入的 event 與 job_uid -> job_id
+    """
+    events = []
+    job_ids = {}
+
+    def add(job_uid, job_id: str, type_: str, step: str | None, payload: dict):
+        events.append({"job_uid": job_uid, "type": type_, "step": step, "payload": payload})
+        job_ids[job_uid] = job_id
+
+    for obj in session.new:
+        if isinstance(obj, OpsJob):
+            add(obj.uid, obj.job_id, "job.created", None, _all_fields(obj))
+    new_steps = sorted(
+        (obj for obj in session.new if isinstance(obj, OpsJobStep)),
+        key=lambda s: s.step_order,
+    )
+    for obj in new_steps:
+        add(obj.job_uid, obj.job_id, "step.created", obj.name, _all_fields(obj))
+
+    # 同一次 flush 內的 event 順序固定：job 在前，step 依 step_order
+    for obj in session.dirty:
+        if isinstance(obj, OpsJob):
+            fields = _changed_fields(obj)
+            if fields.keys() - _IGNORED_JOB_FIELDS:
+                add(obj.uid, obj.job_id, _event_type("job", fields), None, fields)
+    dirty_steps = sorted(
+        (obj for obj in session.dirty if isinstance(obj, OpsJobStep)),
+        key=lambda s: s.step_order,
+    )
+    for obj in dirty_steps:
+        fields = _changed_fields(obj)
+        if fields:
+            add(obj.job_uid, obj.job_id, _event_type("step", fields), obj.name, fields)
+
+    return events, job_ids
+
+
+def _notify(conn, job_id: str, version: int):
+    if conn.dialect.name == "postgresql":
+        # commit 後才會送達其他 replica；rollback 則不會送出
+        payload = json.dumps({"job_id": job_id, "version": version}, separators=(",", ":"))
+        conn.execute(select(func.pg_notify(JOB_EVENTS_CHANNEL, payload)))
+
+
+def allocate_event_seqs(conn, events: list[dict]) -> dict:
+    """
+    從 ops_job_event 的 sequence 預先取得 seq 填進 events（events[i]["seq"]），
+    回傳 job_uid -> 最後一個 seq（即 job 新的 version），讓 version 跟 job 的 INSERT / UPDATE 一起寫入。
+
+    非 PostgreSQL 回傳空 dict：seq 由 INSERT 產生，record_job_events 再更新 version。
+    """
+    if conn.dialect.name != "postgresql":
+        return {}
+    nextval = func.nextval(func.pg_get_serial_sequence(OpsJobEvent.__tablename__, "seq"))
+    seqs = sorted(conn.execute(select(nextval).select_from(func.generate_series(1, len(events)))).scalars())
+    versions = {}
+    for e, seq in zip(events, seqs):
+        e["seq"] = seq
+        versions[e["job_uid"]] = seq
+    return versions
+
+
+@event.listens_for(Session, "before_flush")
+def _assign_job_versions(session: Session, flush_context, instances):
+    session.info.pop(_FLUSH_EVENTS_KEY, None)
+    events, job_ids = _collect_events(session)
+    if not events:
+        return
+    versions = allocate_event_seqs(session.connection(), events)
+    versioned = set()
+    # session 內的 OpsJob 直接設定 version：與 job 本身的變化同一個 INSERT / UPDATE，
+    # 只有 step 變化時也只有一個 UPDATE
+    for obj in (*session.identity_map.values(), *session.new):
+        if isinstance(obj, OpsJob) and obj.uid in versions:
+            obj.version = versions[obj.uid]
+            versioned.add(obj.uid)
+    session.info[_FLUSH_EVENTS_KEY] = (events, job_ids, versioned)
+
+
+@event.listens_for(Session, "after_flush")
+def _record_job_events(session: Session, flush_context):
+    pending = session.info.pop(_FLUSH_EVENTS_KEY, None)
+    if pending:
+        events, job_ids, versioned = pending
+        record_job_events(session, events, job_ids, versioned=versioned)
+
+
+def record_job_events(session: Session, events: list[dict], job_ids: dict, *, versioned=frozenset()):
+    """
+    寫入 event（單一個 multi-row INSERT），commit 後通知 subscriber。ORM 的變化由
+    before_flush / after_flush 自動記錄；用 Core 直接寫入 ops_job / ops_job_step 時
+    （例如 executor.enqueue_job）由呼叫端自己記錄。
+
+    Args:
+        events: [{"job_uid", "type", "step", "payload"}]，用 allocate_event_seqs 預先取得 seq 時包含 "seq"
+        job_ids: job_uid -> job_id
+        versioned: 已經把 version（最後一個 event 的 seq）寫入 ops_job 的 job_uid；
+            其他 job 在這裡 UPDATE version
+    """
+    conn = session.connection()
+    table = OpsJobEvent.__table__
+    stmt = insert(table).values(events).returning(table.c.job_uid, table.c.seq)
+    versions = {}
+    for job_uid, seq in conn.execute(stmt):
+        versions[job_uid] = max(seq, versions.get(job_uid, 0))
+
+    # 投影：job 的 version = 最後一個 event 的 seq（只有 session 外的 job 需要另外 UPDATE）
+    missing = {job_uid: seq for job_uid, seq in versions.items() if job_uid not in versioned}
+    if missing:
+        jobs = OpsJob.__table__
+        conn.execute(
+            update(jobs)
+            .where(jobs.c.uid == bindparam("b_uid"))
+            .values(version=bindparam("b_version")),
+            [{"b_uid": job_uid, "b_version": seq} for job_uid, seq in missing.items()],
+        )
+    for job_uid, seq in versions.items():
+        _notify(conn, job_ids[job_uid], seq)
+
+    # session 內已載入的 OpsJob 同步新的 version，不用重新查詢
+    for obj in session.identity_map.values():
+        if isinstance(obj, OpsJob) and obj.uid in versions:
+            set_committed_value(obj, "version", versions[obj.uid])
+
+    session.info.setdefault(_PENDING_KEY, set()).update(job_ids.values())
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_job_changes(session: Session):
+    for job_id in session.info.pop(_PENDING_KEY, ()):
+        job_events.publish(job_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_job_changes(session: Session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+def record_step_progress(db: Session, job_uid, job_id: str, step_name: str, detail: str):
+    """
+    執行中的 step 回報進度：只新增一筆 step.progress event 並 commit，不更新 ops_job_step。
+    db 是進度專用的短暫 session，不要傳 executor / step 共用的 session（會一起 commit）。
+
+    step 內請用 JobContext.progress（經過 ProgressReporter 合併），不要直接呼叫。
+    """
+    try:
+        conn = db.connection()
+        table = OpsJobEvent.__table__
+        seq = conn.execute(
+            insert(table)
+            .values(job_uid=job_uid, type="step.progress", step=step_name, payload={"detail": detail})
+            .returning(table.c.seq)
+        ).scalar_one()
+        _notify(conn, job_id, seq)
+        db.info.setdefault(_PENDING_KEY, set()).add(job_id)
+        db.commit()
+    except Exception:
+        # 失敗時 rollback，連線還給 pool 時不留下失敗的 transaction
+        db.rollback()
+        raise
+
+
+def latest_step_progress(job_uid):
+    """
+    每個 step 在自己最後一次狀態變化（step.running 等）之後的最新一筆 step.progress event
+
+    不能用 job 的 version 當界線：step 並行執行時，其他 step 的狀態變化會讓 version
+    超過還在執行的 step 最後一筆進度。step 結束後沒有更新的進度，不會被疊加。
+    """
+    last_transition = (
+        select(OpsJobEvent.step, func.max(OpsJobEvent.seq).label("seq"))
+        .where(
+            OpsJobEvent.job_uid == job_uid,
+            OpsJobEvent.step.is_not(None),
+            OpsJobEvent.type != "step.progress",
+        )
+        .group_by(OpsJobEvent.step)
+        .subquery()
+    )
+    return (
+        select(OpsJobEvent.seq, OpsJobEvent.step, OpsJobEvent.payload)
+        .join(
+            last_transition,
+            (last_transition.c.step == OpsJobEvent.step) & (OpsJobEvent.seq > last_transition.c.seq),
+        )
+        .where(
+            OpsJobEvent.job_uid == job_uid,
+            OpsJobEvent.type == "step.progress",
+        )
+        # DISTINCT ON (step)：每個 step 只取 seq 最大的一筆
+        .distinct(OpsJobEvent.step)
+        .order_by(OpsJobEvent.step, OpsJobEvent.seq.desc())
+    )
+
+
+def _on_notify(payload: str):
+    job_events.publish(json.loads(payload)["job_id"])
+
+
+# 每個 replica 一條 LISTEN 連線；重連後通知所有 subscriber 重新讀取，補上斷線期間的變化
+job_events_listener = PgListener(
+    JOB_EVENTS_CHANNEL,
+    on_notify=_on_notify,
+    on_reconnect=job_events.publish_all,
+)
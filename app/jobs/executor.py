@@ -0,0 +1,357 @@
+"""
+Job executor
+
+依 JobDefinition 建立與執行任何類型的 job：
+
+- enqueue_job: 一個 INSERT 寫入 job、一個 multi-row INSERT 寫入所有 step、
+  一個 multi-row INSERT 寫入對應的 event，與呼叫端同一個 transaction
+- run_job: 一次 SELECT 載入所有 step，之後 step 物件留在記憶體（session 不 expire），
+  不用每個 step 再依名稱查詢；依 depends_on 把依賴都已成功的 step 同時執行
+  （每個 job 最多 JobDefinition.parallelism 個），多個資源的 job 只需要最慢那條分支的時間。
+  step 之間的狀態轉換（完成的 success + 接著開始的 running）合併成一次 commit。
+  session 的 DB 操作在 DB thread 執行，慢的 commit 不會卡住所有 job 共用的 event loop
+"""
+
+import asyncio
+import json
+import uuid
+from dataclasses import replace
+from datetime import timedelta
+
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..db import SessionLocal, run_in_db_thread
+from ..models import OpsJob, OpsJobStep
+from .events import allocate_event_seqs, record_job_events, record_step_progress
+from .pg_rebuild import gen_job_uid, now_utc
+from .progress import ProgressReporter
+from .registry import JobContext, JobDefinition, get_definition
+from .retry import DEFAULT_RETRY_POLICY, FatalJobError, JobDeferred, schedule_retry
+
+
+def enqueue_job(
+    db: Session,
+    definition: JobDefinition,
+    params: BaseModel,
+    *,
+    max_retries: int,
+    actor: str | None = None,
+    source_ip: str | None = None,
+    parent_uid: uuid.UUID | None = None,
+    waiting: bool = False,
+) -> str:
+    """
+    建立 pending 的 job 與 step，回傳 job_id（不 commit，由呼叫端 commit）。
+
+    AsyncSession 用 `await db.run_sync(enqueue_job, definition, params, ...)` 呼叫；
+    job 內建立 child job 時在 ctx.run_db 內呼叫（傳入的 db 即 ctx.db）。
+
+    Args:
+        parent_uid: 建立這個 job 的 parent job
+        waiting: 建立為 waiting，worker 不會領取，由 parent 改成 pending 放行
+    """
+    params = definition.params.parse_obj(params.dict())
+    job_uid = gen_job_uid()
+    job_id = str(job_uid)
+    created_at = now_utc()
+
+    job_row = {
+        "job_id": job_id,
+        "uid": job_uid,
+        "type": definition.type,
+        "status": "waiting" if waiting else "pending",
+        "created_at": created_at,
+        "parent_uid": parent_uid,
+        # 經過 JSON 序列化，datetime 等型別存成字串
+        "params": json.loads(params.json()),
+        "namespace": definition.namespace(params) if definition.namespace else None,
+        "target_resource": definition.target_resource(params) if definition.target_resource else None,
+        "actor": actor,
+        "source_ip": source_ip,
+        "retry_count": 0,
+        "max_retries": max_retries,
+        "next_run_at": created_at,
+        "version": 1,
+    }
+    step_rows = [
+        {
+            "job_uid": job_uid,
+            "job_id": job_id,
+            "name": name,
+            "step_order": order,
+            "depends_on": depends_on,
+            "status": "pending",
+        }
+        for order, (name, depends_on) in enumerate(definition.step_plan(params), start=1)
+    ]
+
+    # Core INSERT 不會觸發 flush event，event 自己記錄
+    job_payload = {
+        k: v for k, v in job_row.items() if k not in ("job_id", "uid", "version") and v is not None
+    }
+    if parent_uid is not None:
+        job_payload["parent_uid"] = str(parent_uid)
+    job_payload["created_at"] = job_payload["next_run_at"] = created_at.isoformat()
+    events = [{"job_uid": job_uid, "type": "job.created", "step": None, "payload": job_payload}]
+    events += [
+        {
+            "job_uid": job_uid,
+            "type": "step.created",
+            "step": s["name"],
+            "payload": {
+                "name": s["name"],
+                "step_order": s["step_order"],
+                "depends_on": s["depends_on"],
+                "status": "pending",
+            },
+        }
+        for s in step_rows
+    ]
+    # version（最後一個 event 的 seq）在 INSERT job 時一起寫入，不用再 UPDATE
+    versions = allocate_event_seqs(db.connection(), events)
+    job_row["version"] = versions.get(job_uid, 1)
+
+    db.execute(insert(OpsJob.__table__).values(job_row))
+    if step_rows:
+        db.execute(insert(OpsJobStep.__table__).values(step_rows))
+    record_job_events(db, events, {job_uid: job_id}, versioned=versions.keys())
+    return job_id
+
+
+def _dependencies(steps: list[OpsJobStep]) -> dict[str, set[str]]:
+    """step 名稱 -> 依賴的 step；depends_on 為 NULL（加入 depends_on 前建立的 job）時依 step_order 依序執行"""
+    deps = {}
+    prev = None
+    for s in steps:
+        deps[s.name] = set(s.depends_on) if s.depends_on is not None else ({prev} if prev else set())
+        prev = s.name
+    return deps
+
+
+def _progress_writer(job: OpsJob, step_name: str):
+    job_uid, job_id = job.uid, job.job_id
+
+    # 進度用自己的短暫 session 寫入（在 thread 內），不會 commit 到 executor / step 共用的 session
+    def write(detail: str):
+        with SessionLocal() as db:
+            record_step_progress(db, job_uid, job_id, step_name, detail)
+
+    return write
+
+
+async def _stop_running(running: dict[asyncio.Task, OpsJobStep], reporters: dict[str, ProgressReporter]):
+    """取消執行中的 step（先停掉它們的進度寫入），等它們結束，回傳被中斷的 step"""
+    steps = list(running.values())
+    for step in steps:
+        await reporters.pop(step.name).close()
+    for task in running:
+        task.cancel()
+    await asyncio.gather(*running, return_exceptions=True)
+    running.clear()
+    return steps
+
+
+def _load_job(db: Session, job_id: str):
+    """載入 job 與所有 step（在 DB thread 執行）"""
+    job = db.scalar(select(OpsJob).where(OpsJob.job_id == job_id))
+    if not job:
+        return None, []
+    steps = db.scalars(
+        select(OpsJobStep)
+        .where(OpsJobStep.job_uid == job.uid)
+        .order_by(OpsJobStep.step_order)
+    ).all()
+    return job, steps
+
+
+def _record_failure(
+    db: Session,
+    job: OpsJob,
+    definition: JobDefinition | None,
+    error: Exception,
+    uncommitted: list,
+    failed: list[tuple[OpsJobStep, BaseException]],
+    interrupted: list[OpsJobStep],
+):
+    """rollback 後記錄 step 的失敗與 job 的重試 / 失敗（在 DB thread 執行，所有 step 都已結束）"""
+    job_id = job.job_id
+    db.rollback()
+
+    for step, detail, finished_at in uncommitted:
+        step.status = "success"
+        step.detail = detail
+        step.finished_at = finished_at
+    for step, step_error in failed:
+        step.status = "failed"
+        step.detail = f"error: {step_error}"
+        step.finished_at = now_utc()
+    for step in interrupted:
+        step.status = "pending"
+        step.detail = f"interrupted: step {failed[0][0].name} failed" if failed else f"interrupted: {error}"
+        step.finished_at = None
+
+    # step 的 failed 與 job 的重試 / 失敗同一次 commit
+    policy = definition.retry_policy if definition else DEFAULT_RETRY_POLICY
+    delay = schedule_retry(db, job, error, now_utc(), policy)
+    if delay is not None:
+        print(
+            f"[job {job_id}] retrying in {delay:.1f}s "
+            f"(attempt {job.retry_count}/{job.max_retries})"
+        )
+    else:
+        print(f"[job {job_id}] failed permanently (retries {job.retry_count}/{job.max_retries})")
+        if definition and definition.on_failed:
+            try:
+                definition.on_failed(db, job)
+            except Exception as hook_error:
+                db.rollback()
+                print(f"[job {job_id}] on_failed error: {hook_error}")
+
+
+def _defer_job(db: Session, job: OpsJob, deferred: list[tuple[OpsJobStep, JobDeferred]]) -> float:
+    """step 要求延後（JobDeferred）：step 改回 pending，job 在 next_run_at 重新領取，不計入重試次數"""
+    for step, d in deferred:
+        step.status = "pending"
+        step.detail = d.detail
+        step.finished_at = None
+    delay = min(d.delay for _, d in deferred)
+    job.status = "pending"
+    job.next_run_at = now_utc() + timedelta(seconds=delay)
+    db.commit()
+    return delay
+
+
+async def run_job(job_id: str):
+    """
+    由 job worker 交給 job runtime，依 job.type 的定義執行。
+
+    已成功的 step 會跳過（重試、lease 過期被接手時從失敗的 step 繼續）；
+    一個 step 失敗時取消同時執行中的其他 step（改回 pending，重試時重新執行），
+    依定義的 retry_policy 排入重試或標記為 failed。
+    step raise JobDeferred 時不再開始新的 step，執行中的 step 結束後整個 job 延後重新領取。
+
+    所有 job 共用同一個 event loop：session 的 DB 操作都在 DB thread 執行（run_in_db_thread），
+    執行中的 step 也可能在使用 session，修改 step 物件與 commit 前先取得 ctx.db_lock。
+    """
+    running: dict[asyncio.Task, OpsJobStep] = {}
+    reporters: dict[str, ProgressReporter] = {}
+    # job 執行期間只有持有 lease 的 worker 會寫入這個 job 的 step，記憶體內的狀態即為最新
+    db = SessionLocal(expire_on_commit=False)
+    job = None
+    definition = None
+    # 已完成但還沒 commit 的 step：(step, detail, finished_at)，rollback 後補回
+    uncommitted: list[tuple[OpsJobStep, str | None, object]] = []
+    failed: list[tuple[OpsJobStep, BaseException]] = []
+    deferred: list[tuple[OpsJobStep, JobDeferred]] = []
+    interrupted: list[OpsJobStep] = []
+    try:
+        job, steps = await run_in_db_thread(_load_job, db, job_id)
+        if not job:
+            raise RuntimeError(f"job {job_id} not found")
+        definition = get_definition(job.type)
+
+        try:
+            params = definition.params.parse_obj(job.params)
+        except ValidationError as e:
+            raise FatalJobError(f"invalid params: {e}")
+
+        deps = _dependencies(steps)
+        done = {s.name for s in steps if s.status == "success"}
+        remaining = [s for s in steps if s.status != "success"]
+        for s in remaining:
+            if definition.get_step(s.name) is None:
+                raise FatalJobError(f"step {s.name} is not defined for job type {job.type}")
+
+        ctx = JobContext(job_id=job.job_id, job_uid=job.uid, params=params, db=db)
+        job.status = "running"
+        if definition.setup:
+            await definition.setup(ctx)
+
+        while remaining or running:
+            async with ctx.db_lock:
+                # 依賴都已成功的 step，在 parallelism 上限內開始執行；
+                # 有 step 延後時不再開始新的 step，等執行中的 step 結束後整個 job 延後
+                ready = [] if deferred else [s for s in remaining if deps[s.name] <= done]
+                for step in ready[: definition.parallelism - len(running)]:
+                    remaining.remove(step)
+                    step.status = "running"
+                    step.started_at = now_utc()
+                    step.detail = None
+                    step.finished_at = None
+                    # 每個 step 一份 context（step、進度 reporter 不同，state、db_lock 共用）；
+                    # task 在下一次 await 才開始執行
+                    reporter = ProgressReporter(
+                        _progress_writer(job, step.name),
+                        settings.JOB_PROGRESS_INTERVAL_SECONDS,
+                    )
+                    reporters[step.name] = reporter
+                    run = definition.get_step(step.name).run(replace(ctx, step=step.name, reporter=reporter))
+                    running[asyncio.ensure_future(run)] = step
+
+                # 已完成 step 的 success 與接著開始的 step 的 running 同一次 commit
+                await run_in_db_thread(db.commit)
+                uncommitted.clear()
+
+            if not running:
+                if deferred:
+                    break
+                names = [s.name for s in remaining]
+                raise FatalJobError(f"steps {names} have dependencies that can never succeed")
+
+            finished, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            async with ctx.db_lock:
+                for task in sorted(finished, key=lambda t: running[t].step_order):
+                    step = running.pop(task)
+                    # step 已結束，還沒寫入的進度不再需要；寫到一半的等它完成，不會排在 success 之後
+                    await reporters.pop(step.name).close()
+                    if task.cancelled():
+                        failed.append((step, RuntimeError(f"step {step.name} cancelled")))
+                        continue
+                    if isinstance(task.exception(), JobDeferred):
+                        deferred.append((step, task.exception()))
+                        continue
+                    if task.exception() is not None:
+                        failed.append((step, task.exception()))
+                        continue
+                    step.status = "success"
+                    step.detail = task.result()
+                    step.finished_at = now_utc()
+                    uncommitted.append((step, step.detail, step.finished_at))
+                    done.add(step.name)
+
+            if failed:
+                # 同時執行中的其他 step 取消，等它們結束後再標記狀態
+                # 已經延後的 step 也改回 pending，重試時重新執行
+                interrupted = await _stop_running(running, reporters) + [s for s, _ in deferred]
+                raise failed[0][1]
+
+        if deferred:
+            delay = await run_in_db_thread(_defer_job, db, job, deferred)
+            print(f"[job {job_id}] deferred {delay:.1f}s: {deferred[0][1].detail}")
+        else:
+            job.status = "success"
+            job.finished_at = now_utc()
+            await run_in_db_thread(db.commit)
+
+    except Exception as e:
+        print(f"[job {job_id}] error: {e}")
+        # commit 失敗等情況下還有 step 在執行：先停掉（包含進度寫入），再使用 session
+        if running:
+            interrupted = await _stop_running(running, reporters)
+        if job:
+            await run_in_db_thread(
+                _record_failure, db, job, definition, e, uncommitted, failed, interrupted
+            )
+        else:
+            await run_in_db_thread(db.rollback)
+
+    finally:
+        # run_job 本身被取消（lease 被其他 worker 接手）時，不留下還在執行的 step
+        if running:
+            await _stop_running(running, reporters)
+        for reporter in reporters.values():
+            await reporter.close()
+        await run_in_db_thread(db.close)
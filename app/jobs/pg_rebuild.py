@@ -1,217 +1,340 @@
-import asyncio
+"""
+PG rebuild
+
+strategy = scale-to-zero（預設）：
+1. scale sts -> 0
+2. 等所有 pod down
+3. delete 對應 PVC
+4. scale sts -> target_replicas
+5. 等 pod ready
+
+strategy = ordinal：只回收目標 ordinal，其他 replica 持續服務，重建時間只跟一個 pod 有關
+1. delete 目標 PVC（pod 還在使用，pvc-protection finalizer 讓它停在 Terminating）
+2. delete 目標 pod（StatefulSet 不變，controller 只會重建這個 ordinal）
+3. 等舊 PVC 真正刪除（pod 結束後 finalizer 才會移除）
+4. 舊 PVC 還在 Terminating 時 controller 可能已經重建 pod，這個 pod 不會有新的 PVC
+   而卡在 Pending，刪除它讓 controller 連同 PVC 一起重建
+5. 等這個 ordinal 的新 pod ready
+
+StatefulSet 有尚未完成的 rollout（currentRevision != updateRevision）時不使用 ordinal：
+重建的 pod 會依 partition / OnDelete 規則換成另一個 revision，與其他 replica 不一致。
+
+由 executor 依序執行，暫時性錯誤時依 retry policy 排入重試，從失敗步驟繼續執行
+"""
+
 from datetime import datetime, timezone
 import uuid
 
-from sqlalchemy import select
+from kubernetes import client
+from kubernetes.client.exceptions import ApiException
 
 from ..config import settings
-from ..db import SessionLocal
-from ..k8s_client import core_v1, apps_v1
-from ..models import OpsJob, OpsJobStep
+from ..ids import uuid7
+from ..k8s_client import async_core_v1, async_apps_v1
+from ..informer import get_informer, wait_until_all
+from ..schemas import PgRebuildParams
+from ..statefulsets import (
+    is_owned_by,
+    is_pod_ready,
+    pods_of,
+    resolve_statefulset,
+    rollout_status,
+    spec_replicas,
+)
+from .registry import JobContext, JobDefinition, Step, register
+from .retry import FatalJobError
 
 
 def now_utc():
     return datetime.now(timezone.utc)
 
 
-def gen_job_id(job_type: str) -> str:
-    return f"{now_utc().isoformat()}_{job_type}_{uuid.uuid4().hex[:8]}"
-
-
-def run_pg_rebuild_job(job_id: str):
+def gen_job_uid() -> uuid.UUID:
+    """新 job 的 uid（UUIDv7），對外的 job_id 為 str(uid)"""
+    return uuid7()
+
+
+async def _setup(ctx: JobContext):
+    p: PgRebuildParams = ctx.params
+    if p.namespace not in settings.ALLOWED_NAMESPACES:
+        raise FatalJobError(f"namespace {p.namespace} not allowed")
+
+    # 解析一次 StatefulSet 的 uid 與 selector，之後用來過濾 pod
+    ctx.state["sts_ref"] = await resolve_statefulset(p.namespace, p.statefulset)
+    if p.strategy == "ordinal":
+        await _check_ordinal_target(p)
+
+
+async def step_scale_to_zero(ctx: JobContext):
+    p: PgRebuildParams = ctx.params
+    patch = {"spec": {"replicas": 0}}
+    await async_apps_v1.patch_namespaced_stateful_set(
+        name=p.statefulset,
+        namespace=p.namespace,
+        body=patch,
+    )
+    return "scaled to 0"
+
+
+async def step_wait_pods_down(ctx: JobContext):
+    p: PgRebuildParams = ctx.params
+    sts_ref = ctx.state["sts_ref"]
+
+    # 從共用的 informer cache 等待，pod 刪除後立即反應
+    def check(store):
+        names = sorted(pod.metadata.name for pod in pods_of(store, sts_ref))
+        if not names:
+            return True, "all pods down"
+        return False, f"remaining pods: {names}"
+
+    try:
+        return await get_informer("Pod", p.namespace).wait_until(
+            check,
+            timeout=300,  # 最多等 5 分鐘
+            on_progress=ctx.progress,
+        )
+    except TimeoutError:
+        raise RuntimeError("timeout waiting pods down")
+
+
+async def step_delete_pvc(ctx: JobContext):
+    p: PgRebuildParams = ctx.params
+    pvc_name = f"data-{p.statefulset}-{p.ordinal}"
+    try:
+        await async_core_v1.delete_namespaced_persistent_volume_claim(
+            name=pvc_name,
+            namespace=p.namespace,
+        )
+    except ApiException as e:
+        # 上一次執行已經刪除（例如刪除後 commit 前 lease 過期）：404 不是錯誤，重試時直接往下
+        if e.status != 404:
+            raise
+        return f"pvc {pvc_name} already deleted"
+    return f"deleted pvc {pvc_name}"
+
+
+async def step_scale_to_target(ctx: JobContext):
+    p: PgRebuildParams = ctx.params
+    patch = {"spec": {"replicas": p.target_replicas}}
+    await async_apps_v1.patch_namespaced_stateful_set(
+        name=p.statefulset,
+        namespace=p.namespace,
+        body=patch,
+    )
+    return f"scaled to {p.target_replicas}"
+
+
+async def step_wait_pods_ready(ctx: JobContext):
+    p: PgRebuildParams = ctx.params
+    sts_ref = ctx.state["sts_ref"]
+
+    # 直接看 StatefulSet status（readyReplicas / observedGeneration），
+    # 只需要一個物件，不用逐一檢查 pod
+    def check(store):
+        sts = store.get(p.statefulset)
+        if sts is None or sts.metadata.uid != sts_ref.uid:
+            return False, f"statefulset {p.statefulset} not found"
+        return rollout_status(sts, p.target_replicas)
+
+    try:
+        return await get_informer("StatefulSet", p.namespace).wait_until(
+            check,
+            timeout=600,  # 最多等 10 分鐘
+            on_progress=ctx.progress,
+        )
+    except TimeoutError:
+        raise RuntimeError("timeout waiting pods ready")
+
+
+# ----- strategy = ordinal -----
+
+
+def _ordinal_names(p: PgRebuildParams) -> tuple[str, str]:
+    """(pod, PVC) 的名稱"""
+    return f"{p.statefulset}-{p.ordinal}", f"data-{p.statefulset}-{p.ordinal}"
+
+
+async def _check_ordinal_target(p: PgRebuildParams):
+    sts = await async_apps_v1.read_namespaced_stateful_set(name=p.statefulset, namespace=p.namespace)
+    if p.ordinal >= spec_replicas(sts):
+        raise FatalJobError(f"ordinal {p.ordinal} out of range (replicas {spec_replicas(sts)})")
+    status = sts.status
+    if status and status.update_revision and status.current_revision != status.update_revision:
+        raise FatalJobError(
+            f"statefulset {p.statefulset} has a rollout in progress "
+            f"({status.current_revision} -> {status.update_revision}), use strategy scale-to-zero"
+        )
+
+
+async def _read_or_none(read, **kwargs):
+    # 直接讀 apiserver（不經過 informer cache），剛刪除 / 建立的物件不會讀到舊的狀態
+    try:
+        return await read(**kwargs)
+    except ApiException as e:
+        if e.status == 404:
+            return None
+        raise
+
+
+async def _delete_pod(ctx: JobContext, pod) -> bool:
     """
-    同步包裝函數，用於 FastAPI BackgroundTasks。
-    在新的 event loop 中執行 async job。
-    """
-    asyncio.run(_run_pg_rebuild_job_async(job_id))
-
+    依 uid 刪除 pod（讀取之後已經被換成新的 pod 時不刪），回傳是否有刪除。
 
-async def _run_pg_rebuild_job_async(job_id: str):
-    """
-    背景執行 PG rebuild 流程：
-    1. scale sts -> 0
-    2. 等所有 pod down
-    3. delete 對應 PVC
-    4. scale sts -> target_replicas
-    5. 等 pod ready
-
-    支援自動重試：從失敗步驟繼續執行
+    uid 記在 ctx.state["deleted_pod_uids"]：informer cache 裡還沒移除的這個 pod，
+    wait_ordinal_ready 不會當成重建後的 pod。
     """
-    # 使用 context manager 管理 session
-    with SessionLocal() as db:
-        try:
-            # SQLAlchemy 2.0 style: select() + where()
-            stmt = select(OpsJob).where(OpsJob.job_id == job_id)
-            job = db.scalar(stmt)
-
-            if not job:
-                raise RuntimeError(f"job {job_id} not found")
-
-            job.status = "running"
-            db.commit()
-
-            params = job.params
-            ns = params["namespace"]
-            sts_name = params["statefulset"]
-            ordinal = params["ordinal"]
-            target_replicas = params["target_replicas"]
-            pvc_name = f"data-{sts_name}-{ordinal}"
-
-            if ns not in settings.ALLOWED_NAMESPACES:
-                raise RuntimeError(f"namespace {ns} not allowed")
-
-            # 查詢已完成的步驟（用於重試時跳過）
-            steps_stmt = (
-                select(OpsJobStep)
-                .where(OpsJobStep.job_id == job_id, OpsJobStep.status == "success")
-            )
-            completed_steps = {s.name for s in db.scalars(steps_stmt).all()}
-
-            async def run_step(step_name: str, func):
-                # SQLAlchemy 2.0 style
-                step_stmt = select(OpsJobStep).where(
-                    OpsJobStep.job_id == job_id,
-                    OpsJobStep.name == step_name
-                )
-                step = db.scalar(step_stmt)
-
-                if not step:
-                    raise RuntimeError(f"step {step_name} not found")
-
-                step.status = "running"
-                step.started_at = now_utc()
-                step.detail = None
-                db.commit()
-
-                try:
-                    detail = await func()
-                    step.status = "success"
-                    step.detail = detail
-                    step.finished_at = now_utc()
-                    db.commit()
-                except Exception as e:
-                    step.status = "failed"
-                    step.detail = f"error: {e}"
-                    step.finished_at = now_utc()
-                    job.status = "failed"
-                    job.finished_at = now_utc()
-                    db.commit()
-                    raise
-
-            async def step_scale_to_zero():
-                patch = {"spec": {"replicas": 0}}
-                apps_v1.patch_namespaced_stateful_set(
-                    name=sts_name,
-                    namespace=ns,
-                    body=patch,
-                )
-                return "scaled to 0"
-
-            async def step_wait_pods_down():
-                # 這裡直接列出 namespace 所有 pod，再用 name prefix 過濾
-                for _ in range(60):  # 最多等 5 分鐘
-                    pods = core_v1.list_namespaced_pod(namespace=ns).items
-                    related = [
-                        p for p in pods
-                        if p.metadata.name.startswith(f"{sts_name}-")
-                    ]
-                    if not related:
-                        return "all pods down"
-
-                    names = [p.metadata.name for p in related]
-                    # 更新 detail
-                    step_stmt = select(OpsJobStep).where(
-                        OpsJobStep.job_id == job_id,
-                        OpsJobStep.name == "wait_pods_down"
-                    )
-                    step = db.scalar(step_stmt)
-                    if step:
-                        step.detail = f"remaining pods: {names}"
-                        db.commit()
-                    await asyncio.sleep(5)
-                raise RuntimeError("timeout waiting pods down")
-
-            async def step_delete_pvc():
-                core_v1.delete_namespaced_persistent_volume_claim(
-                    name=pvc_name,
-                    namespace=ns,
-                )
-                return f"deleted pvc {pvc_name}"
-
-            async def step_scale_to_target():
-                patch = {"spec": {"replicas": target_replicas}}
-                apps_v1.patch_namespaced_stateful_set(
-                    name=sts_name,
-                    namespace=ns,
-                    body=patch,
-                )
-                return f"scaled to {target_replicas}"
-
-            async def step_wait_pods_ready():
-                for _ in range(120):  # 最多等 10 分鐘
-                    pods = core_v1.list_namespaced_pod(namespace=ns).items
-                    related = [p for p in pods if p.metadata.name.startswith(f"{sts_name}-")]
-                    if len(related) < target_replicas:
-                        await asyncio.sleep(5)
-                        continue
-
-                    not_ready = []
-                    for p in related:
-                        conds = p.status.conditions or []
-                        ready = any(
-                            c.type == "Ready" and c.status == "True" for c in conds
-                        )
-                        if not ready:
-                            not_ready.append(p.metadata.name)
-
-                    if not not_ready:
-                        return f"{len(related)} pods ready"
-
-                    # 更新 detail
-                    step_stmt = select(OpsJobStep).where(
-                        OpsJobStep.job_id == job_id,
-                        OpsJobStep.name == "wait_pods_ready"
-                    )
-                    step = db.scalar(step_stmt)
-                    if step:
-                        step.detail = f"not ready: {not_ready}"
-                        db.commit()
-                    await asyncio.sleep(5)
-                raise RuntimeError("timeout waiting pods ready")
-
-            # 執行步驟（跳過已成功的步驟）
-            if "scale_sts_to_zero" not in completed_steps:
-                await run_step("scale_sts_to_zero", step_scale_to_zero)
-            if "wait_pods_down" not in completed_steps:
-                await run_step("wait_pods_down", step_wait_pods_down)
-            if "delete_pvc" not in completed_steps:
-                await run_step("delete_pvc", step_delete_pvc)
-            if "scale_sts_to_target" not in completed_steps:
-                await run_step("scale_sts_to_target", step_scale_to_target)
-            if "wait_pods_ready" not in completed_steps:
-                await run_step("wait_pods_ready", step_wait_pods_ready)
-
-            job.status = "success"
-            job.finished_at = now_utc()
-            db.commit()
-
-        except Exception as e:
-            print(f"[job {job_id}] error: {e}")
-
-            # 自動重試邏輯
-            if job.retry_count < job.max_retries:
-                job.retry_count += 1
-                job.status = "pending"
-                db.commit()
-
-                print(f"[job {job_id}] retrying... (attempt {job.retry_count}/{job.max_retries})")
-
-                # 等待 2 秒後重試（遞迴呼叫）
-                await asyncio.sleep(2)
-                await _run_pg_rebuild_job_async(job_id)
-            else:
-                # 達到最大重試次數
-                print(f"[job {job_id}] max retries exceeded")
-                job.status = "failed"
-                job.finished_at = now_utc()
-                db.commit()
+    uid = pod.metadata.uid
+    ctx.state.setdefault("deleted_pod_uids", set()).add(uid)
+    try:
+        await async_core_v1.delete_namespaced_pod(
+            name=pod.metadata.name,
+            namespace=ctx.params.namespace,
+            body=client.V1DeleteOptions(preconditions=client.V1Preconditions(uid=uid)),
+        )
+    except ApiException as e:
+        # 404：已經刪除；409：uid 不符，已經被 controller 換成新的 pod
+        if e.status not in (404, 409):
+            raise
+        return False
+    return True
+
+
+async def step_delete_ordinal_pvc(ctx: JobContext):
+    p: PgRebuildParams = ctx.params
+    _, pvc_name = _ordinal_names(p)
+    try:
+        await async_core_v1.delete_namespaced_persistent_volume_claim(name=pvc_name, namespace=p.namespace)
+    except ApiException as e:
+        if e.status != 404:
+            raise
+        return f"pvc {pvc_name} already deleted"
+    return f"deleted pvc {pvc_name} (terminating until its pod is gone)"
+
+
+async def step_delete_ordinal_pod(ctx: JobContext):
+    p: PgRebuildParams = ctx.params
+    pod_name, _ = _ordinal_names(p)
+    pod = await _read_or_none(async_core_v1.read_namespaced_pod, name=pod_name, namespace=p.namespace)
+    if pod is None or not await _delete_pod(ctx, pod):
+        return f"pod {pod_name} already deleted"
+    return f"deleted pod {pod_name}"
+
+
+async def step_wait_ordinal_pvc_gone(ctx: JobContext):
+    p: PgRebuildParams = ctx.params
+    _, pvc_name = _ordinal_names(p)
+
+    pvc = await _read_or_none(
+        async_core_v1.read_namespaced_persistent_volume_claim, name=pvc_name, namespace=p.namespace
+    )
+    if pvc is None:
+        return f"pvc {pvc_name} deleted"
+    if pvc.metadata.deletion_timestamp is None:
+        # 刪除已經完成，這是 controller 重建的新 PVC（重試時）
+        return f"pvc {pvc_name} recreated"
+    old_uid = pvc.metadata.uid
+
+    def check(store):
+        current = store.get(pvc_name)
+        if current is None:
+            return True, f"pvc {pvc_name} deleted"
+        if current.metadata.uid != old_uid:
+            return True, f"pvc {pvc_name} recreated"
+        return False, f"pvc {pvc_name} terminating, waiting for pod to stop"
+
+    try:
+        return await get_informer("PersistentVolumeClaim", p.namespace).wait_until(
+            check,
+            timeout=300,  # 最多等 5 分鐘
+            on_progress=ctx.progress,
+        )
+    except TimeoutError:
+        raise RuntimeError(f"timeout waiting pvc {pvc_name} deleted")
+
+
+async def step_recreate_ordinal_pod(ctx: JobContext):
+    p: PgRebuildParams = ctx.params
+    pod_name, pvc_name = _ordinal_names(p)
+
+    pod = await _read_or_none(async_core_v1.read_namespaced_pod, name=pod_name, namespace=p.namespace)
+    if pod is None:
+        return f"pod {pod_name} will be created by the controller"
+    pvc = await _read_or_none(
+        async_core_v1.read_namespaced_persistent_volume_claim, name=pvc_name, namespace=p.namespace
+    )
+    if pvc is not None:
+        return f"pod {pod_name} has pvc {pvc_name}"
+    if pod.status and pod.status.phase != "Pending":
+        raise RuntimeError(f"pod {pod_name} is {pod.status.phase} without pvc {pvc_name}")
+
+    # pod 在舊 PVC 還沒刪除時就被重建，不會再有新的 PVC：刪除讓 controller 連同 PVC 重建
+    if not await _delete_pod(ctx, pod):
+        return f"pending pod {pod_name} already replaced"
+    return f"deleted pending pod {pod_name} that was created before pvc {pvc_name} was gone"
+
+
+async def step_wait_ordinal_ready(ctx: JobContext):
+    p: PgRebuildParams = ctx.params
+    sts_ref = ctx.state["sts_ref"]
+    pod_name, pvc_name = _ordinal_names(p)
+
+    # pod 與 PVC 的 watch 互相沒有順序：新的 PVC 出現時，cache 裡可能還是 delete_ordinal_pod /
+    # recreate_ordinal_pod 刪除的 pod，依 uid 排除。ctx.state 不會保存，重試時（之前的 step 已成功）
+    # 沒有這些 uid，但那時舊 pod 早已從 cache 移除（舊 PVC 要等舊 pod 結束才會刪除）
+    deleted_uids = ctx.state.get("deleted_pod_uids", set())
+
+    def check(pods, pvcs):
+        pvc = pvcs.get(pvc_name)
+        if pvc is None or pvc.metadata.deletion_timestamp is not None:
+            return False, f"waiting for pvc {pvc_name} to be created"
+        pod = pods.get(pod_name)
+        if pod is None or not is_owned_by(pod, sts_ref.uid):
+            return False, f"waiting for pod {pod_name} to be created"
+        if pod.metadata.uid in deleted_uids:
+            return False, f"waiting for old pod {pod_name} to be replaced"
+        if not is_pod_ready(pod):
+            phase = pod.status.phase if pod.status else "Unknown"
+            return False, f"pod {pod_name} {phase}, not ready"
+        return True, f"pod {pod_name} ready"
+
+    try:
+        # pod 與 PVC 的 watch 沒有先後順序，兩邊的變化都要重新判斷
+        return await wait_until_all(
+            [get_informer("Pod", p.namespace), get_informer("PersistentVolumeClaim", p.namespace)],
+            check,
+            timeout=600,  # 最多等 10 分鐘
+            on_progress=ctx.progress,
+        )
+    except TimeoutError:
+        raise RuntimeError(f"timeout waiting pod {pod_name} ready")
+
+
+def _scale_to_zero(p: PgRebuildParams) -> bool:
+    return p.strategy == "scale-to-zero"
+
+
+def _ordinal(p: PgRebuildParams) -> bool:
+    return p.strategy == "ordinal"
+
+
+PG_REBUILD = register(
+    JobDefinition(
+        type="pg-rebuild",
+        params=PgRebuildParams,
+        steps=(
+            Step("scale_sts_to_zero", step_scale_to_zero, when=_scale_to_zero),
+            Step("wait_pods_down", step_wait_pods_down, when=_scale_to_zero),
+            Step("delete_pvc", step_delete_pvc, when=_scale_to_zero),
+            Step("scale_sts_to_target", step_scale_to_target, when=_scale_to_zero),
+            Step("wait_pods_ready", step_wait_pods_ready, when=_scale_to_zero),
+            Step("delete_ordinal_pvc", step_delete_ordinal_pvc, when=_ordinal, depends_on=()),
+            Step("delete_ordinal_pod", step_delete_ordinal_pod, when=_ordinal),
+            Step("wait_ordinal_pvc_gone", step_wait_ordinal_pvc_gone, when=_ordinal),
+            Step("recreate_ordinal_pod", step_recreate_ordinal_pod, when=_ordinal),
+            Step("wait_ordinal_ready", step_wait_ordinal_ready, when=_ordinal),
+        ),
+        setup=_setup,
+        namespace=lambda p: p.namespace,
+        target_resource=lambda p: f"statefulset/{p.statefulset}",
+    )
+)
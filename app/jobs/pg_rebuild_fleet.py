@@ -0,0 +1,260 @@
+"""
+PG rebuild fleet：一次重建多個 StatefulSet / ordinal（例如 storage migration）
+
+1. create_children: 展開要重建的 StatefulSet（明確列出或 label selector）與 ordinal，
+   每個 (StatefulSet, ordinal) 建立一個 waiting 的 child pg-rebuild job
+2. run_children: 在限制內把 child 改成 pending 放行，由 job queue 領取執行，
+   彙整 child 狀態寫成這個 step 的 detail；還有 child 沒結束時 raise JobDeferred，
+   parent 回到 queue，JOB_FLEET_POLL_INTERVAL_SECONDS 後再檢查一次。等待期間 parent
+   不佔用 job runtime 的位置（max_parallel 大於空位也不會卡住 child），也不持有 DB transaction
+
+限制：
+- 同時執行（pending / running）的 child 最多 max_parallel 個，每個 namespace 最多
+  max_parallel_per_namespace 個
+- 同一個 StatefulSet 一次只重建一個 ordinal（scale-to-zero 會 scale 整個 StatefulSet；
+  ordinal 也一次只讓一個 replica 離線）
+- 失敗（重試用完）的 child 超過 max_failures 個時不再放行，剩下的 child 標記為 cancelled
+- parent 本身失敗（不再重試）時，還沒放行的 child 也標記為 cancelled，不會一直停在 waiting；
+  手動重試 parent 且失敗數仍在預算內時，這些 child 改回 waiting 繼續放行
+
+child 是一般的 pg-rebuild job（各自重試、各自的 timeline），parent 重試或被其他 worker
+接手時依 ops_job 上 child 的狀態繼續，不會重複建立或重複放行。
+"""
+
+from collections import Counter
+
+from sqlalchemy import func, select
+
+from ..config import settings
+from ..k8s_client import async_apps_v1
+from ..models import OpsJob
+from ..schemas import PgRebuildFleetParams, PgRebuildParams
+from ..statefulsets import spec_replicas
+from .executor import enqueue_job
+from .pg_rebuild import PG_REBUILD, now_utc
+from .queue import job_worker
+from .registry import JobContext, JobDefinition, Step, register
+from .retry import FatalJobError, JobDeferred
+
+# 還在 job queue 內（已放行、還沒結束）的 child
+IN_FLIGHT_STATUSES = ("pending", "running")
+
+
+def fleet_namespaces(p: PgRebuildFleetParams) -> set[str]:
+    return {t.namespace for t in p.statefulsets} | set(p.namespaces)
+
+
+async def _setup(ctx: JobContext):
+    p: PgRebuildFleetParams = ctx.params
+    if not p.statefulsets and not p.label_selector:
+        raise FatalJobError("statefulsets or label_selector is required")
+    if p.label_selector and not p.namespaces:
+        raise FatalJobError("namespaces is required with label_selector")
+    denied = fleet_namespaces(p) - settings.ALLOWED_NAMESPACES
+    if denied:
+        raise FatalJobError(f"namespaces {sorted(denied)} not allowed")
+
+
+async def _resolve_targets(p: PgRebuildFleetParams) -> tuple[list[PgRebuildParams], list[str]]:
+    """
+    Returns:
+        (targets, skipped)：要重建的 (StatefulSet, ordinal) 與超出 replicas 而略過的
+    """
+    # (namespace, statefulset) -> (ordinals, target_replicas)
+    wanted: dict[tuple[str, str], tuple[list[int], int | None]] = {}
+    for namespace in p.namespaces if p.label_selector else ():
+        sts_list = await async_apps_v1.list_namespaced_stateful_set(
+            namespace=namespace,
+            label_selector=p.label_selector,
+        )
+        for sts in sts_list.items:
+            wanted[(namespace, sts.metadata.name)] = (p.ordinals, spec_replicas(sts))
+    for t in p.statefulsets:
+        replicas = t.target_replicas
+        if replicas is None:
+            sts = await async_apps_v1.read_namespaced_stateful_set(name=t.statefulset, namespace=t.namespace)
+            replicas = spec_replicas(sts)
+        wanted[(t.namespace, t.statefulset)] = (t.ordinals, replicas)
+
+    targets = []
+    skipped = []
+    for (namespace, name), (ordinals, replicas) in sorted(wanted.items()):
+        for ordinal in sorted(set(ordinals)):
+            if ordinal >= replicas:
+                skipped.append(f"{namespace}/{name}-{ordinal}")
+                continue
+            targets.append(
+                PgRebuildParams(
+                    namespace=namespace,
+                    statefulset=name,
+                    ordinal=ordinal,
+                    target_replicas=replicas,
+                    strategy=p.strategy,
+                )
+            )
+    return targets, skipped
+
+
+async def step_create_children(ctx: JobContext):
+    p: PgRebuildFleetParams = ctx.params
+    targets, skipped = await _resolve_targets(p)
+    if not targets:
+        raise FatalJobError(f"no statefulset ordinals to rebuild (skipped: {skipped})")
+
+    # 與這個 step 的 success 同一次 commit：重試時不會重複建立
+    await ctx.run_db(_create_children, ctx.job_uid, targets, p)
+
+    detail = f"created {len(targets)} child jobs"
+    if skipped:
+        # 幾百個 StatefulSet 時只列出前幾個
+        more = f" (+{len(skipped) - 10} more)" if len(skipped) > 10 else ""
+        detail += f", skipped {len(skipped)} ordinals beyond replicas: {skipped[:10]}{more}"
+    return detail
+
+
+def _create_children(db, job_uid, targets: list[PgRebuildParams], p: PgRebuildFleetParams):
+    parent = db.scalar(select(OpsJob).where(OpsJob.uid == job_uid))
+    for target in targets:
+        enqueue_job(
+            db,
+            PG_REBUILD,
+            target,
+            max_retries=p.child_max_retries,
+            actor=parent.actor,
+            source_ip=parent.source_ip,
+            parent_uid=job_uid,
+            waiting=True,
+        )
+
+
+def _release(p: PgRebuildFleetParams, children: list) -> list[int]:
+    """在全部 / 每個 namespace / 每個 StatefulSet 的限制內，依建立順序挑出可以放行的 waiting child（回傳 id）"""
+    in_flight = [c for c in children if c.status in IN_FLIGHT_STATUSES]
+    per_namespace = Counter(c.namespace for c in in_flight)
+    busy = {(c.namespace, c.target_resource) for c in in_flight}
+    slots = p.max_parallel - len(in_flight)
+
+    released = []
+    for child in children:
+        if slots <= 0:
+            break
+        if child.status != "waiting":
+            continue
+        if per_namespace[child.namespace] >= p.max_parallel_per_namespace:
+            continue
+        if (child.namespace, child.target_resource) in busy:
+            continue
+        released.append(child.id)
+        per_namespace[child.namespace] += 1
+        busy.add((child.namespace, child.target_resource))
+        slots -= 1
+    return released
+
+
+def _summary(counts: Counter, p: PgRebuildFleetParams) -> str:
+    total = sum(counts.values())
+    parts = [f"{counts['success']}/{total} succeeded"]
+    for status in ("running", "pending", "waiting", "failed", "cancelled"):
+        if counts[status]:
+            parts.append(f"{counts[status]} {status}")
+    parts.append(f"failure budget {counts['failed']}/{p.max_failures}")
+    return ", ".join(parts)
+
+
+def _set_status(db, ids: list[int], **values):
+    # 用 ORM 更新，狀態轉換和一般的 job 一樣記錄到 ops_job_event、通知 subscriber
+    jobs = db.scalars(
+        select(OpsJob).where(OpsJob.id.in_(ids)).execution_options(populate_existing=True)
+    ).all()
+    for job in jobs:
+        for key, value in values.items():
+            setattr(job, key, value)
+    db.commit()
+
+
+def _cancel_waiting_children(db, job: OpsJob):
+    waiting = db.scalars(
+        select(OpsJob.id).where(OpsJob.parent_uid == job.uid, OpsJob.status == "waiting")
+    ).all()
+    if waiting:
+        _set_status(db, waiting, status="cancelled", finished_at=now_utc())
+        print(f"[job {job.job_id}] cancelled {len(waiting)} waiting child jobs")
+
+
+def _reopen_cancelled_children(db, job_uid, p: PgRebuildFleetParams):
+    # 上一次執行失敗時取消的 child：失敗數仍在預算內就改回 waiting，繼續放行
+    failed = db.scalar(
+        select(func.count()).where(OpsJob.parent_uid == job_uid, OpsJob.status == "failed")
+    )
+    if failed > p.max_failures:
+        return
+    cancelled = db.scalars(
+        select(OpsJob.id).where(OpsJob.parent_uid == job_uid, OpsJob.status == "cancelled")
+    ).all()
+    if cancelled:
+        _set_status(db, cancelled, status="waiting", finished_at=None)
+
+
+def _poll_children(db, job_uid, p: PgRebuildFleetParams) -> tuple[Counter, bool]:
+    """讀取 child 的狀態並放行 / 取消 waiting 的 child，回傳 (各狀態數量, 是否有放行)"""
+    # 每次只讀判斷需要的欄位，child 的狀態由各自的 worker 更新
+    children = db.execute(
+        select(OpsJob.id, OpsJob.status, OpsJob.namespace, OpsJob.target_resource)
+        .where(OpsJob.parent_uid == job_uid)
+        .order_by(OpsJob.created_at, OpsJob.id)
+    ).all()
+    counts = Counter(c.status for c in children)
+
+    if counts["failed"] > p.max_failures:
+        # 超過失敗預算：不再放行，已經在執行的 child 讓它跑完
+        cancelled = [c.id for c in children if c.status == "waiting"]
+        if cancelled:
+            _set_status(db, cancelled, status="cancelled", finished_at=now_utc())
+            counts["cancelled"] += len(cancelled)
+            counts["waiting"] -= len(cancelled)
+        return counts, False
+
+    released = _release(p, children)
+    if released:
+        _set_status(db, released, status="pending", next_run_at=now_utc())
+        counts["pending"] += len(released)
+        counts["waiting"] -= len(released)
+    return counts, bool(released)
+
+
+async def step_run_children(ctx: JobContext):
+    p: PgRebuildFleetParams = ctx.params
+    await ctx.run_db(_reopen_cancelled_children, ctx.job_uid, p)
+    counts, released = await ctx.run_db(_poll_children, ctx.job_uid, p)
+    if released:
+        job_worker.wake()
+
+    if any(counts[s] for s in ("waiting", *IN_FLIGHT_STATUSES)):
+        # child 由 job queue 領取、執行；parent 不在這裡 sleep（會佔用 job runtime 的位置），
+        # 回到 queue 之後再檢查
+        raise JobDeferred(_summary(counts, p), settings.JOB_FLEET_POLL_INTERVAL_SECONDS)
+
+    if counts["failed"] > p.max_failures:
+        raise FatalJobError(f"failure budget exceeded: {_summary(counts, p)}")
+    return _summary(counts, p)
+
+
+def _fleet_namespace(p: PgRebuildFleetParams) -> str | None:
+    # 只有一個 namespace 時寫入 ops_job.namespace，GET /ops/jobs?namespace= 查得到
+    namespaces = fleet_namespaces(p)
+    return next(iter(namespaces)) if len(namespaces) == 1 else None
+
+
+PG_REBUILD_FLEET = register(
+    JobDefinition(
+        type="pg-rebuild-fleet",
+        params=PgRebuildFleetParams,
+        steps=(
+            Step("create_children", step_create_children),
+            Step("run_children", step_run_children),
+        ),
+        setup=_setup,
+        namespace=_fleet_namespace,
+        on_failed=_cancel_waiting_children,
+    )
+)
@@ -0,0 +1,74 @@
+"""
+Step progress reporter
+
+step 等待期間的進度（例如剩下哪些 pod）可能在短時間內變化很多次，幾百個 job 同時等待時
+每次變化都寫一筆 step.progress event 會變成 job engine 對 Postgres 最主要的寫入。
+ProgressReporter 合併這些寫入：
+
+- 內容與上次寫入相同時不寫（A -> B -> A 在同一個間隔內也不寫）
+- 每 interval 秒最多寫一次：間隔內的更新只保留最後一個，間隔到了再寫入，
+  最新的進度不會被丟掉
+- step 結束時 await close()，還沒寫入的進度直接捨棄（detail 由 success / failed 取代），
+  寫到一半的進度等它完成，不會排在 step 的 success / failed 之後
+
+write 是同步函數（自己開 session、commit），在 thread 內依序執行，不會卡住 event loop，
+也不會 commit 到 executor / step 共用的 session。
+
+只在 job runtime 的 event loop 上使用；thread 內的工作用 loop.call_soon_threadsafe 轉回來。
+"""
+
+import asyncio
+from typing import Callable
+
+
+class ProgressReporter:
+    def __init__(self, write: Callable[[str], None], interval: float):
+        self._write = write
+        self._interval = interval
+        self._written: str | None = None
+        self._pending: str | None = None
+        self._last_write_at = float("-inf")
+        self._timer: asyncio.TimerHandle | None = None
+        # 最後一個寫入的 task，下一筆等它完成後才寫（維持順序）
+        self._writing: asyncio.Task | None = None
+        self._closed = False
+
+    def report(self, detail: str):
+        if self._closed:
+            return
+        self._pending = detail
+        if self._timer is not None:
+            # 已經排定寫入，到時寫入最新的內容
+            return
+        loop = asyncio.get_running_loop()
+        delay = self._last_write_at + self._interval - loop.time()
+        if delay <= 0:
+            self._flush()
+        else:
+            self._timer = loop.call_later(delay, self._flush)
+
+    async def close(self):
+        self._closed = True
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._writing is not None:
+            await asyncio.wait([self._writing])
+
+    def _flush(self):
+        self._timer = None
+        detail, self._pending = self._pending, None
+        if self._closed or detail is None or detail == self._written:
+            return
+        self._last_write_at = asyncio.get_running_loop().time()
+        self._written = detail
+        self._writing = asyncio.ensure_future(self._write_after(self._writing, detail))
+
+    async def _write_after(self, previous: asyncio.Task | None, detail: str):
+        if previous is not None:
+            await asyncio.wait([previous])
+        try:
+            await asyncio.to_thread(self._write, detail)
+        except Exception as e:
+            # 進度只是顯示用，寫入失敗不影響 step 本身
+            print(f"[job-progress] failed to write progress: {e}")
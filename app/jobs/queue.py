@@ -0,0 +1,197 @@
+"""
+Durable job queue
+
+Job 建立時只寫入 ops_job（status = pending），由每個 API replica 上的
+JobWorker 從資料庫領取執行，pod 重啟不會遺失 job，也可以分散到多個 replica：
+
+- claim: SELECT ... FOR UPDATE SKIP LOCKED，多個 worker 同時領取不會拿到同一筆
+- lease: 領取時寫入 lease_owner / lease_expires_at，執行期間由 heartbeat 延長
+- reclaim: lease 過期（worker 掛掉、pod 被砍）的 running job 會被其他 worker 重新領取
+"""
+
+import os
+import queue
+import socket
+import threading
+from datetime import timedelta
+
+from sqlalchemy import and_, or_, select, update
+
+from ..config import settings
+from ..db import SessionLocal
+from ..models import OpsJob
+from .executor import run_job
+from .pg_rebuild import now_utc
+from .registry import JOB_DEFINITIONS
+from .runtime import job_runtime
+
+# 每個 process 一個 worker id，寫入 lease_owner
+WORKER_ID = f"{socket.gethostname()}-{os.getpid()}"
+
+
+def claim_jobs(limit: int) -> list[str]:
+    """
+    領取最多 limit 個可執行的 job，回傳 job_id。
+
+    可執行：next_run_at 已到的 pending，或 running 但 lease 已過期（原本的 worker 已經不在）。
+    """
+    now = now_utc()
+    with SessionLocal() as db:
+        stmt = (
+            select(OpsJob)
+            .where(
+                OpsJob.type.in_(list(JOB_DEFINITIONS)),
+                or_(
+                    and_(OpsJob.status == "pending", OpsJob.next_run_at <= now),
+                    and_(
+                        OpsJob.status == "running",
+                        or_(OpsJob.lease_expires_at.is_(None), OpsJob.lease_expires_at < now),
+                    ),
+                ),
+            )
+            .order_by(OpsJob.next_run_at)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        jobs = db.scalars(stmt).all()
+
+        claimed = []
+        for job in jobs:
+            if job.status == "running":
+                print(f"[job-queue] reclaiming job {job.job_id} from expired lease of {job.lease_owner}")
+            job.status = "running"
+            job.lease_owner = WORKER_ID
+            job.lease_expires_at = now + timedelta(seconds=settings.JOB_LEASE_SECONDS)
+            claimed.append(job.job_id)
+        db.commit()
+        return claimed
+
+
+def renew_leases(job_ids: list[str]) -> set[str]:
+    """延長自己持有的 lease，回傳成功延長的 job_id"""
+    with SessionLocal() as db:
+        stmt = (
+            update(OpsJob)
+            .where(OpsJob.job_id.in_(job_ids), OpsJob.lease_owner == WORKER_ID)
+            .values(lease_expires_at=now_utc() + timedelta(seconds=settings.JOB_LEASE_SECONDS))
+            .returning(OpsJob.job_id)
+        )
+        renewed = set(db.scalars(stmt).all())
+        db.commit()
+        return renewed
+
+
+def release_lease(job_id: str):
+    """job 執行結束（成功、失敗或等待重試）後釋放 lease"""
+    with SessionLocal() as db:
+        stmt = (
+            update(OpsJob)
+            .where(OpsJob.job_id == job_id, OpsJob.lease_owner == WORKER_ID)
+            .values(lease_owner=None, lease_expires_at=None)
+        )
+        db.execute(stmt)
+        db.commit()
+
+
+class JobWorker:
+    """
+    背景領取並執行 job。
+
+    - poll thread: 每 JOB_POLL_INTERVAL_SECONDS（或被 wake() 叫醒時）領取空位數量的 job，
+      並釋放已結束 job 的 lease
+    - heartbeat thread: 每 JOB_LEASE_SECONDS / 3 延長執行中 job 的 lease，
+      lease 被其他 worker 接手時取消本機的 job
+    - job 交給 job runtime 以 task 執行，同時最多持有 concurrency 個
+    """
+
+    def __init__(self, concurrency: int, poll_interval: float, lease_seconds: int):
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self._running: set[str] = set()
+        self._finished: queue.SimpleQueue[str] = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+
+    def start(self):
+        threading.Thread(target=self._poll_loop, name="job-worker-poll", daemon=True).start()
+        threading.Thread(target=self._heartbeat_loop, name="job-worker-heartbeat", daemon=True).start()
+        print(f"[job-queue] worker {WORKER_ID} started (concurrency={self.concurrency})")
+
+    def stop(self):
+        self._stopped.set()
+        self._wake.set()
+
+    def wake(self):
+        """有新的 job 時叫醒 poll thread，不用等到下一次 poll"""
+        self._wake.set()
+
+    def _poll_loop(self):
+        while not self._stopped.is_set():
+            self._release_finished()
+            with self._lock:
+                free = self.concurrency - len(self._running)
+            if free > 0:
+                try:
+                    claimed = claim_jobs(free)
+                except Exception as e:
+                    print(f"[job-queue] claim failed: {e}")
+                    claimed = []
+                for job_id in claimed:
+                    self._dispatch(job_id)
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+    def _dispatch(self, job_id: str):
+        # 所有 job type 都由 executor 依 JobDefinition 執行
+        with self._lock:
+            self._running.add(job_id)
+        future = job_runtime.submit(job_id, lambda: run_job(job_id))
+        future.add_done_callback(lambda f: self._on_done(job_id, f))
+
+    def _on_done(self, job_id: str, future):
+        # 在 runtime 的 event loop thread 呼叫，不在這裡碰 DB
+        if future.cancelled():
+            print(f"[job-queue] job {job_id} cancelled")
+        elif future.exception() is not None:
+            print(f"[job-queue] job {job_id} crashed: {future.exception()}")
+        self._finished.put(job_id)
+        self.wake()
+
+    def _release_finished(self):
+        while True:
+            try:
+                job_id = self._finished.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                release_lease(job_id)
+            except Exception as e:
+                # 釋放失敗也沒關係，lease 過期後會被重新領取
+                print(f"[job-queue] failed to release lease of {job_id}: {e}")
+            with self._lock:
+                self._running.discard(job_id)
+
+    def _heartbeat_loop(self):
+        while not self._stopped.wait(self.lease_seconds / 3):
+            with self._lock:
+                job_ids = list(self._running)
+            if not job_ids:
+                continue
+            try:
+                renewed = renew_leases(job_ids)
+            except Exception as e:
+                print(f"[job-queue] heartbeat failed: {e}")
+                continue
+            for job_id in set(job_ids) - renewed:
+                # 已經被其他 worker 接手，停止本機的執行避免重複操作
+                print(f"[job-queue] lost lease of job {job_id}, cancelling")
+                job_runtime.cancel(job_id)
+
+
+job_worker = JobWorker(
+    concurrency=settings.JOB_WORKER_CONCURRENCY,
+    poll_interval=settings.JOB_POLL_INTERVAL_SECONDS,
+    lease_seconds=settings.JOB_LEASE_SECONDS,
+)
@@ -0,0 +1,162 @@
+"""
+Job definition registry
+
+每個 job 類型宣告一次：參數 schema、step 與其依賴（DAG）、重試策略。
+建立 job（executor.enqueue_job）與執行 job（executor.run_job）都依定義進行，
+新增 job 類型不用再自己寫 step 記錄、run_step 或重試邏輯：
+
+    MY_JOB = register(JobDefinition(
+        type="my-job",
+        params=MyJobParams,
+        steps=(
+            Step("step_1", _step_1),
+            Step("step_2", _step_2),
+        ),
+    ))
+
+step 預設依賴前一個宣告的 step（依序執行）；用 depends_on 宣告依賴後，
+互不依賴的 step 會同時執行（每個 job 最多 max_parallel_steps 個）：
+
+    steps=(
+        Step("scale_down", _scale_down),
+        Step("delete_pvc_0", _delete_pvc_0, depends_on=("scale_down",)),
+        Step("delete_pvc_1", _delete_pvc_1, depends_on=("scale_down",)),
+        Step("scale_up", _scale_up, depends_on=("delete_pvc_0", "delete_pvc_1")),
+    )
+"""
+
+import asyncio
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable
+
+from pydantic import BaseModel
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..db import run_in_db_thread
+from .progress import ProgressReporter
+from .retry import DEFAULT_RETRY_POLICY, RetryPolicy
+
+
+@dataclass
+class JobContext:
+    """傳給 setup 與每個 step 的執行環境"""
+
+    job_id: str
+    job_uid: uuid.UUID
+    params: Any  # JobDefinition.params 的 instance
+    db: Session
+    # setup 放共用資料的地方（例如解析過的 StatefulSet），所有 step 共用
+    state: dict = field(default_factory=dict)
+    # 目前執行中的 step 與它的進度 reporter；executor 為每個 step 建立一份 copy（state 共用）
+    step: str | None = None
+    reporter: ProgressReporter | None = None
+    # 所有 step 共用 db session，經過 run_db 依序使用
+    db_lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+
+    async def run_db(self, fn, *args, **kwargs):
+        """
+        在 DB thread 執行同步的 fn(ctx.db, *args, **kwargs)，回傳 fn 的結果。
+
+        commit、pool checkout 不會卡住所有 job 共用的 event loop；session 不能同時在多個
+        thread 使用，同一個 job（包含同時執行的 step）的 DB 操作依序執行。step 內請一律
+        透過 run_db 使用 ctx.db。
+        """
+        async with self.db_lock:
+            return await run_in_db_thread(fn, self.db, *args, **kwargs)
+
+    def progress(self, detail: str):
+        """
+        回報目前 step 的進度（只寫 step.progress event）。
+
+        內容沒變不寫，短時間內多次回報合併成一次，可以在每次狀態變化時直接呼叫。
+        """
+        if self.reporter is None:
+            raise RuntimeError("progress is only available inside a step")
+        self.reporter.report(detail)
+
+
+@dataclass(frozen=True)
+class Step:
+    name: str
+    # async def run(ctx) -> detail
+    run: Callable[[JobContext], Awaitable[str | None]]
+    # 依參數決定是否需要這個 step，None = 一定執行
+    when: Callable[[Any], bool] | None = None
+    # 依賴的 step（必須宣告在這個 step 之前，因此不會有循環），None = 前一個宣告的 step
+    depends_on: tuple[str, ...] | None = None
+
+
+@dataclass(frozen=True)
+class JobDefinition:
+    type: str
+    params: type[BaseModel]
+    steps: tuple[Step, ...]
+    retry_policy: RetryPolicy = DEFAULT_RETRY_POLICY
+    # 每次執行（含重試）開始時呼叫一次，用來驗證參數、準備 step 共用的資料
+    setup: Callable[[JobContext], Awaitable[None]] | None = None
+    # 建立 job 時寫入 ops_job.namespace / target_resource（有 index，供 GET /ops/jobs 查詢）
+    namespace: Callable[[Any], str | None] | None = None
+    target_resource: Callable[[Any], str | None] | None = None
+    # 同一個 job 同時執行的 step 數上限，None = settings.JOB_MAX_PARALLEL_STEPS
+    max_parallel_steps: int | None = None
+    # job 不再重試、標記為 failed 之後呼叫（例如收尾 job 建立的其他資源），自行 commit
+    on_failed: Callable[[Session, Any], None] | None = None
+
+    @property
+    def parallelism(self) -> int:
+        return self.max_parallel_steps or settings.JOB_MAX_PARALLEL_STEPS
+
+    def step_plan(self, params) -> list[tuple[str, list[str]]]:
+        """
+        依參數要建立的 step 與各自的 depends_on。
+
+        被 when 略過的 step 由它自己的依賴取代，原本依賴它的 step 仍會等到同樣的前置 step 完成。
+        """
+        # 宣告的 step -> 依賴它等同於依賴哪些（會建立的）step
+        expand: dict[str, list[str]] = {}
+        plan = []
+        prev = None
+        for s in self.steps:
+            declared = s.depends_on if s.depends_on is not None else ((prev,) if prev else ())
+            deps = list(dict.fromkeys(d for name in declared for d in expand[name]))
+            if s.when is None or s.when(params):
+                plan.append((s.name, deps))
+                expand[s.name] = [s.name]
+            else:
+                expand[s.name] = deps
+            prev = s.name
+        return plan
+
+    def get_step(self, name: str) -> Step | None:
+        return next((s for s in self.steps if s.name == name), None)
+
+
+# job type -> 定義；job worker 只會領取有註冊的 type
+JOB_DEFINITIONS: dict[str, JobDefinition] = {}
+
+
+def register(definition: JobDefinition) -> JobDefinition:
+    if definition.type in JOB_DEFINITIONS:
+        raise ValueError(f"job type {definition.type} already registered")
+    declared = set()
+    for s in definition.steps:
+        if s.name in declared:
+            raise ValueError(f"job type {definition.type} has duplicate step name {s.name}")
+        unknown = set(s.depends_on or ()) - declared
+        if unknown:
+            raise ValueError(
+                f"step {s.name} of job type {definition.type} depends on "
+                f"{sorted(unknown)}, which must be declared before it"
+            )
+        declared.add(s.name)
+    JOB_DEFINITIONS[definition.type] = definition
+    return definition
+
+
+def get_definition(job_type: str) -> JobDefinition:
+    try:
+        return JOB_DEFINITIONS[job_type]
+    except KeyError:
+        raise KeyError(f"unknown job type: {job_type}") from None
@@ -0,0 +1,125 @@
+"""
+Job retry scheduling
+
+Job 失敗時不在原本的 coroutine 裡 sleep 再重跑，而是把 job 改回 pending 並寫入
+next_run_at，由 job queue 在時間到之後重新領取。等待重試的 job 不佔用任何
+coroutine 或 DB 連線。
+
+錯誤分類：
+- retryable: 409 / 429 / 5xx、timeout、連線錯誤等暫時性問題，用指數退避 + jitter 重試
+- fatal: 400 / 401 / 403 / 404 / 422 與 FatalJobError，重試也不會成功，直接 failed
+
+等待外部狀態（例如 child job 完成）的 step 也不在 coroutine 裡 sleep：raise JobDeferred，
+job 改回 pending 並在 delay 秒後重新領取，不計入重試次數。
+"""
+
+import random
+from dataclasses import dataclass
+from datetime import timedelta
+
+from kubernetes.client.exceptions import ApiException
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..models import OpsJob
+
+RETRYABLE_STATUSES = frozenset({409, 429})
+FATAL_STATUSES = frozenset({400, 401, 403, 404, 405, 410, 422})
+
+
+class FatalJobError(Exception):
+    """重試也不會成功的錯誤（例如參數不合法），job 直接標記為 failed"""
+
+
+class JobDeferred(Exception):
+    """
+    step 還不能完成、delay 秒後再執行一次（不是錯誤）。
+
+    executor 把 step 改回 pending（detail 為 detail）、等同時執行中的 step 結束後，
+    job 改回 pending、next_run_at = now + delay，不計入 retry_count；
+    等待期間不佔用 job runtime 的位置與 DB 連線。
+    """
+
+    def __init__(self, detail: str, delay: float):
+        super().__init__(detail)
+        self.detail = detail
+        self.delay = delay
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    base_delay: float
+    max_delay: float
+    multiplier: float = 2.0
+    # 實際延遲在 [delay * (1 - jitter), delay] 之間隨機，避免大量 job 同時重試
+    jitter: float = 0.5
+
+    def delay(self, attempt: int) -> float:
+        """第 attempt 次重試（從 1 開始）前要等待的秒數"""
+        delay = min(self.max_delay, self.base_delay * self.multiplier ** max(attempt - 1, 0))
+        return random.uniform(delay * (1 - self.jitter), delay)
+
+
+DEFAULT_RETRY_POLICY = RetryPolicy(
+    base_delay=settings.JOB_RETRY_BASE_DELAY_SECONDS,
+    max_delay=settings.JOB_RETRY_MAX_DELAY_SECONDS,
+    multiplier=settings.JOB_RETRY_MULTIPLIER,
+    jitter=settings.JOB_RETRY_JITTER,
+)
+
+
+def is_retryable(exc: Exception) -> bool:
+    if isinstance(exc, FatalJobError):
+        return False
+    if isinstance(exc, ApiException):
+        if exc.status in RETRYABLE_STATUSES or (exc.status or 0) >= 500:
+            return True
+        if exc.status in FATAL_STATUSES:
+            return False
+        # 其他 4xx 視為請求本身有問題
+        return not (400 <= (exc.status or 0) < 500)
+    return True
+
+
+def retry_after_seconds(exc: Exception) -> float | None:
+    """429 / 503 回應帶的 Retry-After header"""
+    if isinstance(exc, ApiException) and exc.headers:
+        value = exc.headers.get("Retry-After")
+        if value:
+            try:
+                return float(value)
+            except ValueError:
+                return None
+    return None
+
+
+def schedule_retry(
+    db: Session,
+    job: OpsJob,
+    exc: Exception,
+    now,
+    policy: RetryPolicy = DEFAULT_RETRY_POLICY,
+) -> float | None:
+    """
+    依錯誤類型決定 job 要重試還是失敗，並 commit。
+
+    Returns:
+        重試前的等待秒數；不重試時回傳 None
+    """
+    if not is_retryable(exc) or job.retry_count >= job.max_retries:
+        job.status = "failed"
+        job.finished_at = now
+        db.commit()
+        return None
+
+    job.retry_count += 1
+    delay = policy.delay(job.retry_count)
+    server_delay = retry_after_seconds(exc)
+    if server_delay is not None:
+        delay = max(delay, server_delay)
+
+    job.status = "pending"
+    job.finished_at = None
+    job.next_run_at = now + timedelta(seconds=delay)
+    db.commit()
+    return delay
@@ -0,0 +1,119 @@
+"""
+Job runtime
+
+所有 job 共用一個長時間運作的 event loop（跑在專屬的背景 thread），
+每個 job 是其中的一個 task，由 global semaphore 限制同時執行數量。
+等待中的 job 只是一個暫停的 coroutine，不會佔用任何 thread。
+"""
+
+import asyncio
+import threading
+from concurrent.futures import Future
+
+from ..config import settings
+
+# 量測 event loop lag 的間隔秒數
+LAG_PROBE_INTERVAL_SECONDS = 1.0
+
+
+class JobRuntime:
+    def __init__(self, max_concurrency: int):
+        self.max_concurrency = max_concurrency
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._semaphore: asyncio.Semaphore | None = None
+        self._ready = threading.Event()
+        self._tasks: dict[str, asyncio.Task] = {}
+        self._running = 0
+        self._queued = 0
+        self._loop_lag = 0.0
+
+    def start(self):
+        if self._loop is not None:
+            return
+        threading.Thread(target=self._run_loop, name="job-runtime", daemon=True).start()
+        self._ready.wait()
+        print(f"[job-runtime] started (max_concurrency={self.max_concurrency})")
+
+    def stop(self):
+        loop = self._loop
+        if loop is None:
+            return
+        self._loop = None
+        loop.call_soon_threadsafe(loop.stop)
+
+    def _run_loop(self):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        loop.create_task(self._probe_lag())
+        self._loop = loop
+        self._ready.set()
+        try:
+            loop.run_forever()
+        finally:
+            loop.close()
+
+    async def _probe_lag(self):
+        """sleep 固定時間，實際多睡的時間就是 event loop 被卡住的時間"""
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(LAG_PROBE_INTERVAL_SECONDS)
+            self._loop_lag = max(0.0, loop.time() - start - LAG_PROBE_INTERVAL_SECONDS)
+
+    def submit(self, job_id: str, coro_func) -> Future:
+        """
+        在 runtime 的 event loop 執行 coro_func()，可以從任何 thread 呼叫。
+
+        Args:
+            job_id: Job ID（用於 cancel 與 log）
+            coro_func: 回傳 coroutine 的函數，取得 semaphore 後才會呼叫
+
+        Returns:
+            concurrent.futures.Future，job 結束時完成
+        """
+        if self._loop is None:
+            raise RuntimeError("job runtime is not running")
+        return asyncio.run_coroutine_threadsafe(self._run_job(job_id, coro_func), self._loop)
+
+    async def _run_job(self, job_id: str, coro_func):
+        self._tasks[job_id] = asyncio.current_task()
+        self._queued += 1
+        acquired = False
+        try:
+            async with self._semaphore:
+                acquired = True
+                self._queued -= 1
+                self._running += 1
+                try:
+                    await coro_func()
+                finally:
+                    self._running -= 1
+        finally:
+            if not acquired:
+                self._queued -= 1
+            self._tasks.pop(job_id, None)
+
+    def cancel(self, job_id: str):
+        """取消執行中的 job（例如 lease 被其他 worker 接手）"""
+        loop = self._loop
+        if loop is None:
+            return
+
+        def _cancel():
+            task = self._tasks.get(job_id)
+            if task is not None:
+                task.cancel()
+
+        loop.call_soon_threadsafe(_cancel)
+
+    def stats(self) -> dict[str, any]:
+        return {
+            "running": self._running,
+            "queued": self._queued,
+            "max_concurrency": self.max_concurrency,
+            "loop_lag_ms": round(self._loop_lag * 1000, 1),
+        }
+
+
+job_runtime = JobRuntime(max_concurrency=settings.JOB_RUNTIME_MAX_CONCURRENCY)
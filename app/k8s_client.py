@@ -1,7 +1,53 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
 from kubernetes import client, config
 
+from .config import settings
+
 # 在 cluster 內跑，用 in-cluster config
 config.load_incluster_config()
 
+# urllib3 connection pool 跟 I/O thread 數量一致，避免 thread 搶連線
+_configuration = client.Configuration.get_default_copy()
+_configuration.connection_pool_maxsize = settings.K8S_IO_MAX_WORKERS
+client.Configuration.set_default(_configuration)
+
 core_v1 = client.CoreV1Api()
 apps_v1 = client.AppsV1Api()
+
+# kubernetes client 是同步 HTTP，async job 內的呼叫交給這個 bounded thread pool，
+# 不會卡住 event loop，多個 job 的 API 呼叫可以同時進行
+_io_executor = ThreadPoolExecutor(
+    max_workers=settings.K8S_IO_MAX_WORKERS,
+    thread_name_prefix="k8s-io",
+)
+
+
+class AsyncApi:
+    """
+    kubernetes API 物件的 async 包裝。
+
+    用法與原本相同，只是要 await：
+        await async_apps_v1.patch_namespaced_stateful_set(name=..., namespace=..., body=...)
+    """
+
+    def __init__(self, api):
+        self._api = api
+
+    def __getattr__(self, name: str):
+        func = getattr(self._api, name)
+        if not callable(func):
+            return func
+
+        async def call(*args, **kwargs):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(_io_executor, partial(func, *args, **kwargs))
+
+        call.__name__ = name
+        return call
+
+
+async_core_v1 = AsyncApi(core_v1)
+async_apps_v1 = AsyncApi(apps_v1)
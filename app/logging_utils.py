@@ -1,12 +1,12 @@
+from datetime import datetime, timezone
+
 from fastapi import Request
-from sqlalchemy.orm import Session
 
-from .models import OpsLog
+from .audit import audit_writer
 from .auth import get_actor, get_source_ip
 
 
 def safe_log_op(
-    db: Session,
     *,
     request: Request,
     action: str,
@@ -17,20 +17,28 @@ def safe_log_op(
     status: str,
     error_message: str | None = None,
 ):
+    """
+    記錄原子操作到 ops_log。
+
+    只把 row 放進 audit writer 的 queue，由背景 flusher 批次寫入，
+    不會在 request 的 latency path 上做 DB commit。
+    """
     try:
-        log = OpsLog(
-            actor=get_actor(request),
-            source_ip=get_source_ip(request),
-            action=action,
-            resource_kind=resource_kind,
-            namespace=namespace,
-            resource_name=resource_name,
-            request_body=request_body,
-            status=status,
-            error_message=(error_message[:2000] if error_message else None),
+        audit_writer.submit(
+            {
+                # 寫入會延後，時間以操作當下為準
+                "ts": datetime.now(timezone.utc),
+                "actor": get_actor(request),
+                "source_ip": get_source_ip(request),
+                "action": action,
+                "resource_kind": resource_kind,
+                "namespace": namespace,
+                "resource_name": resource_name,
+                "request_body": request_body,
+                "status": status,
+                "error_message": (error_message[:2000] if error_message else None),
+            }
         )
-        db.add(log)
-        db.commit()
     except Exception as e:
         # 不要讓記 log 影響主流程
         print(f"[ops-log] failed to write log: {e}")
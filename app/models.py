@@ -1,23 +1,31 @@
-from datetime import datetime
+from datetime import datetime, timezone
 
 from sqlalchemy import (
     BigInteger,
     Column,
     DateTime,
+    ForeignKey,
+    Index,
     Integer,
     JSON,
     Text,
+    Uuid,
+    text,
 )
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import declarative_base
 
+from .ids import uuid7
+
 Base = declarative_base()
 
 
 class OpsLog(Base):
     __tablename__ = "ops_log"
 
+    # 依 ts 做 range partition，partition key 必須包含在 PK 內
     id = Column(BigInteger, primary_key=True, autoincrement=True)
-    ts = Column(DateTime(timezone=True), nullable=False, default=datetime.utcnow)
+    ts = Column(DateTime(timezone=True), primary_key=True, nullable=False, default=datetime.utcnow)
     actor = Column(Text, nullable=True)
     source_ip = Column(Text, nullable=True)
     action = Column(Text, nullable=False)
@@ -28,31 +36,122 @@ class OpsLog(Base):
     status = Column(Text, nullable=False)  # success / error
     error_message = Column(Text, nullable=True)
 
+    __table_args__ = (
+        # 查某個資源的操作紀錄、查某人的操作紀錄
+        Index("ix_ops_log_resource_ts", "namespace", "resource_name", "ts"),
+        Index("ix_ops_log_actor_ts", "actor", "ts"),
+        # partition 由 app/partitions.py 建立 / 刪除
+        {"postgresql_partition_by": "RANGE (ts)"},
+    )
+
 
 class OpsJob(Base):
     __tablename__ = "ops_job"
 
     id = Column(BigInteger, primary_key=True, autoincrement=True)
+    # 對外的 job id：新 job 為 str(uid)，舊 job 保留原本的字串（timestamp_type_hex）
     job_id = Column(Text, unique=True, nullable=False)
+    # 依時間排序的 UUIDv7，ops_job_step 用它做 FK
+    uid = Column(Uuid, unique=True, nullable=False, default=uuid7)
     type = Column(Text, nullable=False)  # e.g. 'pg-rebuild'
-    status = Column(Text, nullable=False)  # pending / running / success / failed
+    # pending / running / success / failed；
+    # child job 另外有 waiting（等 parent 放行，worker 不會領取）/ cancelled（parent 不再放行）
+    status = Column(Text, nullable=False)
     created_at = Column(DateTime(timezone=True), nullable=False)
     finished_at = Column(DateTime(timezone=True))
-    params = Column(JSON, nullable=False)
+    # 由哪個 job 建立（例如 pg-rebuild-fleet 的 child pg-rebuild），parent 刪除時設為 NULL
+    parent_uid = Column(Uuid, ForeignKey("ops_job.uid", ondelete="SET NULL"), nullable=True)
+    # JSONB：可以用 GIN index 做 containment（@>）查詢
+    params = Column(JSONB, nullable=False)
+    # 從 params 取出、建立 job 時寫入，查「碰過某個資源的 job」不用解析 params
+    namespace = Column(Text, nullable=True)
+    target_resource = Column(Text, nullable=True)  # e.g. 'statefulset/postgres'
     actor = Column(Text, nullable=True)
     source_ip = Column(Text, nullable=True)
     retry_count = Column(Integer, nullable=False, default=0)
     max_retries = Column(Integer, nullable=False, default=3)
+    # job queue lease：由哪個 worker 執行、lease 到期時間（靠 heartbeat 延長）
+    lease_owner = Column(Text, nullable=True)
+    lease_expires_at = Column(DateTime(timezone=True), nullable=True)
+    # 最早可以被領取的時間，重試時往後排（exponential backoff）
+    next_run_at = Column(DateTime(timezone=True), nullable=False, default=lambda: datetime.now(timezone.utc))
+    # 最後一個投影到 ops_job / ops_job_step 的 ops_job_event.seq（見 app/jobs/events.py），
+    # 單調遞增，SSE 的 event id
+    version = Column(BigInteger, nullable=False, default=1)
+
+    __table_args__ = (
+        # worker claim 用：依 next_run_at 取已到期的 pending job
+        Index("ix_ops_job_pending", "next_run_at", postgresql_where=text("status = 'pending'")),
+        # 回收 lease 過期的 running job
+        Index("ix_ops_job_running_lease", "lease_expires_at", postgresql_where=text("status = 'running'")),
+        # GET /ops/jobs：依 (created_at, id) keyset 分頁，各 filter 各一個複合 index
+        Index("ix_ops_job_created", "created_at", "id"),
+        Index("ix_ops_job_status_created", "status", "created_at", "id"),
+        Index("ix_ops_job_type_created", "type", "created_at", "id"),
+        Index("ix_ops_job_actor_created", "actor", "created_at", "id"),
+        Index("ix_ops_job_namespace_created", "namespace", "created_at", "id"),
+        # 某個 namespace 內碰過某個資源的 job
+        Index("ix_ops_job_target_created", "namespace", "target_resource", "created_at", "id"),
+        # parent job 的 child：放行 / 彙整進度、GET /ops/jobs?parent_job_id=
+        Index(
+            "ix_ops_job_parent_created",
+            "parent_uid",
+            "created_at",
+            "id",
+            postgresql_where=text("parent_uid IS NOT NULL"),
+        ),
+        # 任意 params 條件：params @> '{"statefulset": "postgres"}'
+        Index(
+            "ix_ops_job_params",
+            "params",
+            postgresql_using="gin",
+            postgresql_ops={"params": "jsonb_path_ops"},
+        ),
+    )
 
 
 class OpsJobStep(Base):
     __tablename__ = "ops_job_step"
 
     id = Column(BigInteger, primary_key=True, autoincrement=True)
-    job_id = Column(Text, nullable=False)  # FK -> OpsJob.job_id
+    job_uid = Column(Uuid, ForeignKey("ops_job.uid", ondelete="CASCADE"), nullable=False)
+    # 舊欄位（OpsJob.job_id 的字串），保留給既有的查詢 / 報表，程式內一律用 job_uid
+    job_id = Column(Text, nullable=False)
     name = Column(Text, nullable=False)
+    # 顯示順序（依宣告順序）；執行順序由 depends_on 決定
     step_order = Column(Integer, nullable=False)
+    # 依賴的 step 名稱（JSON array），依賴都成功後才會執行；NULL = 前一個 step_order 的 step
+    depends_on = Column(JSONB, nullable=True)
     status = Column(Text, nullable=False)  # pending / running / success / failed
     detail = Column(Text, nullable=True)
     started_at = Column(DateTime(timezone=True))
     finished_at = Column(DateTime(timezone=True))
+
+    __table_args__ = (
+        # get_job 依順序列出 step、executor 依名稱對應定義
+        Index("ux_ops_job_step_job_order", "job_uid", "step_order", unique=True),
+        Index("ux_ops_job_step_job_name", "job_uid", "name", unique=True),
+    )
+
+
+class OpsJobEvent(Base):
+    """
+    Job 的 append-only 事件紀錄（只 INSERT，不 UPDATE / DELETE），依 seq 重播即為 job 的完整時間軸。
+    ops_job / ops_job_step 是它的投影：狀態轉換寫 event 的同一個 transaction 內一併更新，
+    step 進度（step.progress）只寫 event，讀取時疊加到 step 的 detail。
+    """
+
+    __tablename__ = "ops_job_event"
+
+    # 全域遞增（sequence），同一個 job 的 event 依 seq 排序；也是 ops_job.version 的來源
+    seq = Column(BigInteger, primary_key=True, autoincrement=True)
+    job_uid = Column(Uuid, ForeignKey("ops_job.uid", ondelete="CASCADE"), nullable=False)
+    type = Column(Text, nullable=False)  # e.g. 'job.created' / 'job.running' / 'step.success' / 'step.progress'
+    step = Column(Text, nullable=True)  # step 相關 event 的 step name
+    payload = Column(JSONB, nullable=False)
+    ts = Column(DateTime(timezone=True), nullable=False, default=lambda: datetime.now(timezone.utc))
+
+    __table_args__ = (
+        # 讀取某個 job 的時間軸 / 最新的進度
+        Index("ix_ops_job_event_job_seq", "job_uid", "seq"),
+    )
@@ -0,0 +1,191 @@
+"""
+Time partition manager
+
+ops_log 依 ts 做 Postgres range partition（每月或每天一個 partition）：
+
+- 預先建立之後 N 個 partition，寫入永遠有 partition 可以放
+- 超過保留期限的 partition 先 DETACH 再 DROP，不論資料量多少都是 O(1)，
+  不像 DELETE 會產生大量 dead tuple
+- 多個 replica 同時執行時用 advisory lock 互斥
+
+partition 命名：{table}_pYYYY_MM（month）/ {table}_pYYYY_MM_DD（day），
+範圍從命名即可推算，不需要解析 pg_catalog 的 partition bound。
+"""
+
+import re
+import threading
+import zlib
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import func, select, text
+
+from .config import settings
+from .db import engine
+
+
+def _month_start(dt: datetime) -> datetime:
+    return dt.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _add_months(dt: datetime, months: int) -> datetime:
+    month = dt.month - 1 + months
+    return dt.replace(year=dt.year + month // 12, month=month % 12 + 1)
+
+
+class TimePartitionManager:
+    def __init__(
+        self,
+        table: str,
+        *,
+        interval: str,
+        ahead: int,
+        retention_days: int,
+        check_interval: float,
+    ):
+        if interval not in ("month", "day"):
+            raise ValueError(f"unsupported partition interval: {interval}")
+        self.table = table
+        self.interval = interval
+        self.ahead = ahead
+        self.retention_days = retention_days
+        self.check_interval = check_interval
+        self._name_re = re.compile(rf"^{re.escape(table)}_p(\d{{4}})_(\d{{2}})(?:_(\d{{2}}))?$")
+        self._lock_key = zlib.crc32(f"partitions:{table}".encode())
+        self._stopped = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    # ----- 期間計算 -----
+
+    def _period_start(self, dt: datetime) -> datetime:
+        if self.interval == "month":
+            return _month_start(dt)
+        return dt.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    def _next_period(self, start: datetime) -> datetime:
+        if self.interval == "month":
+            return _add_months(start, 1)
+        return start + timedelta(days=1)
+
+    def _partition_name(self, start: datetime) -> str:
+        if self.interval == "month":
+            return f"{self.table}_p{start:%Y_%m}"
+        return f"{self.table}_p{start:%Y_%m_%d}"
+
+    def _parse_range(self, name: str) -> tuple[datetime, datetime] | None:
+        """由 partition 名稱推算範圍，month / day 兩種命名都認得"""
+        m = self._name_re.match(name)
+        if not m:
+            return None
+        year, month, day = int(m.group(1)), int(m.group(2)), m.group(3)
+        if day is None:
+            start = datetime(year, month, 1, tzinfo=timezone.utc)
+            return start, _add_months(start, 1)
+        start = datetime(year, month, int(day), tzinfo=timezone.utc)
+        return start, start + timedelta(days=1)
+
+    # ----- DB 操作 -----
+
+    def _existing_partitions(self, conn) -> list[str]:
+        rows = conn.execute(
+            text(
+                "SELECT c.relname FROM pg_inherits i "
+                "JOIN pg_class c ON c.oid = i.inhrelid "
+                "JOIN pg_class p ON p.oid = i.inhparent "
+                "WHERE p.relname = :table"
+            ),
+            {"table": self.table},
+        )
+        return [r[0] for r in rows]
+
+    def _existing_ranges(self, conn) -> dict[str, tuple[datetime, datetime]]:
+        existing = {}
+        for name in self._existing_partitions(conn):
+            bounds = self._parse_range(name)
+            if bounds:
+                existing[name] = bounds
+        return existing
+
+    def _lock(self, conn):
+        # 只在這個 transaction 內持有，多個 replica 不會同時建立同一個 partition
+        conn.execute(select(func.pg_advisory_xact_lock(self._lock_key)))
+
+    def maintain(self, now: datetime | None = None):
+        """建立之後的 partition、刪除超過保留期限的 partition"""
+        if engine.dialect.name != "postgresql":
+            return
+        now = now or datetime.now(timezone.utc)
+
+        with engine.begin() as conn:
+            self._lock(conn)
+            existing = self._existing_ranges(conn)
+            start = self._period_start(now)
+            end = start
+            for _ in range(self.ahead + 1):
+                end = self._next_period(end)
+            self._create_range(conn, start, end, existing)
+            if self.retention_days > 0:
+                self._drop_expired(conn, now - timedelta(days=self.retention_days), existing)
+
+    def ensure_range(self, conn, start: datetime, end: datetime):
+        """確保 [start, end) 都有 partition（例如還原封存資料前），在呼叫端的 transaction 內執行"""
+        if conn.dialect.name != "postgresql":
+            return
+        self._lock(conn)
+        self._create_range(conn, self._period_start(start), end, self._existing_ranges(conn))
+
+    def _create_range(self, conn, start: datetime, end: datetime, existing: dict):
+        while start < end:
+            period_end = self._next_period(start)
+            # 切換 interval（month <-> day）時，跳過已被既有 partition 涵蓋的範圍
+            overlaps = any(s < period_end and start < e for s, e in existing.values())
+            if not overlaps:
+                name = self._partition_name(start)
+                conn.execute(
+                    text(
+                        f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF "{self.table}" '
+                        f"FOR VALUES FROM ('{start.isoformat()}') TO ('{period_end.isoformat()}')"
+                    )
+                )
+                existing[name] = (start, period_end)
+                print(f"[partitions] created {name} [{start:%Y-%m-%d}, {period_end:%Y-%m-%d})")
+            start = period_end
+
+    def _drop_expired(self, conn, cutoff: datetime, existing: dict):
+        for name, (_, end) in sorted(existing.items(), key=lambda item: item[1]):
+            if end > cutoff:
+                continue
+            conn.execute(text(f'ALTER TABLE "{self.table}" DETACH PARTITION "{name}"'))
+            conn.execute(text(f'DROP TABLE "{name}"'))
+            print(f"[partitions] dropped {name} (older than {self.retention_days} days)")
+
+    # ----- 背景執行 -----
+
+    def start(self):
+        """啟動時先同步執行一次，確保寫入有 partition，之後定期在背景執行"""
+        if self._thread is not None:
+            return
+        self._maintain_safely()
+        self._thread = threading.Thread(target=self._run, name=f"partitions-{self.table}", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def _run(self):
+        while not self._stopped.wait(self.check_interval):
+            self._maintain_safely()
+
+    def _maintain_safely(self):
+        try:
+            self.maintain()
+        except Exception as e:
+            print(f"[partitions] failed to maintain {self.table} partitions: {e}")
+
+
+ops_log_partitions = TimePartitionManager(
+    "ops_log",
+    interval=settings.OPS_LOG_PARTITION_INTERVAL,
+    ahead=settings.OPS_LOG_PARTITIONS_AHEAD,
+    retention_days=settings.OPS_LOG_RETENTION_DAYS,
+    check_interval=settings.OPS_LOG_PARTITION_CHECK_INTERVAL_SECONDS,
+)
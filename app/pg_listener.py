@@ -0,0 +1,83 @@
+"""
+Postgres LISTEN connection
+
+每個 replica 一條專用的 LISTEN 連線（不從 connection pool 借），在背景 thread 等待
+NOTIFY，收到後交給 callback。NOTIFY 由寫入端在 transaction 內送出，commit 後才會
+送達，rollback 則不會送出。
+"""
+
+import select
+import threading
+
+from sqlalchemy.engine import make_url
+
+from .config import settings
+from .db import engine
+
+# select() 的 timeout，同時也是 stop() 最久要等的時間
+POLL_TIMEOUT_SECONDS = 5.0
+RECONNECT_DELAY_SECONDS = 2.0
+
+
+class PgListener:
+    def __init__(self, channel: str, on_notify, on_reconnect=None):
+        """
+        Args:
+            channel: LISTEN 的 channel 名稱
+            on_notify: callback(payload: str)，在 listener thread 呼叫
+            on_reconnect: callback()，(重新) 連上後呼叫，用來補上斷線期間漏掉的通知
+        """
+        self.channel = channel
+        self.on_notify = on_notify
+        self.on_reconnect = on_reconnect
+        self._stopped = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name=f"pg-listen-{self.channel}", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def _connect(self):
+        # 每次連線都用最新的 DB URL（Vault 輪替帳密後也能重連）
+        cargs, cparams = engine.dialect.create_connect_args(make_url(settings.DATABASE_URL))
+        conn = engine.dialect.dbapi.connect(*cargs, **cparams)
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute(f'LISTEN "{self.channel}"')
+        return conn
+
+    def _run(self):
+        while not self._stopped.is_set():
+            conn = None
+            try:
+                conn = self._connect()
+                print(f"[pg-listen] listening on {self.channel}")
+                if self.on_reconnect:
+                    self.on_reconnect()
+                self._listen(conn)
+            except Exception as e:
+                print(f"[pg-listen] {self.channel} connection error, reconnecting: {e}")
+                self._stopped.wait(RECONNECT_DELAY_SECONDS)
+            finally:
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+
+    def _listen(self, conn):
+        while not self._stopped.is_set():
+            if select.select([conn], [], [], POLL_TIMEOUT_SECONDS) == ([], [], []):
+                continue
+            conn.poll()
+            while conn.notifies:
+                notify = conn.notifies.pop(0)
+                try:
+                    self.on_notify(notify.payload)
+                except Exception as e:
+                    print(f"[pg-listen] failed to handle notify on {self.channel}: {e}")
@@ -0,0 +1,85 @@
+"""
+In-memory pub/sub hub
+
+process 內的通知中心：publish 可以從任何 thread 呼叫（job runtime、worker thread、
+API event loop），subscriber 是 async 的 endpoint（SSE / long-poll），
+透過 loop.call_soon_threadsafe 叫醒。
+
+通知只代表「topic 有變化」，subscriber 被叫醒後自己去讀最新狀態，
+連續多次 publish 會合併成一次喚醒。
+"""
+
+import asyncio
+import threading
+from collections import defaultdict
+
+
+class Subscription:
+    def __init__(self, hub: "PubSubHub", topic: str):
+        self.hub = hub
+        self.topic = topic
+        self.loop = asyncio.get_running_loop()
+        self.event = asyncio.Event()
+
+    def _notify(self):
+        self.loop.call_soon_threadsafe(self.event.set)
+
+    async def wait(self, timeout: float | None = None) -> bool:
+        """等到有新的 publish，回傳 False 代表 timeout"""
+        try:
+            await asyncio.wait_for(self.event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        self.event.clear()
+        return True
+
+    def close(self):
+        self.hub._unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class PubSubHub:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers: dict[str, set[Subscription]] = defaultdict(set)
+
+    def subscribe(self, topic: str) -> Subscription:
+        """在 event loop 內呼叫，回傳的 Subscription 用完要 close（或用 with）"""
+        sub = Subscription(self, topic)
+        with self._lock:
+            self._subscribers[topic].add(sub)
+        return sub
+
+    def _unsubscribe(self, sub: Subscription):
+        with self._lock:
+            subs = self._subscribers.get(sub.topic)
+            if subs is not None:
+                subs.discard(sub)
+                if not subs:
+                    del self._subscribers[sub.topic]
+
+    def publish(self, topic: str):
+        with self._lock:
+            subs = list(self._subscribers.get(topic, ()))
+        for sub in subs:
+            try:
+                sub._notify()
+            except RuntimeError:
+                # subscriber 的 event loop 已經關閉
+                self._unsubscribe(sub)
+
+    def publish_all(self):
+        """通知所有 topic（例如 LISTEN 連線重連後，中間可能漏掉通知）"""
+        with self._lock:
+            topics = list(self._subscribers)
+        for topic in topics:
+            self.publish(topic)
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return sum(len(s) for s in self._subscribers.values())
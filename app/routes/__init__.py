@@ -1 +1 @@
-from . import health, ops_primitive, jobs  # noqa: F401
+from . import health, ops_primitive, jobs, logs, archives  # noqa: F401
@@ -0,0 +1,106 @@
+import json
+from datetime import datetime
+from typing import Literal
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..archive import ARCHIVE_TABLES, is_valid_run_id, iter_archived_rows, list_runs
+from ..auth import verify_api_key
+from ..config import settings
+from ..db import get_async_db
+from ..jobs.archive import ARCHIVE_RESTORE
+from ..schemas import ArchiveRestoreParams, ArchiveRestoreRequest
+from .jobs import create_job
+
+router = APIRouter(dependencies=[Depends(verify_api_key)])
+
+# 查詢封存檔時每個 response chunk 的筆數
+STREAM_BATCH_SIZE = 1000
+
+
+def _check_run_id(run_id: str):
+    """run_id 格式不對回 400，不是既有的封存回 404（只用列出的 run_id 組路徑）"""
+    if not is_valid_run_id(run_id):
+        raise HTTPException(status_code=400, detail="invalid run_id")
+    if run_id not in {m["run_id"] for m in list_runs(settings.ARCHIVE_DIR)}:
+        raise HTTPException(status_code=404, detail="archive not found")
+
+
+@router.get("/archives")
+def get_archives():
+    """列出所有封存（manifest）"""
+    return {"archives": list_runs(settings.ARCHIVE_DIR)}
+
+
+@router.get("/archives/{table}/rows")
+def query_archived_rows(
+    table: Literal["ops_log", "ops_job"],
+    run_id: str | None = None,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    actor: str | None = None,
+    namespace: str | None = None,
+    status: str | None = None,
+    action: str | None = None,
+    type: str | None = None,
+):
+    """
+    直接查詢封存檔（不用還原到 DB），以 NDJSON 串流回傳。
+
+    依 manifest 記錄的時間範圍跳過不相關的檔案，逐行讀取 gzip，記憶體用量固定。
+    """
+    if run_id is not None:
+        _check_run_id(run_id)
+
+    filters = {"actor": actor, "namespace": namespace, "status": status}
+    if table == "ops_log":
+        filters["action"] = action
+    else:
+        filters["type"] = type
+
+    rows = iter_archived_rows(
+        settings.ARCHIVE_DIR,
+        table,
+        since=since,
+        until=until,
+        filters=filters,
+        run_id=run_id,
+    )
+
+    def body():
+        # sync generator：Starlette 會在 threadpool 內迭代，讀檔不會卡住 event loop
+        batch = []
+        for row in rows:
+            batch.append(json.dumps(row) + "\n")
+            if len(batch) >= STREAM_BATCH_SIZE:
+                yield "".join(batch)
+                batch = []
+        if batch:
+            yield "".join(batch)
+
+    return StreamingResponse(body(), media_type="application/x-ndjson")
+
+
+@router.post("/archives/{run_id}/restore")
+async def restore_archive(
+    run_id: str,
+    body: ArchiveRestoreRequest,
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """建立 archive-restore job，把封存檔寫回 DB（已存在的 row 略過）"""
+    unknown = set(body.tables) - set(ARCHIVE_TABLES)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"unknown tables: {sorted(unknown)}")
+    _check_run_id(run_id)
+
+    job_id = await create_job(
+        db,
+        request,
+        ARCHIVE_RESTORE,
+        ArchiveRestoreParams(run_id=run_id, tables=body.tables),
+        max_retries=body.max_retries,
+    )
+    return {"job_id": job_id}
@@ -1,5 +1,7 @@
 from fastapi import APIRouter
 
+from ..jobs.runtime import job_runtime
+
 router = APIRouter()
 
 
@@ -12,3 +14,9 @@ def live():
 def ready():
     # 簡單版，之後可以加 DB / K8s 檢查
     return {"status": "ready"}
+
+
+@router.get("/runtime")
+def runtime():
+    # job runtime 狀態：執行中 / 等待 semaphore 的 job 數、event loop lag
+    return job_runtime.stats()
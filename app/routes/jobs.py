@@ -1,101 +1,279 @@
+import asyncio
+import base64
+import json
+import re
 from datetime import datetime
 
-from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request
-from sqlalchemy import select
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from ..archive import archive_cutoff
 from ..auth import verify_api_key, get_actor, get_source_ip
 from ..config import settings
-from ..db import get_db
-from ..jobs.pg_rebuild import gen_job_id, run_pg_rebuild_job, now_utc
-from ..models import OpsJob, OpsJobStep
-from ..schemas import JobOut, JobStepOut, PgRebuildRequest
+from ..db import AsyncSessionLocal, get_async_db
+from ..jobs.archive import ARCHIVE
+from ..jobs.events import job_events, latest_step_progress
+from ..jobs.executor import enqueue_job
+from ..jobs.pg_rebuild import PG_REBUILD, now_utc
+from ..jobs.pg_rebuild_fleet import PG_REBUILD_FLEET, fleet_namespaces
+from ..jobs.queue import job_worker
+from ..jobs.registry import JobDefinition
+from ..models import OpsJob, OpsJobEvent, OpsJobStep
+from ..schemas import (
+    ArchiveParams,
+    ArchiveRequest,
+    JobEventOut,
+    JobListOut,
+    JobOut,
+    JobStepOut,
+    JobSummaryOut,
+    JobTimelineOut,
+    PgRebuildFleetRequest,
+    PgRebuildRequest,
+)
 
 router = APIRouter(dependencies=[Depends(verify_api_key)])
 
 
+async def create_job(
+    db: AsyncSession,
+    request: Request,
+    definition: JobDefinition,
+    params: BaseModel,
+    *,
+    max_retries: int,
+) -> str:
+    """依 job 定義建立 pending 的 job 與 step（同一個 transaction），回傳 job_id"""
+    job_id = await db.run_sync(
+        enqueue_job,
+        definition,
+        params,
+        max_retries=max_retries,
+        actor=get_actor(request),
+        source_ip=get_source_ip(request),
+    )
+    await db.commit()
+
+    # job 已是 pending，由 job queue 領取執行；叫醒本機 worker 立即領取
+    job_worker.wake()
+
+    return job_id
+
+
 @router.post("/jobs/pg-rebuild")
 async def create_pg_rebuild_job(
     body: PgRebuildRequest,
-    background_tasks: BackgroundTasks,
     request: Request,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     if body.namespace not in settings.ALLOWED_NAMESPACES:
         raise HTTPException(status_code=403, detail="namespace not allowed")
 
-    job_id = gen_job_id("pg-rebuild")
+    job_id = await create_job(db, request, PG_REBUILD, body, max_retries=body.max_retries)
+    return {"job_id": job_id}
 
-    job = OpsJob(
-        job_id=job_id,
-        type="pg-rebuild",
-        status="pending",
-        created_at=now_utc(),
-        finished_at=None,
-        params=body.dict(),
-        actor=get_actor(request),
-        source_ip=get_source_ip(request),
-        retry_count=0,
+
+@router.post("/jobs/pg-rebuild-fleet")
+async def create_pg_rebuild_fleet_job(
+    body: PgRebuildFleetRequest,
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    一次重建多個 StatefulSet / ordinal：每個 ordinal 一個 child pg-rebuild job，
+    在 max_parallel / max_parallel_per_namespace / max_failures 的限制內執行，進度彙整到這個 job。
+    """
+    if not body.statefulsets and not body.label_selector:
+        raise HTTPException(status_code=400, detail="statefulsets or label_selector is required")
+    if body.label_selector and not body.namespaces:
+        raise HTTPException(status_code=400, detail="namespaces is required with label_selector")
+    if body.max_parallel < 1 or body.max_parallel_per_namespace < 1 or body.max_failures < 0:
+        raise HTTPException(status_code=400, detail="invalid parallelism or failure budget")
+    if not fleet_namespaces(body) <= settings.ALLOWED_NAMESPACES:
+        raise HTTPException(status_code=403, detail="namespace not allowed")
+
+    job_id = await create_job(db, request, PG_REBUILD_FLEET, body, max_retries=body.max_retries)
+    return {"job_id": job_id}
+
+
+@router.post("/jobs/archive")
+async def create_archive_job(
+    body: ArchiveRequest,
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """把早於 older_than_days 的 ops_log / 已結束的 ops_job 封存到 ARCHIVE_DIR 並從 DB 刪除"""
+    cutoff = archive_cutoff(body.older_than_days)
+    job_id = await create_job(
+        db,
+        request,
+        ARCHIVE,
+        ArchiveParams(cutoff=cutoff, older_than_days=body.older_than_days),
         max_retries=body.max_retries,
     )
-    db.add(job)
-    db.commit()
-
-    steps_def = [
-        ("scale_sts_to_zero", 1),
-        ("wait_pods_down", 2),
-        ("delete_pvc", 3),
-        ("scale_sts_to_target", 4),
-        ("wait_pods_ready", 5),
-    ]
-    for name, order in steps_def:
-        s = OpsJobStep(
-            job_id=job_id,
-            name=name,
-            step_order=order,
-            status="pending",
-        )
-        db.add(s)
-    db.commit()
+    return {"job_id": job_id, "cutoff": cutoff}
 
-    # 使用 BackgroundTasks 執行背景 job
-    background_tasks.add_task(run_pg_rebuild_job, job_id)
 
-    return {"job_id": job_id}
+def _encode_cursor(job: OpsJob) -> str:
+    raw = json.dumps([job.created_at.isoformat(), job.id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
 
 
-@router.get("/jobs/{job_id}", response_model=JobOut)
-def get_job(job_id: str, db: Session = Depends(get_db)):
+def _decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, job_pk = json.loads(raw)
+        return datetime.fromisoformat(created_at), int(job_pk)
+    except Exception:
+        raise HTTPException(status_code=400, detail="invalid cursor")
+
+
+def _parse_params_filter(raw: str) -> dict:
+    try:
+        value = json.loads(raw)
+    except ValueError:
+        value = None
+    if not isinstance(value, dict):
+        raise HTTPException(status_code=400, detail="params must be a JSON object")
+    return value
+
+
+@router.get("/jobs", response_model=JobListOut)
+async def list_jobs(
+    type: str | None = None,
+    status: str | None = None,
+    actor: str | None = None,
+    namespace: str | None = None,
+    target_resource: str | None = Query(None, description="e.g. statefulset/postgres"),
+    parent_job_id: str | None = Query(None, description="只列出這個 job 建立的 child job"),
+    params: str | None = Query(None, description='params 包含的 JSON object，e.g. {"ordinal": 0}'),
+    created_after: datetime | None = None,
+    created_before: datetime | None = None,
+    limit: int = Query(50, ge=1, le=500),
+    cursor: str | None = Query(None, description="上一頁回傳的 next_cursor"),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    列出 job，依 created_at 由新到舊。
+
+    用 (created_at, id) 做 keyset 分頁（不用 OFFSET），每一頁都是從 index 上的
+    cursor 位置往後讀 limit 筆，不論翻到第幾頁成本都一樣。
+    """
+    stmt = select(OpsJob)
+    if type:
+        stmt = stmt.where(OpsJob.type == type)
+    if status:
+        stmt = stmt.where(OpsJob.status == status)
+    if actor:
+        stmt = stmt.where(OpsJob.actor == actor)
+    if namespace:
+        stmt = stmt.where(OpsJob.namespace == namespace)
+    if target_resource:
+        stmt = stmt.where(OpsJob.target_resource == target_resource)
+    if parent_job_id:
+        parent_uid = await db.scalar(select(OpsJob.uid).where(OpsJob.job_id == parent_job_id))
+        if parent_uid is None:
+            raise HTTPException(status_code=404, detail="parent job not found")
+        stmt = stmt.where(OpsJob.parent_uid == parent_uid)
+    if params:
+        # params @> :value，走 GIN index
+        stmt = stmt.where(OpsJob.params.contains(_parse_params_filter(params)))
+    if created_after:
+        stmt = stmt.where(OpsJob.created_at >= created_after)
+    if created_before:
+        stmt = stmt.where(OpsJob.created_at < created_before)
+    if cursor:
+        stmt = stmt.where(tuple_(OpsJob.created_at, OpsJob.id) < _decode_cursor(cursor))
+
+    # 多取一筆判斷是否還有下一頁
+    stmt = stmt.order_by(OpsJob.created_at.desc(), OpsJob.id.desc()).limit(limit + 1)
+    jobs = list((await db.scalars(stmt)).all())
+
+    has_more = len(jobs) > limit
+    jobs = jobs[:limit]
+
+    return JobListOut(
+        items=[
+            JobSummaryOut(
+                job_id=job.job_id,
+                type=job.type,
+                status=job.status,
+                version=job.version,
+                parent_job_id=_parent_job_id(job),
+                namespace=job.namespace,
+                target_resource=job.target_resource,
+                actor=job.actor,
+                created_at=job.created_at,
+                finished_at=job.finished_at,
+                retry_count=job.retry_count,
+                max_retries=job.max_retries,
+            )
+            for job in jobs
+        ],
+        next_cursor=_encode_cursor(jobs[-1]) if has_more else None,
+    )
+
+
+def _parent_job_id(job: OpsJob) -> str | None:
+    # parent 都是加入 parent_uid 之後建立的 job，job_id = str(uid)
+    return str(job.parent_uid) if job.parent_uid else None
+
+
+async def _load_job_out(db: AsyncSession, job_id: str) -> JobOut | None:
     # SQLAlchemy 2.0 style
     stmt = select(OpsJob).where(OpsJob.job_id == job_id)
-    job = db.scalar(stmt)
+    job = await db.scalar(stmt)
 
     if not job:
-        raise HTTPException(status_code=404, detail="job not found")
+        return None
 
     # Query steps
     steps_stmt = (
         select(OpsJobStep)
-        .where(OpsJobStep.job_id == job_id)
+        .where(OpsJobStep.job_uid == job.uid)
         .order_by(OpsJobStep.step_order)
     )
-    steps = list(db.scalars(steps_stmt).all())
+    steps = list((await db.scalars(steps_stmt)).all())
+
+    # child job 各狀態的數量（只有 child 才在 partial index 內，一般的 job 不用讀任何 row）
+    children_stmt = (
+        select(OpsJob.status, func.count())
+        .where(OpsJob.parent_uid == job.uid)
+        .group_by(OpsJob.status)
+    )
+    children = dict((await db.execute(children_stmt)).all())
+
+    # step.progress 只寫在 ops_job_event，疊加每個 step 最後一次狀態變化之後的進度
+    version = job.version
+    progress = {}
+    for seq, step_name, payload in await db.execute(latest_step_progress(job.uid)):
+        version = max(version, seq)
+        progress[step_name] = payload.get("detail")
 
     return JobOut(
         job_id=job.job_id,
         type=job.type,
         status=job.status,
+        version=version,
+        parent_job_id=_parent_job_id(job),
+        children=children or None,
         created_at=job.created_at,
         finished_at=job.finished_at,
         params=job.params,
         retry_count=job.retry_count,
         max_retries=job.max_retries,
+        next_run_at=job.next_run_at if job.status == "pending" else None,
         steps=[
             JobStepOut(
                 name=s.name,
                 order=s.step_order,
+                depends_on=s.depends_on,
                 status=s.status,
-                detail=s.detail,
+                # 已結束的 step 以 success / failed 的 detail 為準
+                detail=progress.get(s.name, s.detail) if s.status == "running" else s.detail,
                 started_at=s.started_at,
                 finished_at=s.finished_at,
             )
@@ -104,16 +282,164 @@ def get_job(job_id: str, db: Session = Depends(get_db)):
     )
 
 
+@router.get("/jobs/{job_id}", response_model=JobOut)
+async def get_job(
+    job_id: str,
+    wait: str | None = Query(None, description="long-poll 最長等待時間，例如 30s、500ms、1m"),
+    since_version: int | None = Query(None, description="只在 version 大於此值時回傳"),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    查詢 job 狀態。
+
+    帶 wait 時為 long-poll：job 或任何 step 有變化（version > since_version）才回傳，
+    最多等待 wait（上限 JOB_LONG_POLL_MAX_SECONDS），timeout 時回傳目前狀態。
+    沒有帶 since_version 時以目前的 version 為基準。
+    """
+    timeout = _parse_wait(wait) if wait else 0
+    if not timeout:
+        job = await _load_job_out(db, job_id)
+        if not job:
+            raise HTTPException(status_code=404, detail="job not found")
+        return job
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    # 先訂閱再讀狀態，避免漏掉中間的變化
+    with job_events.subscribe(job_id) as sub:
+        while True:
+            job = await _load_job_out(db, job_id)
+            if not job:
+                raise HTTPException(status_code=404, detail="job not found")
+            if since_version is None:
+                since_version = job.version
+            elif job.version > since_version:
+                return job
+
+            # 等待期間把 DB 連線還給 pool
+            await db.close()
+            remaining = deadline - loop.time()
+            if remaining <= 0 or not await sub.wait(timeout=remaining):
+                return job
+
+
+_WAIT_UNITS = {"ms": 0.001, "s": 1, "m": 60}
+
+
+def _parse_wait(value: str) -> float:
+    """'30s' / '500ms' / '1m' / '30' -> 秒數，上限 JOB_LONG_POLL_MAX_SECONDS"""
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*(ms|s|m)?\s*", value)
+    if not match:
+        raise HTTPException(status_code=422, detail=f"invalid wait: {value!r}")
+    seconds = float(match.group(1)) * _WAIT_UNITS[match.group(2) or "s"]
+    return min(seconds, settings.JOB_LONG_POLL_MAX_SECONDS)
+
+
+def _sse(event: str, data: str, event_id: int | None = None) -> str:
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {data}")
+    return "\n".join(lines) + "\n\n"
+
+
+@router.get("/jobs/{job_id}/events")
+async def stream_job_events(
+    job_id: str,
+    request: Request,
+    last_event_id: str | None = Header(None, alias="Last-Event-ID"),
+):
+    """
+    以 Server-Sent Events 推送 job 進度。
+
+    每次 job 或 step 有變化（狀態、detail）推送一個 `job` event，data 為完整的 JobOut，
+    event id 為 job version；斷線重連時帶 Last-Event-ID，只會收到比它新的狀態。
+    job 結束（success / failed）後送出 `end` event 並關閉連線。
+
+    等待期間不佔用 DB 連線，只在收到變化通知時查詢一次。
+    """
+    try:
+        since_version = int(last_event_id) if last_event_id else 0
+    except ValueError:
+        since_version = 0
+
+    async with AsyncSessionLocal() as db:
+        if not await db.scalar(select(OpsJob.id).where(OpsJob.job_id == job_id)):
+            raise HTTPException(status_code=404, detail="job not found")
+
+    async def event_stream():
+        nonlocal since_version
+        # 先訂閱再讀狀態，避免漏掉中間的變化
+        with job_events.subscribe(job_id) as sub:
+            while True:
+                async with AsyncSessionLocal() as db:
+                    job = await _load_job_out(db, job_id)
+                if job is None:
+                    yield _sse("error", json.dumps({"detail": "job not found"}))
+                    return
+
+                if job.version > since_version:
+                    since_version = job.version
+                    yield _sse("job", job.json(), event_id=job.version)
+
+                if job.status in ("success", "failed", "cancelled"):
+                    yield _sse("end", json.dumps({"status": job.status}), event_id=job.version)
+                    return
+
+                if await request.is_disconnected():
+                    return
+                if not await sub.wait(timeout=settings.JOB_EVENTS_KEEPALIVE_SECONDS):
+                    # 讓 proxy / load balancer 不會把閒置連線切掉
+                    yield ": keepalive\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/jobs/{job_id}/timeline", response_model=JobTimelineOut)
+async def get_job_timeline(
+    job_id: str,
+    after_seq: int = Query(0, description="只回傳 seq 大於此值的 event"),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Job 的完整事件紀錄（ops_job_event），依 seq 由舊到新。
+
+    包含每次狀態轉換（哪個 worker 領取、每次重試、每個 step 的開始 / 結束）與執行中的進度，
+    依序重播即可還原 job 在任何時間點的狀態，事後檢討用。
+    """
+    job_uid = await db.scalar(select(OpsJob.uid).where(OpsJob.job_id == job_id))
+    if not job_uid:
+        raise HTTPException(status_code=404, detail="job not found")
+
+    stmt = (
+        select(OpsJobEvent)
+        .where(OpsJobEvent.job_uid == job_uid, OpsJobEvent.seq > after_seq)
+        .order_by(OpsJobEvent.seq)
+    )
+    events = (await db.scalars(stmt)).all()
+    return JobTimelineOut(
+        job_id=job_id,
+        events=[
+            JobEventOut(seq=e.seq, type=e.type, step=e.step, payload=e.payload, ts=e.ts)
+            for e in events
+        ],
+    )
+
+
 @router.post("/jobs/{job_id}/retry")
 async def retry_job(
     job_id: str,
-    background_tasks: BackgroundTasks,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """手動重試失敗的 Job"""
     # SQLAlchemy 2.0 style
     stmt = select(OpsJob).where(OpsJob.job_id == job_id)
-    job = db.scalar(stmt)
+    job = await db.scalar(stmt)
 
     if not job:
         raise HTTPException(status_code=404, detail="job not found")
@@ -134,10 +460,11 @@ async def retry_job(
     job.retry_count += 1
     job.status = "pending"
     job.finished_at = None
-    db.commit()
+    job.next_run_at = now_utc()
+    await db.commit()
 
-    # 重新提交背景任務
-    background_tasks.add_task(run_pg_rebuild_job, job_id)
+    # 重新排入 job queue
+    job_worker.wake()
 
     return {
         "message": "job retry scheduled",
@@ -0,0 +1,111 @@
+import csv
+import io
+import json
+from datetime import datetime
+from typing import Literal
+
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+
+from ..auth import verify_api_key
+from ..db import async_engine
+from ..models import OpsLog
+
+router = APIRouter(dependencies=[Depends(verify_api_key)])
+
+# 每次從 server-side cursor 取回的筆數，同時也是每個 response chunk 的筆數
+STREAM_BATCH_SIZE = 1000
+
+LOG_COLUMNS = [c.name for c in OpsLog.__table__.columns]
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"cannot serialize {type(value)}")
+
+
+def _to_ndjson(rows) -> str:
+    return "".join(json.dumps(dict(r._mapping), default=_json_default) + "\n" for r in rows)
+
+
+def _to_csv(rows) -> str:
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for r in rows:
+        writer.writerow(
+            json.dumps(v) if isinstance(v, (dict, list)) else v
+            for v in r
+        )
+    return buf.getvalue()
+
+
+def _csv_header() -> str:
+    buf = io.StringIO()
+    csv.writer(buf).writerow(LOG_COLUMNS)
+    return buf.getvalue()
+
+
+@router.get("/logs")
+async def query_logs(
+    actor: str | None = None,
+    namespace: str | None = None,
+    resource_kind: str | None = None,
+    resource_name: str | None = None,
+    action: str | None = None,
+    status: str | None = None,
+    since: datetime | None = Query(None, description="ts >= since"),
+    until: datetime | None = Query(None, description="ts < until"),
+    format: Literal["ndjson", "csv"] = "ndjson",
+    limit: int | None = Query(None, ge=1),
+):
+    """
+    查詢 / 匯出 ops_log，依 ts 由舊到新以 NDJSON 或 CSV 串流回傳（chunked transfer）。
+
+    使用 server-side cursor 每次取 STREAM_BATCH_SIZE 筆、寫出後就丟掉，
+    不建立 ORM 物件，不論結果多大記憶體用量都固定。
+    帶 since / until 時只會掃描對應的 ops_log partition。
+    """
+    stmt = select(OpsLog.__table__)
+    if actor:
+        stmt = stmt.where(OpsLog.actor == actor)
+    if namespace:
+        stmt = stmt.where(OpsLog.namespace == namespace)
+    if resource_kind:
+        stmt = stmt.where(OpsLog.resource_kind == resource_kind)
+    if resource_name:
+        stmt = stmt.where(OpsLog.resource_name == resource_name)
+    if action:
+        stmt = stmt.where(OpsLog.action == action)
+    if status:
+        stmt = stmt.where(OpsLog.status == status)
+    if since:
+        stmt = stmt.where(OpsLog.ts >= since)
+    if until:
+        stmt = stmt.where(OpsLog.ts < until)
+    stmt = stmt.order_by(OpsLog.ts, OpsLog.id)
+    if limit:
+        stmt = stmt.limit(limit)
+    stmt = stmt.execution_options(yield_per=STREAM_BATCH_SIZE)
+
+    encode = _to_csv if format == "csv" else _to_ndjson
+
+    async def body():
+        # 連線在 generator 內建立：response 開始送出後才借用，送完（或 client 斷線）就歸還
+        if format == "csv":
+            yield _csv_header()
+        async with async_engine.connect() as conn:
+            result = await conn.stream(stmt)
+            async for rows in result.partitions():
+                yield encode(rows)
+
+    headers = {}
+    if format == "csv":
+        headers["Content-Disposition"] = 'attachment; filename="ops_log.csv"'
+    return StreamingResponse(body(), media_type=MEDIA_TYPES[format], headers=headers)
@@ -1,10 +1,8 @@
 from fastapi import APIRouter, Depends, HTTPException, Request
 from kubernetes import client
-from sqlalchemy.orm import Session
 
 from ..auth import verify_api_key
 from ..config import settings
-from ..db import get_db
 from ..k8s_client import core_v1, apps_v1
 from ..logging_utils import safe_log_op
 from ..schemas import ScaleRequest
@@ -22,7 +20,6 @@ def delete_pod(
     namespace: str,
     pod_name: str,
     request: Request,
-    db: Session = Depends(get_db),
 ):
     ensure_ns(namespace)
     status = "error"
@@ -37,7 +34,6 @@ def delete_pod(
         raise HTTPException(status_code=e.status, detail=e.body)
     finally:
         safe_log_op(
-            db,
             request=request,
             action="delete_pod",
             resource_kind="Pod",
@@ -55,7 +51,6 @@ def scale_deployment(
     name: str,
     body: ScaleRequest,
     request: Request,
-    db: Session = Depends(get_db),
 ):
     ensure_ns(namespace)
     status = "error"
@@ -76,7 +71,6 @@ def scale_deployment(
         raise HTTPException(status_code=e.status, detail=e.body)
     finally:
         safe_log_op(
-            db,
             request=request,
             action="scale_deployment",
             resource_kind="Deployment",
@@ -94,7 +88,6 @@ def scale_statefulset(
     name: str,
     body: ScaleRequest,
     request: Request,
-    db: Session = Depends(get_db),
 ):
     ensure_ns(namespace)
     status = "error"
@@ -115,7 +108,6 @@ def scale_statefulset(
         raise HTTPException(status_code=e.status, detail=e.body)
     finally:
         safe_log_op(
-            db,
             request=request,
             action="scale_statefulset",
             resource_kind="StatefulSet",
@@ -132,7 +124,6 @@ def delete_pvc(
     namespace: str,
     pvc_name: str,
     request: Request,
-    db: Session = Depends(get_db),
 ):
     ensure_ns(namespace)
     status = "error"
@@ -149,7 +140,6 @@ def delete_pvc(
         raise HTTPException(status_code=e.status, detail=e.body)
     finally:
         safe_log_op(
-            db,
             request=request,
             action="delete_pvc",
             resource_kind="PersistentVolumeClaim",
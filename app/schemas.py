@@ -1,4 +1,5 @@
 from datetime import datetime
+from typing import Any, Literal
 
 from pydantic import BaseModel
 
@@ -7,17 +8,81 @@ class ScaleRequest(BaseModel):
     replicas: int
 
 
-class PgRebuildRequest(BaseModel):
+# ----- job 參數（存在 ops_job.params，由 JobDefinition.params 驗證） -----
+
+# scale-to-zero: 整個 StatefulSet scale 到 0 再 scale 回來
+# ordinal: 只回收目標 ordinal 的 pod 與 PVC，其他 replica 不受影響（不使用 target_replicas）
+PgRebuildStrategy = Literal["scale-to-zero", "ordinal"]
+
+
+class PgRebuildParams(BaseModel):
     namespace: str
     statefulset: str
     ordinal: int
     target_replicas: int = 1
+    strategy: PgRebuildStrategy = "scale-to-zero"
+
+
+class PgRebuildFleetTarget(BaseModel):
+    namespace: str
+    statefulset: str
+    ordinals: list[int] = [0]
+    # None = 重建前 StatefulSet 的 spec.replicas
+    target_replicas: int | None = None
+
+
+class PgRebuildFleetParams(BaseModel):
+    # 明確列出的 StatefulSet
+    statefulsets: list[PgRebuildFleetTarget] = []
+    # 或用 label selector 在 namespaces 內挑選 StatefulSet，重建 ordinals 指定的 ordinal
+    namespaces: list[str] = []
+    label_selector: str | None = None
+    ordinals: list[int] = [0]
+    # 同時執行的 child job 數上限（全部 / 每個 namespace）；同一個 StatefulSet 一次只重建一個 ordinal
+    max_parallel: int = 5
+    max_parallel_per_namespace: int = 2
+    # 失敗的 child 超過幾個就不再開始新的 child（剩下的標記為 cancelled）
+    max_failures: int = 0
+    strategy: PgRebuildStrategy = "scale-to-zero"
+    child_max_retries: int = 3
+
+
+class ArchiveParams(BaseModel):
+    cutoff: datetime
+    older_than_days: int | None = None
+
+
+class ArchiveRestoreParams(BaseModel):
+    run_id: str
+    tables: list[str]
+
+
+# ----- request -----
+
+class PgRebuildRequest(PgRebuildParams):
+    max_retries: int = 3
+
+
+class PgRebuildFleetRequest(PgRebuildFleetParams):
+    max_retries: int = 3
+
+
+class ArchiveRequest(BaseModel):
+    # 封存早於幾天的資料，預設 ARCHIVE_AFTER_DAYS
+    older_than_days: int | None = None
+    max_retries: int = 3
+
+
+class ArchiveRestoreRequest(BaseModel):
+    tables: list[str] = ["ops_log", "ops_job"]
     max_retries: int = 3
 
 
 class JobStepOut(BaseModel):
     name: str
     order: int
+    # 依賴的 step，None = 依 order 依序執行（加入 depends_on 前建立的 job）
+    depends_on: list[str] | None = None
     status: str
     detail: str | None = None
     started_at: datetime | None = None
@@ -28,9 +93,48 @@ class JobOut(BaseModel):
     job_id: str
     type: str
     status: str
+    version: int
+    parent_job_id: str | None = None
+    # child job 各狀態的數量（例如 pg-rebuild-fleet），沒有 child 時為 None
+    children: dict[str, int] | None = None
     created_at: datetime
     finished_at: datetime | None = None
-    params: dict[str, any]
+    params: dict[str, Any]
     retry_count: int
     max_retries: int
+    next_run_at: datetime | None = None
     steps: list[JobStepOut]
+
+
+class JobEventOut(BaseModel):
+    seq: int
+    type: str
+    step: str | None = None
+    payload: dict[str, Any]
+    ts: datetime
+
+
+class JobTimelineOut(BaseModel):
+    job_id: str
+    events: list[JobEventOut]
+
+
+class JobSummaryOut(BaseModel):
+    job_id: str
+    type: str
+    status: str
+    version: int
+    parent_job_id: str | None = None
+    namespace: str | None = None
+    target_resource: str | None = None
+    actor: str | None = None
+    created_at: datetime
+    finished_at: datetime | None = None
+    retry_count: int
+    max_retries: int
+
+
+class JobListOut(BaseModel):
+    items: list[JobSummaryOut]
+    # 下一頁的 cursor，沒有下一頁時為 None
+    next_cursor: str | None = None
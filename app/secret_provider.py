@@ -0,0 +1,113 @@
+"""
+Secret provider
+
+Vault Agent 注入的 secret 檔讀一次後快取在記憶體，request path 不再每次 stat + read。
+背景 thread 定期檢查檔案的 mtime / size / inode，有變化（Vault Agent 重新 render）
+才重新讀取，輪替後不需要重啟。
+"""
+
+import os
+import threading
+
+
+class SecretFile:
+    """
+    從檔案（優先）或環境變數讀取的 secret。
+
+    multi=True 時支援多個同時有效的值（key rotation）：
+    檔案每行一個、環境變數以逗號分隔。
+    """
+
+    def __init__(self, path: str, env_name: str, *, multi: bool = False):
+        self.path = path
+        self.env_name = env_name
+        self.multi = multi
+        self._lock = threading.Lock()
+        self._values: list[str] | None = None
+        self._signature = None
+        self._listeners = []
+
+    @property
+    def values(self) -> list[str]:
+        values = self._values
+        if values is None:
+            self.refresh()
+            values = self._values
+        return values
+
+    @property
+    def value(self) -> str:
+        return self.values[0]
+
+    def on_change(self, callback):
+        """註冊 secret 內容改變時的 callback（在 reloader thread 呼叫）"""
+        self._listeners.append(callback)
+
+    def _file_signature(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    def _parse(self, raw: str, sep: str) -> list[str]:
+        if not self.multi:
+            return [raw.strip()]
+        return [v.strip() for v in raw.split(sep) if v.strip()]
+
+    def refresh(self) -> bool:
+        """檔案有變化時重新讀取，回傳內容是否改變"""
+        with self._lock:
+            signature = self._file_signature()
+            if self._values is not None and signature == self._signature:
+                return False
+
+            if signature is not None:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    values = self._parse(f.read(), "\n")
+            else:
+                raw = os.environ.get(self.env_name)
+                values = self._parse(raw, ",") if raw else []
+            if not values or not values[0]:
+                raise RuntimeError(f"No secret found at {self.path} or env {self.env_name}")
+
+            changed = self._values is not None and values != self._values
+            self._values = values
+            self._signature = signature
+
+        if changed:
+            print(f"[secrets] reloaded {self.path}")
+            for callback in self._listeners:
+                try:
+                    callback(values)
+                except Exception as e:
+                    print(f"[secrets] on_change callback failed: {e}")
+        return changed
+
+
+class SecretReloader:
+    """背景定期 refresh 所有 SecretFile"""
+
+    def __init__(self, secrets: list[SecretFile], interval: float):
+        self.secrets = secrets
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="secret-reloader", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            for secret in self.secrets:
+                try:
+                    secret.refresh()
+                except Exception as e:
+                    # 讀取失敗時保留舊值
+                    print(f"[secrets] failed to reload {secret.path}: {e}")
@@ -0,0 +1,82 @@
+"""
+StatefulSet helpers
+
+用 StatefulSet 的 spec.selector 與 ownerReference 找出它自己的 pod，
+避免用 name prefix 比對時誤抓到 `pg-replica-0` 這類兄弟 StatefulSet 的 pod。
+"""
+
+from dataclasses import dataclass
+
+from .k8s_client import async_apps_v1
+
+
+@dataclass(frozen=True)
+class StatefulSetRef:
+    """解析一次後重複使用的 StatefulSet 識別資訊"""
+
+    namespace: str
+    name: str
+    uid: str
+    match_labels: dict[str, str]
+
+
+async def resolve_statefulset(namespace: str, name: str) -> StatefulSetRef:
+    """讀一次 StatefulSet，取得 uid 與 selector"""
+    sts = await async_apps_v1.read_namespaced_stateful_set(name=name, namespace=namespace)
+    return StatefulSetRef(
+        namespace=namespace,
+        name=name,
+        uid=sts.metadata.uid,
+        match_labels=dict(sts.spec.selector.match_labels or {}),
+    )
+
+
+def is_owned_by(obj, owner_uid: str) -> bool:
+    return any(ref.uid == owner_uid for ref in (obj.metadata.owner_references or []))
+
+
+def pods_of(store, ref: StatefulSetRef) -> list:
+    """
+    從 informer store 取出屬於此 StatefulSet 的 pod。
+
+    先用 label 索引縮小範圍（沒有 matchLabels 時改用 owner 索引），
+    再用 ownerReference uid 確認。
+    """
+    if ref.match_labels:
+        candidates = store.by_labels(ref.match_labels)
+    else:
+        candidates = store.by_owner(ref.uid)
+    return [p for p in candidates if is_owned_by(p, ref.uid)]
+
+
+def is_pod_ready(pod) -> bool:
+    conds = (pod.status.conditions or []) if pod.status else []
+    return any(c.type == "Ready" and c.status == "True" for c in conds)
+
+
+def spec_replicas(sts) -> int:
+    # 沒有設定 spec.replicas 時 Kubernetes 預設為 1
+    return sts.spec.replicas if sts.spec.replicas is not None else 1
+
+
+def rollout_status(sts, target_replicas: int) -> tuple[bool, str]:
+    """
+    直接用 StatefulSet status 判斷是否 ready，不需要讀每個 pod。
+
+    cache 必須已經看到新的 spec.replicas，controller 必須已經處理到最新的 spec
+    （observedGeneration >= generation），且 readyReplicas 達到 target_replicas。
+    """
+    if sts.spec.replicas != target_replicas:
+        return False, f"waiting for spec.replicas={target_replicas} (current {sts.spec.replicas})"
+
+    generation = sts.metadata.generation or 0
+    status = sts.status
+    observed = (status.observed_generation or 0) if status else 0
+    ready = (status.ready_replicas or 0) if status else 0
+    replicas = (status.replicas or 0) if status else 0
+
+    if observed < generation:
+        return False, f"waiting for controller: observedGeneration {observed}/{generation}"
+    if ready >= target_replicas:
+        return True, f"{ready} pods ready"
+    return False, f"ready replicas {ready}/{target_replicas} (current {replicas})"
@@ -0,0 +1,31 @@
+-- Migration: Add job queue lease fields to ops_job table
+-- Created: 2026-10-17
+-- Description: Add lease_owner and lease_expires_at columns so API replicas can
+--              claim jobs with SELECT ... FOR UPDATE SKIP LOCKED and reclaim
+--              jobs whose worker stopped heartbeating
+
+-- Worker that currently holds the job
+ALTER TABLE ops_job
+ADD COLUMN IF NOT EXISTS lease_owner TEXT;
+
+-- Lease expiry, extended by the worker heartbeat
+ALTER TABLE ops_job
+ADD COLUMN IF NOT EXISTS lease_expires_at TIMESTAMP WITH TIME ZONE;
+
+-- Claim pending jobs in creation order
+CREATE INDEX IF NOT EXISTS ix_ops_job_pending
+ON ops_job (created_at)
+WHERE status = 'pending';
+
+-- Find running jobs whose lease expired
+CREATE INDEX IF NOT EXISTS ix_ops_job_running_lease
+ON ops_job (lease_expires_at)
+WHERE status = 'running';
+
+-- Verify migration
+SELECT
+    column_name,
+    data_type
+FROM information_schema.columns
+WHERE table_name = 'ops_job'
+    AND column_name IN ('lease_owner', 'lease_expires_at');
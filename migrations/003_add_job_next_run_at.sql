@@ -0,0 +1,32 @@
+-- Migration: Add next_run_at to ops_job table
+-- Created: 2026-10-17
+-- Description: Failed jobs are re-queued with exponential backoff by setting
+--              next_run_at; workers only claim pending jobs whose next_run_at
+--              has passed
+
+-- Earliest time the job may be claimed
+ALTER TABLE ops_job
+ADD COLUMN IF NOT EXISTS next_run_at TIMESTAMP WITH TIME ZONE;
+
+-- Existing jobs are due immediately
+UPDATE ops_job
+SET next_run_at = created_at
+WHERE next_run_at IS NULL;
+
+ALTER TABLE ops_job
+ALTER COLUMN next_run_at SET NOT NULL;
+
+-- Claim due pending jobs by next_run_at instead of created_at
+DROP INDEX IF EXISTS ix_ops_job_pending;
+CREATE INDEX ix_ops_job_pending
+ON ops_job (next_run_at)
+WHERE status = 'pending';
+
+-- Verify migration
+SELECT
+    column_name,
+    data_type,
+    is_nullable
+FROM information_schema.columns
+WHERE table_name = 'ops_job'
+    AND column_name = 'next_run_at';
@@ -0,0 +1,16 @@
+-- Migration: Add version to ops_job table
+-- Created: 2026-10-17
+-- Description: Monotonic job version, bumped whenever the job or any of its
+--              steps changes; used as the SSE event id for job progress streams
+
+ALTER TABLE ops_job
+ADD COLUMN IF NOT EXISTS version BIGINT NOT NULL DEFAULT 1;
+
+-- Verify migration
+SELECT
+    column_name,
+    data_type,
+    is_nullable
+FROM information_schema.columns
+WHERE table_name = 'ops_job'
+    AND column_name = 'version';
@@ -0,0 +1,32 @@
+-- Migration: Add composite indexes for job listing
+-- Created: 2026-10-17
+-- Description: GET /ops/jobs pages with keyset pagination over
+--              (created_at, id); each filter gets a composite index ending in
+--              (created_at, id) so every page is an index range scan
+--
+-- CREATE INDEX CONCURRENTLY cannot run inside a transaction block; run this
+-- file with psql autocommit (the default), not wrapped in BEGIN/COMMIT.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_ops_job_created
+ON ops_job (created_at, id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_ops_job_status_created
+ON ops_job (status, created_at, id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_ops_job_type_created
+ON ops_job (type, created_at, id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_ops_job_actor_created
+ON ops_job (actor, created_at, id);
+
+-- Namespace lives in params; the expression must match the one used by the API
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_ops_job_namespace_created
+ON ops_job ((params ->> 'namespace'), created_at, id);
+
+-- Verify migration
+SELECT
+    indexname,
+    indexdef
+FROM pg_indexes
+WHERE tablename = 'ops_job'
+    AND indexname LIKE 'ix_ops_job%created';
@@ -0,0 +1,84 @@
+-- Migration: Time-ordered binary job ids and a real job -> step foreign key
+-- Created: 2026-10-17
+-- Description: Adds ops_job.uid (UUIDv7) and ops_job_step.job_uid, a foreign
+--              key to it, and composite indexes for step lookups.
+--              Existing string job ids keep working: ops_job.job_id is kept
+--              (new jobs store str(uid) there) and old rows get a uid derived
+--              from created_at so they still sort by time.
+
+BEGIN;
+
+-- UUIDv7 with the timestamp taken from ts (gen_random_uuid() is built in on PG 13+)
+CREATE FUNCTION pg_temp.uuid7_from(ts TIMESTAMP WITH TIME ZONE) RETURNS uuid AS $$
+    SELECT encode(
+        set_bit(
+            set_bit(
+                overlay(
+                    uuid_send(gen_random_uuid())
+                    PLACING substring(int8send(floor(extract(epoch FROM ts) * 1000)::bigint) FROM 3)
+                    FROM 1 FOR 6
+                ),
+                52, 1
+            ),
+            53, 1
+        ),
+        'hex'
+    )::uuid;
+$$ LANGUAGE sql VOLATILE;
+
+-- ops_job.uid
+ALTER TABLE ops_job
+ADD COLUMN IF NOT EXISTS uid UUID;
+
+UPDATE ops_job
+SET uid = CASE
+    WHEN job_id ~ '^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$' THEN job_id::uuid
+    ELSE pg_temp.uuid7_from(created_at)
+END
+WHERE uid IS NULL;
+
+ALTER TABLE ops_job
+ALTER COLUMN uid SET NOT NULL;
+
+ALTER TABLE ops_job
+ADD CONSTRAINT ops_job_uid_key UNIQUE (uid);
+
+-- ops_job_step.job_uid
+ALTER TABLE ops_job_step
+ADD COLUMN IF NOT EXISTS job_uid UUID;
+
+UPDATE ops_job_step s
+SET job_uid = j.uid
+FROM ops_job j
+WHERE j.job_id = s.job_id
+    AND s.job_uid IS NULL;
+
+-- Steps whose job no longer exists cannot be shown by any API; drop them
+DELETE FROM ops_job_step
+WHERE job_uid IS NULL;
+
+ALTER TABLE ops_job_step
+ALTER COLUMN job_uid SET NOT NULL;
+
+ALTER TABLE ops_job_step
+ADD CONSTRAINT ops_job_step_job_uid_fkey
+FOREIGN KEY (job_uid) REFERENCES ops_job (uid) ON DELETE CASCADE;
+
+-- get_job lists steps by order; run_step looks steps up by name
+CREATE UNIQUE INDEX IF NOT EXISTS ux_ops_job_step_job_order
+ON ops_job_step (job_uid, step_order);
+
+CREATE UNIQUE INDEX IF NOT EXISTS ux_ops_job_step_job_name
+ON ops_job_step (job_uid, name);
+
+COMMIT;
+
+-- Verify migration
+SELECT
+    table_name,
+    column_name,
+    data_type,
+    is_nullable
+FROM information_schema.columns
+WHERE (table_name = 'ops_job' AND column_name = 'uid')
+    OR (table_name = 'ops_job_step' AND column_name = 'job_uid');
@@ -0,0 +1,85 @@
+-- Migration: Range-partition ops_log by ts
+-- Created: 2026-10-17
+-- Description: Rebuilds ops_log as a table partitioned by RANGE (ts) with
+--              monthly partitions named ops_log_pYYYY_MM, copies the existing
+--              rows, and adds indexes on (namespace, resource_name, ts) and
+--              (actor, ts). The API (app/partitions.py) then creates upcoming
+--              partitions ahead of time and drops the ones past retention.
+--
+-- Run during a quiet period: ops_log writes are briefly blocked while the rows
+-- are copied. Writes that fail meanwhile are spooled by the audit writer and
+-- replayed afterwards.
+
+BEGIN;
+
+-- Partition bounds are computed in UTC, matching app/partitions.py
+SET LOCAL TimeZone = 'UTC';
+
+LOCK TABLE ops_log IN ACCESS EXCLUSIVE MODE;
+
+ALTER TABLE ops_log RENAME TO ops_log_unpartitioned;
+ALTER TABLE ops_log_unpartitioned RENAME CONSTRAINT ops_log_pkey TO ops_log_unpartitioned_pkey;
+
+-- The partition key must be part of the primary key
+CREATE TABLE ops_log (
+    id BIGINT NOT NULL DEFAULT nextval('ops_log_id_seq'),
+    ts TIMESTAMP WITH TIME ZONE NOT NULL,
+    actor TEXT,
+    source_ip TEXT,
+    action TEXT NOT NULL,
+    resource_kind TEXT NOT NULL,
+    namespace TEXT NOT NULL,
+    resource_name TEXT NOT NULL,
+    request_body JSON,
+    status TEXT NOT NULL,
+    error_message TEXT,
+    PRIMARY KEY (id, ts)
+) PARTITION BY RANGE (ts);
+
+ALTER SEQUENCE ops_log_id_seq OWNED BY ops_log.id;
+
+-- Indexes on the parent are created on every partition automatically
+CREATE INDEX ix_ops_log_resource_ts ON ops_log (namespace, resource_name, ts);
+CREATE INDEX ix_ops_log_actor_ts ON ops_log (actor, ts);
+
+-- Monthly partitions from the oldest existing row up to 3 months ahead
+DO $$
+DECLARE
+    month_start TIMESTAMP WITH TIME ZONE;
+    last_month TIMESTAMP WITH TIME ZONE;
+BEGIN
+    SELECT date_trunc('month', COALESCE(min(ts), now()) AT TIME ZONE 'UTC') AT TIME ZONE 'UTC'
+    INTO month_start
+    FROM ops_log_unpartitioned;
+
+    last_month := (date_trunc('month', now() AT TIME ZONE 'UTC') + interval '3 months') AT TIME ZONE 'UTC';
+
+    WHILE month_start <= last_month LOOP
+        EXECUTE format(
+            'CREATE TABLE IF NOT EXISTS %I PARTITION OF ops_log FOR VALUES FROM (%L) TO (%L)',
+            'ops_log_p' || to_char(month_start AT TIME ZONE 'UTC', 'YYYY_MM'),
+            month_start,
+            month_start + interval '1 month'
+        );
+        month_start := month_start + interval '1 month';
+    END LOOP;
+END $$;
+
+INSERT INTO ops_log
+SELECT id, ts, actor, source_ip, action, resource_kind, namespace,
+       resource_name, request_body, status, error_message
+FROM ops_log_unpartitioned;
+
+DROP TABLE ops_log_unpartitioned;
+
+COMMIT;
+
+-- Verify migration
+SELECT
+    c.relname AS partition,
+    pg_get_expr(c.relpartbound, c.oid) AS bound
+FROM pg_inherits i
+JOIN pg_class c ON c.oid = i.inhrelid
+JOIN pg_class p ON p.oid = i.inhparent
+WHERE p.relname = 'ops_log'
+ORDER BY c.relname;
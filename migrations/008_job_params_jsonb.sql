@@ -0,0 +1,52 @@
+-- Migration: JSONB job params and indexed namespace / target_resource columns
+-- Created: 2026-10-17
+-- Description: "Which jobs touched StatefulSet X in namespace Y" used to scan
+--              ops_job and parse params as JSON text. params becomes JSONB
+--              with a GIN (jsonb_path_ops) index for containment queries, and
+--              namespace / target_resource are stored in their own indexed
+--              columns, filled in when the job is created.
+--
+-- The ALTER COLUMN ... TYPE rewrites ops_job under an ACCESS EXCLUSIVE lock;
+-- job creation / claiming waits until it finishes. The indexes are built
+-- CONCURRENTLY afterwards, so run this file with psql autocommit (the
+-- default), not wrapped in BEGIN/COMMIT.
+
+-- The params->>'namespace' expression index (005) is replaced by a column index
+DROP INDEX CONCURRENTLY IF EXISTS ix_ops_job_namespace_created;
+
+BEGIN;
+
+ALTER TABLE ops_job
+ALTER COLUMN params TYPE JSONB USING params::jsonb;
+
+ALTER TABLE ops_job
+ADD COLUMN IF NOT EXISTS namespace TEXT;
+
+ALTER TABLE ops_job
+ADD COLUMN IF NOT EXISTS target_resource TEXT;
+
+UPDATE ops_job
+SET namespace = params ->> 'namespace',
+    target_resource = CASE
+        WHEN type = 'pg-rebuild' THEN 'statefulset/' || (params ->> 'statefulset')
+    END
+WHERE namespace IS NULL;
+
+COMMIT;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_ops_job_namespace_created
+ON ops_job (namespace, created_at, id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_ops_job_target_created
+ON ops_job (namespace, target_resource, created_at, id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_ops_job_params
+ON ops_job USING gin (params jsonb_path_ops);
+
+-- Verify migration
+SELECT
+    column_name,
+    data_type
+FROM information_schema.columns
+WHERE table_name = 'ops_job'
+    AND column_name IN ('params', 'namespace', 'target_resource');
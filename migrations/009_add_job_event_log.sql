@@ -0,0 +1,38 @@
+-- Migration: Append-only job event log
+-- Created: 2026-10-17
+-- Description: ops_job_event records every job / step state change and step
+--              progress update. ops_job / ops_job_step stay as the projection
+--              of current state, written in the same transaction as the
+--              event; progress updates only insert an event instead of
+--              rewriting ops_job_step.detail.
+--              ops_job.version now holds the seq of the last projected event,
+--              so the sequence starts above every existing version to keep
+--              versions (SSE event ids) increasing.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS ops_job_event (
+    seq BIGSERIAL PRIMARY KEY,
+    job_uid UUID NOT NULL REFERENCES ops_job (uid) ON DELETE CASCADE,
+    type TEXT NOT NULL,
+    step TEXT,
+    payload JSONB NOT NULL,
+    ts TIMESTAMP WITH TIME ZONE NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS ix_ops_job_event_job_seq
+ON ops_job_event (job_uid, seq);
+
+SELECT setval(
+    pg_get_serial_sequence('ops_job_event', 'seq'),
+    GREATEST((SELECT max(version) FROM ops_job), 1)
+);
+
+COMMIT;
+
+-- Verify migration
+SELECT
+    column_name,
+    data_type
+FROM information_schema.columns
+WHERE table_name = 'ops_job_event';
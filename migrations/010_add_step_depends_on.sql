@@ -0,0 +1,22 @@
+-- Migration: Step dependencies (DAG)
+-- Created: 2026-10-17
+-- Description: ops_job_step.depends_on lists the steps that must succeed
+--              before a step runs, so independent steps of one job can run
+--              concurrently. NULL keeps the old behaviour (run after the
+--              previous step_order), so existing jobs and jobs created by
+--              replicas that have not been upgraded yet still run in order.
+
+BEGIN;
+
+ALTER TABLE ops_job_step
+ADD COLUMN IF NOT EXISTS depends_on JSONB;
+
+COMMIT;
+
+-- Verify migration
+SELECT
+    column_name,
+    data_type
+FROM information_schema.columns
+WHERE table_name = 'ops_job_step'
+    AND column_name = 'depends_on';
@@ -0,0 +1,28 @@
+-- Migration: Parent / child jobs
+-- Created: 2026-10-17
+-- Description: ops_job.parent_uid links child jobs to the job that created
+--              them (e.g. the pg-rebuild jobs of a pg-rebuild-fleet job).
+--              Children start as 'waiting' (never claimed by workers) until
+--              the parent releases them as 'pending', or marks them
+--              'cancelled' when its failure budget is exhausted.
+--              The partial index only covers child jobs, so ordinary jobs
+--              add no index maintenance.
+
+BEGIN;
+
+ALTER TABLE ops_job
+ADD COLUMN IF NOT EXISTS parent_uid UUID REFERENCES ops_job (uid) ON DELETE SET NULL;
+
+CREATE INDEX IF NOT EXISTS ix_ops_job_parent_created
+ON ops_job (parent_uid, created_at, id)
+WHERE parent_uid IS NOT NULL;
+
+COMMIT;
+
+-- Verify migration
+SELECT
+    column_name,
+    data_type
+FROM information_schema.columns
+WHERE table_name = 'ops_job'
+    AND column_name = 'parent_uid';
@@ -224,26 +224,38 @@ def job():
 @click.option('--namespace', '-n', required=True, help='Namespace')
 @click.option('--statefulset', '-s', required=True, help='StatefulSet name')
 @click.option('--ordinal', '-o', type=int, default=0, help='Pod ordinal (default: 0)')
-@click.option('--target-replicas', '-r', type=int, default=1, help='Target replicas (default: 1)')
+@click.option('--target-replicas', '-r', type=int, default=1, help='Target replicas (default: 1, scale-to-zero only)')
+@click.option('--strategy', type=click.Choice(['scale-to-zero', 'ordinal']), default='scale-to-zero',
+              help='scale-to-zero: scale the whole StatefulSet to 0; ordinal: recycle only the target pod and PVC')
 @click.option('--max-retries', type=int, default=3, help='Max retry attempts (default: 3)')
 @click.option('--yes', '-y', is_flag=True, help='Skip confirmation')
-def job_pg_rebuild(namespace, statefulset, ordinal, target_replicas, max_retries, yes):
+def job_pg_rebuild(namespace, statefulset, ordinal, target_replicas, strategy, max_retries, yes):
     """Create a PG rebuild job"""
     pvc_name = f"data-{statefulset}-{ordinal}"
+    pod_name = f"{statefulset}-{ordinal}"
 
     console.print("\n[bold]PG Rebuild Job[/bold]")
     console.print(f"  Namespace: {namespace}")
     console.print(f"  StatefulSet: {statefulset}")
     console.print(f"  Ordinal: {ordinal}")
     console.print(f"  PVC: {pvc_name}")
-    console.print(f"  Target Replicas: {target_replicas}")
+    console.print(f"  Strategy: {strategy}")
+    if strategy == 'scale-to-zero':
+        console.print(f"  Target Replicas: {target_replicas}")
     console.print(f"  Max Retries: {max_retries}")
     console.print("\n[yellow]This will:[/yellow]")
-    console.print(f"  1. Scale {statefulset} to 0")
-    console.print(f"  2. Wait for pods to terminate")
-    console.print(f"  3. Delete PVC: {pvc_name}")
-    console.print(f"  4. Scale {statefulset} to {target_replicas}")
-    console.print(f"  5. Wait for pods to be ready\n")
+    if strategy == 'ordinal':
+        console.print(f"  1. Delete PVC: {pvc_name}")
+        console.print(f"  2. Delete pod: {pod_name}")
+        console.print(f"  3. Wait for PVC {pvc_name} to be deleted")
+        console.print(f"  4. Let {statefulset} recreate {pod_name} with a new PVC")
+        console.print(f"  5. Wait for {pod_name} to be ready (other pods keep running)\n")
+    else:
+        console.print(f"  1. Scale {statefulset} to 0")
+        console.print(f"  2. Wait for pods to terminate")
+        console.print(f"  3. Delete PVC: {pvc_name}")
+        console.print(f"  4. Scale {statefulset} to {target_replicas}")
+        console.print(f"  5. Wait for pods to be ready\n")
 
     if not yes:
         if not click.confirm("Continue?"):
@@ -257,6 +269,7 @@ def job_pg_rebuild(namespace, statefulset, ordinal, target_replicas, max_retries
             statefulset=statefulset,
             ordinal=ordinal,
             target_replicas=target_replicas,
+            strategy=strategy,
             max_retries=max_retries
         )
 
@@ -269,28 +282,107 @@ def job_pg_rebuild(namespace, statefulset, ordinal, target_replicas, max_retries
         sys.exit(1)
 
 
+@job.command('pg-rebuild-fleet')
+@click.option('--target', '-t', 'targets', multiple=True,
+              help='namespace/statefulset[:ordinal,...] (repeatable, default ordinal: 0)')
+@click.option('--namespace', '-n', 'namespaces', multiple=True, help='Namespace to search with --selector (repeatable)')
+@click.option('--selector', '-l', help='Label selector of StatefulSets, e.g. app=postgres')
+@click.option('--ordinal', '-o', 'ordinals', type=int, multiple=True, help='Ordinals to rebuild with --selector (default: 0)')
+@click.option('--max-parallel', type=int, default=5, help='Max child jobs running at once (default: 5)')
+@click.option('--max-parallel-per-namespace', type=int, default=2, help='Max child jobs per namespace (default: 2)')
+@click.option('--max-failures', type=int, default=0, help='Stop starting new child jobs after this many fail (default: 0)')
+@click.option('--strategy', type=click.Choice(['scale-to-zero', 'ordinal']), default='scale-to-zero',
+              help='scale-to-zero: scale the whole StatefulSet to 0; ordinal: recycle only the target pod and PVC')
+@click.option('--child-max-retries', type=int, default=3, help='Max retry attempts of each child job (default: 3)')
+@click.option('--max-retries', type=int, default=3, help='Max retry attempts of the fleet job (default: 3)')
+@click.option('--yes', '-y', is_flag=True, help='Skip confirmation')
+def job_pg_rebuild_fleet(targets, namespaces, selector, ordinals, max_parallel, max_parallel_per_namespace,
+                         max_failures, strategy, child_max_retries, max_retries, yes):
+    """Rebuild many StatefulSet ordinals as one fleet job"""
+    if not targets and not selector:
+        print_error("Specify --target or --selector")
+        sys.exit(1)
+    if selector and not namespaces:
+        print_error("--selector requires --namespace")
+        sys.exit(1)
+
+    statefulsets = []
+    for target in targets:
+        name, _, ordinal_list = target.partition(':')
+        namespace, _, statefulset = name.partition('/')
+        if not namespace or not statefulset:
+            print_error(f"Invalid target: {target} (expected namespace/statefulset[:ordinal,...])")
+            sys.exit(1)
+        statefulsets.append({
+            'namespace': namespace,
+            'statefulset': statefulset,
+            'ordinals': [int(o) for o in ordinal_list.split(',')] if ordinal_list else [0],
+        })
+
+    console.print("\n[bold]PG Rebuild Fleet Job[/bold]")
+    for t in statefulsets:
+        console.print(f"  {t['namespace']}/{t['statefulset']}: ordinals {t['ordinals']}")
+    if selector:
+        console.print(f"  Selector: {selector} in {', '.join(namespaces)}, ordinals {list(ordinals or [0])}")
+    console.print(f"  Max Parallel: {max_parallel} ({max_parallel_per_namespace} per namespace)")
+    console.print(f"  Failure Budget: {max_failures}")
+    console.print(f"  Strategy: {strategy}")
+    console.print("\n[yellow]Each ordinal is rebuilt by its own pg-rebuild job, "
+                  "one ordinal per StatefulSet at a time.[/yellow]\n")
+
+    if not yes:
+        if not click.confirm("Continue?"):
+            print_warning("Cancelled")
+            return
+
+    try:
+        client = ApiOpsClient()
+        result = client.create_pg_rebuild_fleet_job(
+            statefulsets=statefulsets,
+            namespaces=list(namespaces),
+            label_selector=selector,
+            ordinals=list(ordinals or [0]),
+            max_parallel=max_parallel,
+            max_parallel_per_namespace=max_parallel_per_namespace,
+            max_failures=max_failures,
+            strategy=strategy,
+            child_max_retries=child_max_retries,
+            max_retries=max_retries,
+        )
+
+        job_id = result['job_id']
+        print_success(f"Job created: {job_id}")
+        print_info(f"Check status with: opsctl job status {job_id} -w")
+
+    except Exception as e:
+        print_error(f"Failed to create job: {e}")
+        sys.exit(1)
+
+
 @job.command('status')
 @click.argument('job_id')
-@click.option('--watch', '-w', is_flag=True, help='Watch job status (updates every 5s)')
+@click.option('--watch', '-w', is_flag=True, help='Watch job status (streams updates as they happen)')
 def job_status(job_id, watch):
     """Get job status"""
     import time
+    import requests
 
     try:
         client = ApiOpsClient()
 
         if watch:
             print_info("Watching job status (Ctrl+C to stop)...\n")
+            last_event_id = None
             try:
                 while True:
-                    result = client.get_job(job_id)
-                    console.clear()
-                    print_job_status(result)
-
-                    if result['status'] in ['success', 'failed']:
+                    try:
+                        for last_event_id, result in client.stream_job_events(job_id, last_event_id):
+                            console.clear()
+                            print_job_status(result)
                         break
-
-                    time.sleep(5)
+                    except requests.exceptions.RequestException:
+                        # Stream dropped: resume from the last received version
+                        time.sleep(1)
             except KeyboardInterrupt:
                 print_warning("\nStopped watching")
         else:
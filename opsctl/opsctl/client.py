@@ -2,6 +2,8 @@
 API client for communicating with ApiOps
 """
 
+import json
+
 import requests
 from .config import config
 
@@ -96,6 +98,7 @@ class ApiOpsClient:
         statefulset: str,
         ordinal: int,
         target_replicas: int = 1,
+        strategy: str = 'scale-to-zero',
         max_retries: int = 3
     ) -> dict[str, any]:
         """Create a PG rebuild job"""
@@ -106,14 +109,53 @@ class ApiOpsClient:
                 'statefulset': statefulset,
                 'ordinal': ordinal,
                 'target_replicas': target_replicas,
+                'strategy': strategy,
                 'max_retries': max_retries,
             }
         )
 
+    def create_pg_rebuild_fleet_job(self, **body) -> dict[str, any]:
+        """Create a fleet PG rebuild job (one child pg-rebuild job per StatefulSet ordinal)"""
+        return self.post('/ops/jobs/pg-rebuild-fleet', json=body)
+
     def get_job(self, job_id: str) -> dict[str, any]:
         """Get job status"""
         return self.get(f'/ops/jobs/{job_id}')
 
+    def stream_job_events(self, job_id: str, last_event_id: str | None = None):
+        """
+        Follow job progress via Server-Sent Events.
+
+        Yields (event_id, job) for every job change until the job finishes.
+        """
+        headers = {'Accept': 'text/event-stream'}
+        if last_event_id:
+            headers['Last-Event-ID'] = last_event_id
+        response = self._request(
+            'GET', f'/ops/jobs/{job_id}/events',
+            headers=headers, stream=True, timeout=(10, 60),
+        )
+        with response:
+            event_id, event, data = None, None, []
+            for line in response.iter_lines(decode_unicode=True):
+                if line:
+                    field, _, value = line.partition(':')
+                    value = value[1:] if value.startswith(' ') else value
+                    if field == 'id':
+                        event_id = value
+                    elif field == 'event':
+                        event = value
+                    elif field == 'data':
+                        data.append(value)
+                    continue
+
+                # blank line: dispatch event
+                if event == 'job':
+                    yield event_id, json.loads('\n'.join(data))
+                elif event in ('end', 'error'):
+                    return
+                event, data = None, []
+
     def retry_job(self, job_id: str) -> dict[str, any]:
         """Manually retry a failed job"""
         return self.post(f'/ops/jobs/{job_id}/retry')
@@ -53,6 +53,8 @@ def print_job_status(job: dict[str, any]):
         'running': 'blue',
         'success': 'green',
         'failed': 'red',
+        'waiting': 'dim',
+        'cancelled': 'magenta',
     }
     status = job['status']
     status_color = status_colors.get(status, 'white')
@@ -70,6 +72,18 @@ def print_job_status(job: dict[str, any]):
         retry_color = 'yellow' if retry_count > 0 else 'dim'
         header += f"[bold]Retries:[/bold] [{retry_color}]{retry_count}/{max_retries}[/{retry_color}]\n"
 
+    if job.get('parent_job_id'):
+        header += f"[bold]Parent Job:[/bold] {job['parent_job_id']}\n"
+
+    # Child jobs (e.g. pg-rebuild-fleet)
+    if job.get('children'):
+        children = job['children']
+        parts = [
+            f"[{status_colors.get(s, 'white')}]{n} {s}[/{status_colors.get(s, 'white')}]"
+            for s, n in sorted(children.items())
+        ]
+        header += f"[bold]Children:[/bold] {sum(children.values())} ({', '.join(parts)})\n"
+
     if job.get('finished_at'):
         header += f"[bold]Finished:[/bold] {format_timestamp(job['finished_at'])}\n"
         duration = calculate_duration(job['created_at'], job['finished_at'])
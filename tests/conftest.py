@@ -0,0 +1,15 @@
+"""
+測試共用設定
+
+app 在 import 時讀取設定並載入 in-cluster config。不需要 DB 的單元測試也會 import app，
+這裡先給必要的環境變數（不會連線），並略過 in-cluster config，讓測試可以在 cluster 外執行。
+"""
+
+import os
+
+import kubernetes.config
+
+os.environ.setdefault("OPS_DB_URL", os.environ.get("OPS_TEST_DB_URL", "postgresql://test@localhost/test"))
+os.environ.setdefault("OPS_API_KEY", "test")
+
+kubernetes.config.load_incluster_config = lambda: None
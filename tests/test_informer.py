@@ -0,0 +1,152 @@
+"""
+Informer 的本地 cache：Store 的 owner / label 索引與 wait_until_all（不需要 cluster）
+"""
+
+import asyncio
+import threading
+
+import pytest
+from kubernetes import client
+
+from app.informer import Informer, Store, wait_until_all
+
+
+def _pod(name: str, labels: dict | None = None, owner_uid: str | None = None) -> client.V1Pod:
+    owners = None
+    if owner_uid:
+        owners = [client.V1OwnerReference(api_version="apps/v1", kind="StatefulSet", name="db", uid=owner_uid)]
+    return client.V1Pod(metadata=client.V1ObjectMeta(name=name, labels=labels, owner_references=owners))
+
+
+def _names(objs) -> set[str]:
+    return {o.metadata.name for o in objs}
+
+
+def test_by_owner_and_labels():
+    store = Store()
+    store.upsert(_pod("db-0", {"app": "db", "role": "primary"}, "sts-1"))
+    store.upsert(_pod("db-1", {"app": "db", "role": "replica"}, "sts-1"))
+    store.upsert(_pod("web-0", {"app": "web"}))
+
+    assert _names(store.by_owner("sts-1")) == {"db-0", "db-1"}
+    assert store.by_owner("sts-2") == []
+    assert _names(store.by_labels({"app": "db"})) == {"db-0", "db-1"}
+    assert _names(store.by_labels({"app": "db", "role": "replica"})) == {"db-1"}
+    assert store.by_labels({"app": "web", "role": "replica"}) == []
+    assert _names(store.by_labels({})) == {"db-0", "db-1", "web-0"}
+
+
+def test_upsert_reindexes_changed_object():
+    store = Store()
+    store.upsert(_pod("db-0", {"role": "primary"}, "sts-1"))
+    # StatefulSet 重建後 pod 的 owner uid 與 label 都可能改變
+    store.upsert(_pod("db-0", {"role": "replica"}, "sts-2"))
+
+    assert store.by_owner("sts-1") == []
+    assert _names(store.by_owner("sts-2")) == {"db-0"}
+    assert store.by_labels({"role": "primary"}) == []
+    assert _names(store.by_labels({"role": "replica"})) == {"db-0"}
+    assert len(store.list()) == 1
+
+
+def test_delete_removes_from_indexes():
+    store = Store()
+    store.upsert(_pod("db-0", {"app": "db"}, "sts-1"))
+    store.upsert(_pod("db-1", {"app": "db"}, "sts-1"))
+    store.delete(_pod("db-0"))
+    # 不存在的物件刪除不會出錯
+    store.delete(_pod("db-9"))
+
+    assert store.get("db-0") is None
+    assert _names(store.by_owner("sts-1")) == {"db-1"}
+    assert _names(store.by_labels({"app": "db"})) == {"db-1"}
+
+
+def test_replace_resets_indexes():
+    store = Store()
+    store.upsert(_pod("db-0", {"app": "db"}, "sts-1"))
+    store.replace([_pod("db-1", {"app": "db"}, "sts-2")])
+
+    assert store.get("db-0") is None
+    assert store.by_owner("sts-1") == []
+    assert _names(store.by_owner("sts-2")) == {"db-1"}
+    assert _names(store.by_labels({"app": "db"})) == {"db-1"}
+
+
+def _informer(kind: str) -> Informer:
+    # 不呼叫 start()：測試直接改 store 並通知訂閱者，模擬 watch 事件
+    return Informer(kind, "test")
+
+
+def _apply(informer: Informer, obj):
+    """在另一個 thread 套用變化，與 informer thread 相同"""
+
+    def run():
+        informer.store.upsert(obj)
+        informer.synced.set()
+        informer._notify()
+
+    t = threading.Thread(target=run)
+    t.start()
+    t.join()
+
+
+def test_wait_until_all_rechecks_on_any_informer():
+    pods, pvcs = _informer("Pod"), _informer("PersistentVolumeClaim")
+    calls = []
+    progress = []
+
+    def check(pod_store, pvc_store):
+        calls.append(1)
+        done = pod_store.get("db-0") is not None and pvc_store.get("data-db-0") is not None
+        return done, "ready" if done else "waiting"
+
+    async def run():
+        waiter = asyncio.ensure_future(wait_until_all([pods, pvcs], check, timeout=5, on_progress=progress.append))
+        await asyncio.sleep(0.01)
+        _apply(pods, _pod("db-0"))
+        await asyncio.sleep(0.01)
+        # 只有一個 informer 同步過，不會判斷
+        assert calls == []
+        _apply(pvcs, _pod("other"))
+        await asyncio.sleep(0.01)
+        assert not waiter.done()
+        _apply(pvcs, _pod("data-db-0"))
+        return await waiter
+
+    assert asyncio.run(run()) == "ready"
+    assert progress == ["waiting"]
+    assert len(calls) == 2
+    assert not pods._subscribers and not pvcs._subscribers
+
+
+def test_wait_until_all_checks_synced_cache_immediately():
+    pods = _informer("Pod")
+    pods.store.upsert(_pod("db-0"))
+    pods.synced.set()
+
+    result = asyncio.run(wait_until_all([pods], lambda store: (True, "cached"), timeout=1))
+    assert result == "cached"
+
+
+def test_wait_until_all_timeout_reports_last_detail():
+    pods = _informer("Pod")
+    pods.synced.set()
+
+    with pytest.raises(TimeoutError, match="still waiting"):
+        asyncio.run(wait_until_all([pods], lambda store: (False, "still waiting"), timeout=0.05))
+    assert not pods._subscribers
+
+
+def test_wait_until_all_raises_error_before_sync():
+    pods = _informer("Pod")
+    pods.error = client.exceptions.ApiException(status=403, reason="Forbidden")
+
+    async def run():
+        waiter = asyncio.ensure_future(wait_until_all([pods], lambda store: (True, ""), timeout=1))
+        await asyncio.sleep(0.01)
+        pods._notify()
+        return await waiter
+
+    with pytest.raises(client.exceptions.ApiException):
+        asyncio.run(run())
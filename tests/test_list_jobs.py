@@ -0,0 +1,113 @@
+"""
+GET /ops/jobs 的 keyset 分頁與 params containment 查詢
+
+需要 Postgres（JSONB @>、row value 比較）：
+    OPS_TEST_DB_URL=postgresql://... python -m pytest tests/
+會在該 DB 建立 / 刪除 ops_* table，請使用測試專用的 DB。
+"""
+
+import asyncio
+import os
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+TEST_DB_URL = os.environ.get("OPS_TEST_DB_URL")
+if not TEST_DB_URL:
+    pytest.skip("OPS_TEST_DB_URL not set", allow_module_level=True)
+os.environ["OPS_DB_URL"] = TEST_DB_URL
+os.environ.setdefault("OPS_API_KEY", "test")
+
+import kubernetes.config  # noqa: E402
+
+# app 在 import 時載入 in-cluster config；GET /ops/jobs 只讀 DB，cluster 外跑測試時略過
+kubernetes.config.load_incluster_config = lambda: None
+
+from fastapi import HTTPException  # noqa: E402
+
+from app.db import AsyncSessionLocal, SessionLocal, async_engine, engine  # noqa: E402
+from app.ids import uuid7  # noqa: E402
+from app.models import Base, OpsJob  # noqa: E402
+from app.routes.jobs import list_jobs  # noqa: E402
+
+T0 = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+@pytest.fixture(scope="module", autouse=True)
+def jobs():
+    Base.metadata.create_all(engine)
+    with SessionLocal() as db:
+        for i in range(5):
+            uid = uuid7()
+            db.add(
+                OpsJob(
+                    job_id=str(uid),
+                    uid=uid,
+                    type="pg-rebuild",
+                    status="success",
+                    created_at=T0 + timedelta(minutes=i),
+                    params={"namespace": "prod", "statefulset": "postgres", "ordinal": i % 2},
+                    namespace="prod",
+                    target_resource="statefulset/postgres",
+                )
+            )
+        db.commit()
+    yield
+    Base.metadata.drop_all(engine)
+    engine.dispose()
+
+
+def _list(**kwargs):
+    async def run():
+        try:
+            async with AsyncSessionLocal() as db:
+                return await list_jobs(**{**_DEFAULTS, **kwargs}, db=db)
+        finally:
+            await async_engine.dispose()
+
+    return asyncio.run(run())
+
+
+# 直接呼叫 route function，沒給的 query 參數用預設值
+_DEFAULTS = dict(
+    type=None,
+    status=None,
+    actor=None,
+    namespace=None,
+    target_resource=None,
+    parent_job_id=None,
+    params=None,
+    created_after=None,
+    created_before=None,
+    limit=50,
+    cursor=None,
+)
+
+
+def test_two_pages_with_cursor():
+    first = _list(limit=3)
+    assert len(first.items) == 3
+    assert first.next_cursor is not None
+
+    second = _list(limit=3, cursor=first.next_cursor)
+    assert len(second.items) == 2
+    assert second.next_cursor is None
+
+    created = [j.created_at for j in first.items + second.items]
+    assert created == sorted(created, reverse=True)
+    assert len({j.job_id for j in first.items + second.items}) == 5
+
+
+def test_params_filter():
+    page = _list(params='{"ordinal": 1}')
+    assert len(page.items) == 2
+    assert page.next_cursor is None
+
+
+def test_invalid_cursor_and_params():
+    with pytest.raises(HTTPException) as e:
+        _list(cursor="not-a-cursor")
+    assert e.value.status_code == 400
+    with pytest.raises(HTTPException) as e:
+        _list(params="[1]")
+    assert e.value.status_code == 400
@@ -0,0 +1,71 @@
+"""
+pg-rebuild-fleet 放行 child job 的限制（不需要 DB）
+"""
+
+from types import SimpleNamespace
+
+from app.jobs.pg_rebuild_fleet import _release
+from app.schemas import PgRebuildFleetParams
+
+
+def _params(max_parallel: int = 5, max_parallel_per_namespace: int = 2) -> PgRebuildFleetParams:
+    return PgRebuildFleetParams(
+        namespaces=["a", "b"],
+        label_selector="app=pg",
+        max_parallel=max_parallel,
+        max_parallel_per_namespace=max_parallel_per_namespace,
+    )
+
+
+def _children(*specs: tuple[str, str, str]) -> list:
+    """specs: (status, namespace, statefulset)，id 依建立順序"""
+    return [
+        SimpleNamespace(id=i, status=status, namespace=ns, target_resource=f"statefulset/{sts}")
+        for i, (status, ns, sts) in enumerate(specs, 1)
+    ]
+
+
+def test_releases_in_creation_order_up_to_max_parallel():
+    children = _children(*(("waiting", ns, f"pg-{i}") for i in range(3) for ns in ("a", "b")))
+    assert _release(_params(max_parallel=3, max_parallel_per_namespace=3), children) == [1, 2, 3]
+
+
+def test_per_namespace_limit():
+    children = _children(
+        ("waiting", "a", "pg-0"),
+        ("waiting", "a", "pg-1"),
+        ("waiting", "a", "pg-2"),
+        ("waiting", "b", "pg-0"),
+    )
+    assert _release(_params(max_parallel_per_namespace=2), children) == [1, 2, 4]
+
+
+def test_one_ordinal_per_statefulset_at_a_time():
+    children = _children(
+        ("waiting", "a", "pg"),
+        ("waiting", "a", "pg"),
+        ("waiting", "b", "pg"),
+    )
+    # 不同 namespace 的同名 StatefulSet 是不同的目標
+    assert _release(_params(), children) == [1, 3]
+
+
+def test_in_flight_children_count_against_limits():
+    children = _children(
+        ("running", "a", "pg-0"),
+        ("pending", "b", "pg-0"),
+        ("success", "a", "pg-1"),
+        ("failed", "a", "pg-2"),
+        ("waiting", "a", "pg-0"),
+        ("waiting", "a", "pg-3"),
+        ("waiting", "a", "pg-4"),
+        ("waiting", "b", "pg-1"),
+        ("waiting", "b", "pg-2"),
+    )
+    # a/pg-0 還在執行；a、b 各已有 1 個在執行（上限 2）；全部上限 4 扣掉 2 個
+    assert _release(_params(max_parallel=4), children) == [6, 8]
+
+
+def test_nothing_released_when_full():
+    children = _children(("running", "a", "pg-0"), ("pending", "b", "pg-0"), ("waiting", "b", "pg-1"))
+    assert _release(_params(max_parallel=2), children) == []
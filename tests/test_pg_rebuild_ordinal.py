@@ -0,0 +1,169 @@
+"""
+pg-rebuild strategy = ordinal 的判斷邏輯（不需要 cluster）
+
+k8s client 與 informer 以 monkeypatch 取代，只測目標檢查與等待條件。
+"""
+
+import asyncio
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+from kubernetes import client
+
+from app.informer import Store
+from app.jobs import pg_rebuild
+from app.jobs.retry import FatalJobError
+from app.schemas import PgRebuildParams
+
+STS_UID = "sts-uid"
+T0 = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+def _params(ordinal: int = 1) -> PgRebuildParams:
+    return PgRebuildParams(namespace="prod", statefulset="pg", ordinal=ordinal, strategy="ordinal")
+
+
+def _sts(replicas, current_revision="r1", update_revision="r1") -> client.V1StatefulSet:
+    return client.V1StatefulSet(
+        spec=client.V1StatefulSetSpec(
+            replicas=replicas,
+            selector=client.V1LabelSelector(match_labels={"app": "pg"}),
+            service_name="pg",
+            template=client.V1PodTemplateSpec(),
+        ),
+        status=client.V1StatefulSetStatus(
+            replicas=replicas or 1, current_revision=current_revision, update_revision=update_revision
+        ),
+    )
+
+
+def _meta(name: str, uid: str, owner_uid: str | None = STS_UID, deleting: bool = False) -> client.V1ObjectMeta:
+    owners = None
+    if owner_uid:
+        owners = [client.V1OwnerReference(api_version="apps/v1", kind="StatefulSet", name="pg", uid=owner_uid)]
+    return client.V1ObjectMeta(
+        name=name, uid=uid, owner_references=owners, deletion_timestamp=T0 if deleting else None
+    )
+
+
+def _pod(uid: str, ready: bool = True, owner_uid: str | None = STS_UID) -> client.V1Pod:
+    return client.V1Pod(
+        metadata=_meta("pg-1", uid, owner_uid),
+        status=client.V1PodStatus(
+            phase="Running" if ready else "Pending",
+            conditions=[client.V1PodCondition(type="Ready", status="True" if ready else "False")],
+        ),
+    )
+
+
+def _pvc(uid: str, deleting: bool = False) -> client.V1PersistentVolumeClaim:
+    return client.V1PersistentVolumeClaim(metadata=_meta("data-pg-1", uid, None, deleting))
+
+
+def _store(*objs) -> Store:
+    store = Store()
+    for obj in objs:
+        store.upsert(obj)
+    return store
+
+
+def _check_target(monkeypatch, sts, ordinal: int = 1):
+    async def read_namespaced_stateful_set(name, namespace):
+        return sts
+
+    monkeypatch.setattr(
+        pg_rebuild, "async_apps_v1", SimpleNamespace(read_namespaced_stateful_set=read_namespaced_stateful_set)
+    )
+    asyncio.run(pg_rebuild._check_ordinal_target(_params(ordinal)))
+
+
+def test_ordinal_target_in_range(monkeypatch):
+    _check_target(monkeypatch, _sts(3), ordinal=2)
+
+
+def test_ordinal_target_out_of_range(monkeypatch):
+    with pytest.raises(FatalJobError, match="out of range"):
+        _check_target(monkeypatch, _sts(3), ordinal=3)
+    # 沒有設定 spec.replicas 時視為 1
+    with pytest.raises(FatalJobError, match="out of range"):
+        _check_target(monkeypatch, _sts(None), ordinal=1)
+
+
+def test_ordinal_target_rejects_rollout_in_progress(monkeypatch):
+    with pytest.raises(FatalJobError, match="rollout in progress"):
+        _check_target(monkeypatch, _sts(3, "r1", "r2"))
+
+
+def _capture_checks(monkeypatch) -> dict:
+    """把 step 交給 informer 的 check 存起來，不實際等待"""
+    checks = {}
+
+    class FakeInformer:
+        async def wait_until(self, check, *, timeout, on_progress=None):
+            checks["wait_until"] = check
+            return "captured"
+
+    async def wait_until_all(informers, check, *, timeout, on_progress=None):
+        checks["wait_until_all"] = check
+        return "captured"
+
+    monkeypatch.setattr(pg_rebuild, "get_informer", lambda kind, namespace: FakeInformer())
+    monkeypatch.setattr(pg_rebuild, "wait_until_all", wait_until_all)
+    return checks
+
+
+def _ctx(deleted_pod_uids=()) -> SimpleNamespace:
+    state = {"sts_ref": SimpleNamespace(uid=STS_UID), "deleted_pod_uids": set(deleted_pod_uids)}
+    return SimpleNamespace(params=_params(), state=state, progress=lambda detail: None)
+
+
+def test_wait_ordinal_ready_check(monkeypatch):
+    checks = _capture_checks(monkeypatch)
+    asyncio.run(pg_rebuild.step_wait_ordinal_ready(_ctx(deleted_pod_uids={"old"})))
+    check = checks["wait_until_all"]
+
+    # 舊 PVC 還在 Terminating / 新 PVC 還沒建立
+    assert not check(_store(_pod("new")), _store(_pvc("v1", deleting=True)))[0]
+    assert not check(_store(_pod("new")), _store())[0]
+    # cache 裡還是已經刪除的 pod（watch 之間沒有順序）
+    assert check(_store(_pod("old")), _store(_pvc("v2"))) == (False, "waiting for old pod pg-1 to be replaced")
+    # 不屬於這個 StatefulSet 的同名 pod
+    assert not check(_store(_pod("new", owner_uid="other")), _store(_pvc("v2")))[0]
+    assert check(_store(_pod("new", ready=False)), _store(_pvc("v2"))) == (False, "pod pg-1 Pending, not ready")
+    assert check(_store(_pod("new")), _store(_pvc("v2"))) == (True, "pod pg-1 ready")
+
+
+def test_wait_ordinal_pvc_gone_check(monkeypatch):
+    checks = _capture_checks(monkeypatch)
+
+    async def read_namespaced_persistent_volume_claim(name, namespace):
+        return _pvc("v1", deleting=True)
+
+    monkeypatch.setattr(
+        pg_rebuild,
+        "async_core_v1",
+        SimpleNamespace(read_namespaced_persistent_volume_claim=read_namespaced_persistent_volume_claim),
+    )
+    asyncio.run(pg_rebuild.step_wait_ordinal_pvc_gone(_ctx()))
+    check = checks["wait_until"]
+
+    assert check(_store(_pvc("v1", deleting=True))) == (False, "pvc data-pg-1 terminating, waiting for pod to stop")
+    assert check(_store()) == (True, "pvc data-pg-1 deleted")
+    # 刪除後 controller 已經建立新的 PVC
+    assert check(_store(_pvc("v2"))) == (True, "pvc data-pg-1 recreated")
+
+
+def test_wait_ordinal_pvc_gone_skips_wait_when_already_recreated(monkeypatch):
+    checks = _capture_checks(monkeypatch)
+
+    async def read_namespaced_persistent_volume_claim(name, namespace):
+        return _pvc("v2")
+
+    monkeypatch.setattr(
+        pg_rebuild,
+        "async_core_v1",
+        SimpleNamespace(read_namespaced_persistent_volume_claim=read_namespaced_persistent_volume_claim),
+    )
+    assert asyncio.run(pg_rebuild.step_wait_ordinal_pvc_gone(_ctx())) == "pvc data-pg-1 recreated"
+    assert checks == {}
@@ -0,0 +1,106 @@
+"""
+ProgressReporter 的合併寫入（不需要 DB）
+"""
+
+import asyncio
+import threading
+
+from app.jobs.progress import ProgressReporter
+
+INTERVAL = 0.05
+
+
+def test_first_report_is_written_immediately():
+    written = []
+
+    async def run():
+        r = ProgressReporter(written.append, INTERVAL)
+        r.report("a")
+        await asyncio.sleep(INTERVAL / 5)
+        assert written == ["a"]
+        await r.close()
+
+    asyncio.run(run())
+
+
+def test_reports_within_interval_are_coalesced():
+    written = []
+
+    async def run():
+        r = ProgressReporter(written.append, INTERVAL)
+        r.report("a")
+        r.report("b")
+        r.report("c")
+        await asyncio.sleep(INTERVAL / 5)
+        assert written == ["a"]
+        await asyncio.sleep(INTERVAL * 2)
+        await r.close()
+
+    asyncio.run(run())
+    # 間隔內只保留最後一個，但不會被丟掉
+    assert written == ["a", "c"]
+
+
+def test_unchanged_detail_is_not_written_again():
+    written = []
+
+    async def run():
+        r = ProgressReporter(written.append, INTERVAL)
+        r.report("a")
+        await asyncio.sleep(INTERVAL * 2)
+        r.report("a")
+        await asyncio.sleep(INTERVAL * 2)
+        r.report("b")
+        # A -> B -> A 在同一個間隔內也不寫
+        r.report("c")
+        r.report("b")
+        await asyncio.sleep(INTERVAL * 2)
+        await r.close()
+
+    asyncio.run(run())
+    assert written == ["a", "b"]
+
+
+def test_close_drops_pending_and_waits_for_in_flight_write():
+    written = []
+    release = threading.Event()
+
+    def slow_write(detail):
+        release.wait(1)
+        written.append(detail)
+
+    async def run():
+        r = ProgressReporter(slow_write, INTERVAL)
+        r.report("a")
+        r.report("b")
+        await asyncio.sleep(0)
+        closing = asyncio.ensure_future(r.close())
+        await asyncio.sleep(INTERVAL / 5)
+        assert not closing.done()
+        release.set()
+        await closing
+        r.report("c")
+        await asyncio.sleep(INTERVAL * 2)
+
+    asyncio.run(run())
+    assert written == ["a"]
+
+
+def test_write_failure_does_not_raise():
+    written = []
+
+    def flaky_write(detail):
+        if detail == "a":
+            raise RuntimeError("db down")
+        written.append(detail)
+
+    async def run():
+        r = ProgressReporter(flaky_write, INTERVAL)
+        r.report("a")
+        await asyncio.sleep(INTERVAL * 2)
+        r.report("b")
+        await asyncio.sleep(INTERVAL / 5)
+        await r.close()
+
+    asyncio.run(run())
+    assert written == ["b"]
@@ -0,0 +1,92 @@
+"""
+JobDefinition.step_plan：依參數略過 step 後的依賴關係，以及 register 的依賴檢查（不需要 DB）
+"""
+
+import pytest
+from pydantic import BaseModel
+
+from app.jobs.registry import JOB_DEFINITIONS, JobDefinition, Step, register
+
+
+class Params(BaseModel):
+    flag: bool = True
+
+
+async def _noop(ctx):
+    return None
+
+
+def _definition(*steps: Step) -> JobDefinition:
+    return JobDefinition(type="test", params=Params, steps=steps)
+
+
+def test_steps_default_to_sequential():
+    d = _definition(Step("a", _noop), Step("b", _noop), Step("c", _noop))
+    assert d.step_plan(Params()) == [("a", []), ("b", ["a"]), ("c", ["b"])]
+
+
+def test_depends_on_allows_parallel_steps():
+    d = _definition(
+        Step("scale_down", _noop),
+        Step("delete_0", _noop, depends_on=("scale_down",)),
+        Step("delete_1", _noop, depends_on=("scale_down",)),
+        Step("scale_up", _noop, depends_on=("delete_0", "delete_1")),
+    )
+    assert d.step_plan(Params()) == [
+        ("scale_down", []),
+        ("delete_0", ["scale_down"]),
+        ("delete_1", ["scale_down"]),
+        ("scale_up", ["delete_0", "delete_1"]),
+    ]
+
+
+def test_skipped_step_is_replaced_by_its_dependencies():
+    d = _definition(
+        Step("a", _noop),
+        Step("b", _noop, when=lambda p: p.flag),
+        Step("c", _noop),
+    )
+    assert d.step_plan(Params(flag=True)) == [("a", []), ("b", ["a"]), ("c", ["b"])]
+    assert d.step_plan(Params(flag=False)) == [("a", []), ("c", ["a"])]
+
+
+def test_skipped_fan_in_keeps_all_dependencies():
+    d = _definition(
+        Step("root", _noop),
+        Step("left", _noop, depends_on=("root",)),
+        Step("right", _noop, depends_on=("root",)),
+        Step("join", _noop, depends_on=("left", "right"), when=lambda p: p.flag),
+        Step("last", _noop),
+    )
+    assert d.step_plan(Params(flag=False)) == [
+        ("root", []),
+        ("left", ["root"]),
+        ("right", ["root"]),
+        ("last", ["left", "right"]),
+    ]
+
+
+def test_skipped_steps_chain_and_deduplicate():
+    d = _definition(
+        Step("a", _noop),
+        Step("b", _noop, depends_on=("a",), when=lambda p: p.flag),
+        Step("c", _noop, depends_on=("a",), when=lambda p: p.flag),
+        Step("d", _noop, depends_on=("b", "c")),
+    )
+    assert d.step_plan(Params(flag=False)) == [("a", []), ("d", ["a"])]
+
+
+def test_skipped_first_step_leaves_no_dependency():
+    d = _definition(Step("a", _noop, when=lambda p: p.flag), Step("b", _noop))
+    assert d.step_plan(Params(flag=False)) == [("b", [])]
+
+
+def test_register_rejects_dependency_declared_later():
+    d = JobDefinition(
+        type="test-bad-order",
+        params=Params,
+        steps=(Step("a", _noop, depends_on=("b",)), Step("b", _noop)),
+    )
+    with pytest.raises(ValueError, match="must be declared before it"):
+        register(d)
+    assert "test-bad-order" not in JOB_DEFINITIONS
@@ -0,0 +1,121 @@
+"""
+Job 重試：退避時間與錯誤分類（不需要 DB）
+"""
+
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+from kubernetes.client.exceptions import ApiException
+
+from app.jobs.retry import (
+    FatalJobError,
+    RetryPolicy,
+    is_retryable,
+    retry_after_seconds,
+    schedule_retry,
+)
+
+NOW = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+class FakeSession:
+    def __init__(self):
+        self.commits = 0
+
+    def commit(self):
+        self.commits += 1
+
+
+def _api_error(status: int, headers: dict | None = None) -> ApiException:
+    e = ApiException(status=status, reason="test")
+    e.headers = headers
+    return e
+
+
+def _job(retry_count=0, max_retries=3):
+    return SimpleNamespace(
+        retry_count=retry_count,
+        max_retries=max_retries,
+        status="running",
+        finished_at=None,
+        next_run_at=None,
+    )
+
+
+def test_delay_grows_exponentially_up_to_max():
+    policy = RetryPolicy(base_delay=2, max_delay=30, multiplier=2.0, jitter=0)
+    assert [policy.delay(n) for n in range(1, 7)] == [2, 4, 8, 16, 30, 30]
+
+
+def test_delay_jitter_stays_within_bounds():
+    policy = RetryPolicy(base_delay=10, max_delay=100, jitter=0.5)
+    for _ in range(200):
+        assert 10 <= policy.delay(2) <= 20
+
+
+@pytest.mark.parametrize("status", [409, 429, 500, 503])
+def test_transient_api_errors_are_retryable(status):
+    assert is_retryable(_api_error(status))
+
+
+@pytest.mark.parametrize("status", [400, 401, 403, 404, 405, 410, 418, 422])
+def test_client_api_errors_are_fatal(status):
+    assert not is_retryable(_api_error(status))
+
+
+def test_fatal_job_error_is_not_retryable():
+    assert not is_retryable(FatalJobError("bad params"))
+
+
+def test_other_errors_are_retryable():
+    assert is_retryable(TimeoutError())
+    assert is_retryable(ConnectionResetError())
+
+
+def test_retry_after_header():
+    assert retry_after_seconds(_api_error(429, {"Retry-After": "7"})) == 7
+    assert retry_after_seconds(_api_error(429, {"Retry-After": "soon"})) is None
+    assert retry_after_seconds(_api_error(500)) is None
+    assert retry_after_seconds(RuntimeError()) is None
+
+
+def test_schedule_retry_requeues_with_backoff():
+    db, job = FakeSession(), _job(retry_count=1)
+    policy = RetryPolicy(base_delay=5, max_delay=60, jitter=0)
+
+    delay = schedule_retry(db, job, TimeoutError(), NOW, policy)
+
+    assert delay == 10
+    assert job.retry_count == 2
+    assert job.status == "pending"
+    assert job.next_run_at == NOW + timedelta(seconds=10)
+    assert db.commits == 1
+
+
+def test_schedule_retry_honors_retry_after():
+    db, job = FakeSession(), _job()
+    policy = RetryPolicy(base_delay=1, max_delay=60, jitter=0)
+
+    delay = schedule_retry(db, job, _api_error(429, {"Retry-After": "30"}), NOW, policy)
+
+    assert delay == 30
+    assert job.next_run_at == NOW + timedelta(seconds=30)
+
+
+def test_schedule_retry_fails_fatal_error():
+    db, job = FakeSession(), _job()
+
+    assert schedule_retry(db, job, _api_error(422), NOW) is None
+    assert job.status == "failed"
+    assert job.finished_at == NOW
+    assert job.retry_count == 0
+    assert db.commits == 1
+
+
+def test_schedule_retry_fails_when_retries_exhausted():
+    db, job = FakeSession(), _job(retry_count=3, max_retries=3)
+
+    assert schedule_retry(db, job, TimeoutError(), NOW) is None
+    assert job.status == "failed"
+    assert job.retry_count == 3